@@ -0,0 +1,146 @@
+"""
+Relatório de analytics sobre um histórico sintético de vários meses.
+
+Compara:
+    pivot manual      lê o histórico inteiro (openpyxl/sqlite) e agrupa com pandas
+    analytics (1ª)    monta o arquivo Parquet do zero e gera o relatório
+    analytics (2ª)    histórico inalterado: só lê o Parquet
+    mês novo          linhas de um mês novo no histórico: só os meses abertos são relidos
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_analytics.py --months 36 --rows-per-month 2000 --backend xlsx
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.generators import history_rows  # noqa: E402
+
+
+class _NullLogger:
+    def info(self, msg, **fields):
+        pass
+
+    warn = error = info
+
+
+def _month(k: int, first=(2023, 1)) -> str:
+    y, m = divmod(first[1] - 1 + k, 12)
+    return f"{first[0] + y}-{m + 1:02d}"
+
+
+def _rows(month: str, n: int, rng: random.Random):
+    start = datetime.strptime(month + "-02 08:00:00", "%Y-%m-%d %H:%M:%S")
+    for row in history_rows(n, month_ref=month, start=start):
+        i = int(row["cod_cliente"]) - 100000
+        row["token"] = f"PERF-{month.replace('-', '')}-{i:013d}"
+        row["cc_email"] = f"lider{i % 25}@empresa.com.br" if i % 7 else ""
+        roll = rng.random()
+        sent = datetime.strptime(row["datetime_sent"], "%Y-%m-%d %H:%M:%S")
+        if roll < 0.45:
+            row["status"] = "RESPONDIDO"
+        elif roll < 0.85:
+            row["status"] = "COBRADO"
+        if row["status"] != "ENVIADO":
+            row["last_update_at"] = (sent + timedelta(hours=rng.uniform(2, 200))).strftime("%Y-%m-%d %H:%M:%S")
+        yield row
+
+
+def _write_history(cfg, months: list, per_month: int, rng: random.Random):
+    from src.performance_audit.history_store import open_history
+
+    history = open_history(cfg)
+    with history.writer() as hw:
+        for month in months:
+            for row in _rows(month, per_month, rng):
+                hw.append(row)
+    history.close()
+
+
+def _config(tmp: Path, backend: str, month_ref: str):
+    from src.performance_audit.config import Config
+
+    return Config({
+        "project": {"month_ref": month_ref},
+        "paths": {
+            "history_xlsx": str(tmp / "history.xlsx"),
+            "history_sqlite": str(tmp / "history.sqlite"),
+            "analytics_archive": str(tmp / "analytics"),
+            "analytics_report": str(tmp / "report.xlsx"),
+            "status_transitions_dir": str(tmp / "transitions"),
+        },
+        "history": {"backend": backend, "flush_every_rows": 5000, "flush_interval_sec": 600},
+    })
+
+
+def _manual_pivot(cfg) -> float:
+    import pandas as pd
+
+    from src.performance_audit.history_store import open_history
+
+    t0 = time.perf_counter()
+    history = open_history(cfg)
+    df = pd.DataFrame(list(history.iter_rows()))
+    history.close()
+    df.groupby(["cod_assessor", "status"]).size()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--rows-per-month", type=int, default=2000)
+    parser.add_argument("--backend", choices=["xlsx", "sqlite"], default="xlsx")
+    args = parser.parse_args()
+
+    from src.performance_audit import transitions
+    from src.performance_audit.analytics import analytics
+
+    rng = random.Random(7)
+    months = [_month(k) for k in range(args.months)]
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_analytics_") as tmp:
+        tmp = Path(tmp)
+        cfg = _config(tmp, args.backend, months[-1])
+        t0 = time.perf_counter()
+        _write_history(cfg, months, args.rows_per_month, rng)
+        # mês corrente com log de cobranças: três rodadas de follow-up
+        for k in range(3):
+            tokens = {f"PERF-{months[-1].replace('-', '')}-{i:013d}": "COBRADO"
+                      for i in range(0, args.rows_per_month, 2 + k)}
+            transitions.append(tmp / "transitions", months[-1], tokens, at=f"{months[-1]}-1{k} 09:00:00")
+        print(f"Histórico: {args.months} meses x {args.rows_per_month} linhas ({args.backend}) "
+              f"gerado em {time.perf_counter() - t0:.1f}s")
+
+        def timed(name: str, fn):
+            t = time.perf_counter()
+            fn()
+            results[name] = round(time.perf_counter() - t, 3)
+            print(f"{name:>18}: {results[name]:>8.3f}s")
+
+        timed("pivot manual", lambda: _manual_pivot(cfg))
+        timed("analytics (1ª)", lambda: analytics(cfg, _NullLogger()))
+        timed("analytics (2ª)", lambda: analytics(cfg, _NullLogger()))
+
+        new_month = _month(args.months)
+        cfg = _config(tmp, args.backend, new_month)
+        _write_history(cfg, [new_month], args.rows_per_month, rng)
+        timed("mês novo", lambda: analytics(cfg, _NullLogger()))
+        tables = analytics(cfg, _NullLogger())
+        print(tables["mes"].tail(3).to_string(index=False))
+
+    print(json.dumps({"months": args.months, "rows_per_month": args.rows_per_month, "backend": args.backend,
+                      "results": results}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
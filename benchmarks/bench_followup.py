@@ -0,0 +1,135 @@
+"""
+Harness do follow-up incremental com uma Inbox falsa (roda em Linux).
+
+Roda a varredura duas vezes: na segunda, depois de chegarem mensagens novas,
+só os itens novos podem ter Subject/Body lidos. Depois compara, numa caixa com
+respostas sem o token no texto, o casamento por ConversationID/In-Reply-To com
+a busca do token. Conta as leituras de propriedade (cada uma é uma chamada COM
+no Outlook de verdade).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_followup.py --inbox 20000 --new 50
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.fake_outlook import ComStats, FakeApplication  # noqa: E402
+from src.performance_audit.followup import (  # noqa: E402
+    ReplyIndex,
+    Watermark,
+    _inbox_items,
+    _prefix_entry_ids,
+    scan_mailbox,
+)
+
+# propriedades do MailItem contadas no relatório (cada leitura é uma chamada COM)
+_PROPS = ("Subject", "Body", "EntryID", "ReceivedTime", "ConversationID", "PropertyAccessor")
+
+
+def _reads(app: FakeApplication) -> dict:
+    return {p: app.stats.calls[f"FakeMailItem.{p}"] for p in _PROPS}
+
+
+def _inbox(app: FakeApplication):
+    return app.ns.store.folders[6]
+
+
+def fill(app: FakeApplication, n: int, reply_every: int, offset: int = 0):
+    for k in range(n):
+        i = offset + k
+        if reply_every and i % reply_every == 0:
+            app.add_inbox(f"RE: Auditoria PERF-2025-01-{i:06d}", "ok, segue retorno")
+        else:
+            app.add_inbox(f"Assunto qualquer {i}", "texto " * 50)
+
+
+def run_once(app: FakeApplication, tokens, state: dict, since: datetime | None, scan_limit: int):
+    folder = _inbox(app)
+    key = folder.peek("FolderPath")
+    wm = Watermark.from_dict(state.get(key))
+    cut = max((d for d in (wm.received, since) if d), default=None)
+    app.stats.reset()
+    items = _inbox_items(folder, since=cut, token_prefix="PERF-", newest_first=False)
+    matches = scan_mailbox(items, tokens, scan_limit, watermark=wm)
+    state[key] = wm.to_dict()
+    return {
+        "restricted_count": items.Count,
+        "items_new": wm.seen,
+        "matches": len(matches),
+        "reads": _reads(app),
+    }
+
+
+def compare_matching(n_items: int, n_tokens: int):
+    """Caixa onde metade das respostas perdeu o token: IDs x busca no texto."""
+    app = FakeApplication(ComStats())
+    index = ReplyIndex()
+    tokens = [f"PERF-2025-01-{t:06d}" for t in range(n_tokens)]
+    for t, token in enumerate(tokens):
+        index.add(token, conversation_id=f"CONV{t:06d}" if t % 2 else "", internet_message_id=f"<msg{t}@empresa>")
+
+    replied = set(range(0, n_tokens, 3))
+    for i in range(n_items):
+        t = i % n_tokens
+        if i < n_tokens and t in replied:
+            # resposta: conversa e In-Reply-To certos, token removido do texto
+            app.add_inbox("RE: Auditoria", "ok", conversation_id=f"CONV{t:06d}" if t % 2 else "",
+                          in_reply_to=f"<msg{t}@empresa>")
+        else:
+            app.add_inbox(f"Assunto {i}", "texto " * 50, conversation_id=f"OUTRA{i}")
+
+    folder = _inbox(app)
+    out = {}
+    for name, idx in (("token", None), ("ids", index)):
+        app.stats.reset()
+        candidates = _prefix_entry_ids(folder, None, "PERF-", n_items) if idx else None
+        matches = scan_mailbox(_inbox_items(folder, newest_first=False), tokens, n_items,
+                               reply_index=idx, body_candidates=candidates)
+        out[name] = {"matches": len(matches), "reads": _reads(app)}
+    out["expected_matches"] = len(replied)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--inbox", type=int, default=20_000)
+    parser.add_argument("--new", type=int, default=50)
+    parser.add_argument("--reply-every", type=int, default=7)
+    parser.add_argument("--scan-limit", type=int, default=5_000)
+    args = parser.parse_args()
+
+    app = FakeApplication(ComStats())
+    start = app.clock
+    fill(app, args.inbox, args.reply_every)
+
+    # tokens em aberto que nunca recebem resposta: a varredura não para cedo
+    tokens = [f"PERF-2025-01-X{i:05d}" for i in range(100)]
+    state = {}
+
+    first = run_once(app, tokens, state, since=start, scan_limit=args.inbox + args.new)
+    fill(app, args.new, args.reply_every, offset=args.inbox)
+    second = run_once(app, tokens, state, since=start, scan_limit=args.scan_limit)
+
+    # segunda execução: só as mensagens novas têm o conteúdo lido
+    new_with_prefix = sum(1 for i in range(args.inbox, args.inbox + args.new)
+                          if args.reply_every and i % args.reply_every == 0)
+    ok = second["reads"]["Subject"] == new_with_prefix and second["items_new"] == new_with_prefix
+
+    matching = compare_matching(min(args.inbox, 5_000), 300)
+    ok = ok and matching["ids"]["matches"] == matching["expected_matches"]
+
+    print(json.dumps({"inbox": args.inbox, "new": args.new, "first": first, "second": second,
+                      "expected_new_items": new_with_prefix, "only_new_items_read": ok,
+                      "matching": matching}, indent=2))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Follow-up sobre exportações de e-mail (mbox + Maildir) geradas sinteticamente.
+
+A exportação imita um journal: traz os e-mails enviados (com o token no corpo,
+que não podem contar como resposta), respostas casáveis só pelo In-Reply-To,
+respostas com o token no assunto ou só no corpo, e ruído.
+
+Compara:
+    parse completo    mailbox.mbox/Maildir da stdlib, cada mensagem interpretada
+    scan (1 proc.)    mail_export.scan_exports com um processo
+    scan (N proc.)    o mesmo com o pool de processos
+e confere que os três acham as mesmas respostas. Depois roda o follow-up com
+`followup.backend: files` de ponta a ponta, uma segunda vez sem mudanças (nada
+é lido) e uma terceira com mensagens acrescentadas ao mbox (só o fim é lido).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_mail_export.py --tokens 5000 --messages 100000 --processes 4
+"""
+
+import argparse
+import json
+import mailbox
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from email import message_from_bytes
+from email.policy import default as default_policy
+from email.utils import format_datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.generators import history_rows  # noqa: E402
+from benchmarks.harness import NullLogger, make_config  # noqa: E402
+
+_FROM = "riscos@empresa.com.br"
+_FILLER = "Segue a posição consolidada da carteira conforme conversamos. " * 12
+
+
+def _message(msg_id: str, sender: str, subject: str, body: str, when: datetime,
+             in_reply_to: str = "") -> str:
+    headers = [
+        f"From: {sender}",
+        "To: riscos@empresa.com.br",
+        f"Subject: {subject}",
+        f"Date: {format_datetime(when.astimezone())}",
+        f"Message-ID: {msg_id}",
+    ]
+    if in_reply_to:
+        headers += [f"In-Reply-To: {in_reply_to}", f"References: {in_reply_to}"]
+    headers += ["MIME-Version: 1.0", "Content-Type: text/plain; charset=utf-8",
+                "Content-Transfer-Encoding: 8bit"]
+    return "\n".join(headers) + "\n\n" + body + "\n"
+
+
+def _exports(rows: list, n_messages: int, rng: random.Random, start: datetime):
+    """Mensagens (texto) e o gabarito {token: critério} das respostas."""
+    msgs = []
+    expected = {}
+    for row in rows:
+        # cópia do envio no journal: tem o token, mas é nossa
+        msgs.append(_message(row["internet_message_id"], _FROM, row["subject"],
+                             f"Prezado assessor, token {row['token']}.\n{_FILLER}", start))
+    for k, row in enumerate(rows[::3]):
+        mid = f"<reply{k}@assessoria.com.br>"
+        kind = k % 3
+        if kind == 0:
+            msgs.append(_message(mid, row["to_email"], f"RE: {row['subject']}", "De acordo.\n" + _FILLER,
+                                 start, in_reply_to=row["internet_message_id"]))
+            expected[row["token"]] = "in_reply_to"
+        elif kind == 1:
+            msgs.append(_message(mid, row["to_email"], f"Resposta {row['token']}", "Ok.\n" + _FILLER, start))
+            expected[row["token"]] = "token_assunto"
+        else:
+            msgs.append(_message(mid, row["to_email"], "Auditoria", f"Sobre {row['token']}: ciente.\n" + _FILLER,
+                                 start))
+            expected[row["token"]] = "token_corpo"
+    for k in range(max(0, n_messages - len(msgs))):
+        msgs.append(_message(f"<noise{k}@externo.com>", f"pessoa{k % 300}@externo.com", f"Assunto {k}",
+                             _FILLER, start))
+    rng.shuffle(msgs)
+    return msgs, expected
+
+
+def _write_mbox(path: Path, msgs: list, when: datetime, mode: str = "w"):
+    stamp = when.strftime("%a %b %d %H:%M:%S %Y")
+    with open(path, mode, encoding="utf-8", newline="\n") as f:
+        for m in msgs:
+            f.write(f"From MAILER-DAEMON {stamp}\n{m}\n")
+
+
+def _write_maildir(root: Path, msgs: list):
+    for sub in ("cur", "new", "tmp"):
+        (root / sub).mkdir(parents=True, exist_ok=True)
+    for k, m in enumerate(msgs):
+        (root / "cur" / f"{k:08d}.host:2,S").write_text(m, encoding="utf-8", newline="\n")
+
+
+def _full_parse(paths: list, tokens: set, id_map: dict) -> dict:
+    """Caminho ingênuo: interpreta todas as mensagens com o pacote email (tokens com o regex do follow-up)."""
+    from src.performance_audit.followup import TokenMatcher
+
+    matcher = TokenMatcher(tokens)
+    found = {}
+    boxes = [mailbox.mbox(p) if p.is_file() else mailbox.Maildir(p) for p in paths]
+    for box in boxes:
+        for raw in box.itervalues():
+            msg = message_from_bytes(raw.as_bytes(), policy=default_policy)
+            if str(msg.get("From", "")) == _FROM:
+                continue
+            ref = str(msg.get("In-Reply-To", "") or "").strip("<> ")
+            if id_map.get(ref) in tokens:
+                found.setdefault(id_map[ref], "in_reply_to")
+                continue
+            text = str(msg.get("Subject", "")) + "\n" + msg.get_content()
+            for token in matcher.find(text):
+                found.setdefault(token, "texto")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--processes", type=int, default=max(2, min(8, os.cpu_count() or 2)))
+    parser.add_argument("--chunk-mb", type=float, default=16)
+    args = parser.parse_args()
+
+    from src.performance_audit.followup import ReplyIndex, followup
+    from src.performance_audit.history_store import open_history
+    from src.performance_audit.mail_export import scan_exports
+    from src.performance_audit.token_utils import make_token
+
+    rng = random.Random(7)
+    sent_at = datetime(2025, 1, 2, 8, 0, 0)
+    rows = []
+    for row in history_rows(args.tokens, start=sent_at):
+        row["token"] = make_token("2025-01", row["cod_cliente"], row["cod_assessor"])
+        rows.append(row)
+    reply_at = sent_at + timedelta(days=args.tokens * 30 // 86400 + 2)
+    msgs, expected = _exports(rows, args.messages, rng, reply_at)
+
+    out = {"tokens": args.tokens, "messages": len(msgs), "processes": args.processes}
+    with tempfile.TemporaryDirectory(prefix="bench_mail_export_") as tmp:
+        tmp = Path(tmp)
+        exports = tmp / "exports"
+        exports.mkdir()
+        cut = len(msgs) * 9 // 10
+        t0 = time.perf_counter()
+        _write_mbox(exports / "journal.mbox", msgs[:cut], reply_at)
+        _write_maildir(exports / "maildir", msgs[cut:])
+        size_mb = sum(p.stat().st_size for p in exports.rglob("*") if p.is_file()) / 1048576
+        out["export_mb"] = round(size_mb, 1)
+        print(f"Exportação: {len(msgs)} mensagens, {size_mb:.0f} MB em {time.perf_counter() - t0:.1f}s")
+
+        tokens = [r["token"] for r in rows]
+        index = ReplyIndex()
+        for r in rows:
+            index.add(r["token"], internet_message_id=r["internet_message_id"])
+
+        def scan(processes: int) -> dict:
+            cfg = make_config(tmp, **{"followup.export_paths": [str(exports)], "followup.export_workers": processes,
+                                  "followup.export_chunk_mb": args.chunk_mb})
+            res = scan_exports(cfg, NullLogger(), tokens, index, sent_at, {}, full_rescan=True)
+            return {t: hit["matched_by"] for r in res for t, hit in r["matches"].items()}
+
+        results = {}
+
+        def timed(name: str, fn):
+            t = time.perf_counter()
+            value = fn()
+            results[name] = round(time.perf_counter() - t, 3)
+            print(f"{name:>18}: {results[name]:>8.3f}s | {len(value)} resposta(s)")
+            return value
+
+        naive = timed("parse completo", lambda: _full_parse(
+            [exports / "journal.mbox", exports / "maildir"], set(tokens),
+            {k.strip("<>"): v for k, v in index.by_message_id.items()}))
+        one = timed("scan (1 proc.)", lambda: scan(1))
+        many = timed(f"scan ({args.processes} proc.)", lambda: scan(args.processes))
+        out["results"] = results
+        out["same_tokens"] = set(naive) == set(one) == set(many) == set(expected)
+        out["same_criteria"] = one == many == expected
+
+        # ===== follow-up de ponta a ponta com o backend de arquivos =====
+        cfg = make_config(tmp, **{
+            "followup.backend": "files",
+            "followup.export_paths": [str(exports)],
+            "followup.export_workers": args.processes,
+            "followup.export_chunk_mb": args.chunk_mb,
+        })
+        history = open_history(cfg)
+        with history.writer() as hw:
+            for r in rows:
+                hw.append(r)
+        history.close()
+
+        from src.performance_audit import metrics
+
+        runs = {}
+        for name in ("1ª execução", "sem mudança", "mbox cresceu"):
+            if name == "mbox cresceu":
+                # uma resposta nova (por In-Reply-To) para um token ainda cobrado
+                late = next(r for r in rows if r["token"] not in expected)
+                extra = [_message("<late@assessoria.com.br>", late["to_email"], f"RE: {late['subject']}", "Ok.",
+                                  reply_at + timedelta(days=3), in_reply_to=late["internet_message_id"])]
+                _write_mbox(exports / "journal.mbox", extra, reply_at, mode="a")
+            metrics.METRICS.reset()
+            t = time.perf_counter()
+            followup(cfg, NullLogger())
+            counters = metrics.METRICS.summary().get("counters", {})
+            runs[name] = {"wall_sec": round(time.perf_counter() - t, 3),
+                          "bytes_read": sum(v for k, v in counters.items() if k.startswith("export_bytes"))}
+            print(f"{name:>18}: {runs[name]['wall_sec']:>8.3f}s | {runs[name]['bytes_read'] / 1048576:.1f} MB lidos")
+
+        history = open_history(cfg)
+        statuses = {}
+        for r in history.iter_rows():
+            statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+        history.close()
+        out["followup"] = runs
+        out["statuses"] = statuses
+        out["expected_replies"] = len(expected) + 1
+
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
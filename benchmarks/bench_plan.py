@@ -0,0 +1,85 @@
+"""
+Tempo do estágio de planejamento do dispatch sobre bases sintéticas.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_plan.py --aud-rows 100000 --prof-rows 10000
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.performance_audit.planning import build_plan  # noqa: E402
+
+COLS = {
+    "c_cod_cli": "Cod Cliente", "c_nome_cli": "Nome Cliente", "c_cod_ass": "Cod Assessor",
+    "p_cod": "Cod Assessor", "p_nome": "Nome Assessor", "p_email": "E-mail",
+    "p_cod_lider": "Cod Lider", "p_email_lider": "E-mail Líder",
+}
+
+
+def make_frames(aud_rows: int, prof_rows: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+
+    codes = np.arange(1, prof_rows + 1)
+    leaders = rng.choice(codes[: max(1, prof_rows // 20)], size=prof_rows)
+    emails = np.array([f"assessor{c}@empresa.com.br" for c in codes], dtype=object)
+    emails[rng.random(prof_rows) < 0.02] = "sem-email"
+    df_prof = pd.DataFrame({
+        # mistura de formatos como aparecem no Excel: "A123", 123.0, " 123 "
+        "Cod Assessor": np.where(codes % 3 == 0, [f"A{c}" for c in codes], codes.astype(float)),
+        "Nome Assessor": [f"Assessor {c}" for c in codes],
+        "E-mail": emails,
+        "Cod Lider": leaders.astype(float),
+        "E-mail Líder": [f"lider{c}@empresa.com.br" for c in leaders],
+        "Filial": rng.integers(1, 50, prof_rows),
+        "Observacoes": ["x" * 40] * prof_rows,
+    })
+
+    # ~1% dos clientes apontam para assessor inexistente
+    ass = rng.integers(1, int(prof_rows * 1.01) + 1, aud_rows)
+    df_aud = pd.DataFrame({
+        "Cod Cliente": rng.integers(100000, 999999, aud_rows),
+        "Nome Cliente": [f"Cliente {i}" for i in range(aud_rows)],
+        "Cod Assessor": [f"A{a}" if a % 2 else str(a) for a in ass],
+        "Rentabilidade": rng.normal(-0.05, 0.1, aud_rows),
+    })
+    return df_aud, df_prof
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--aud-rows", type=int, default=100_000)
+    parser.add_argument("--prof-rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df_aud, df_prof = make_frames(args.aud_rows, args.prof_rows)
+
+    times = []
+    plan = None
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        plan = build_plan(df_aud, df_prof, COLS, "Auditoria – {nome_cliente} – {cod_cliente}", {"A1"})
+        times.append(time.perf_counter() - t0)
+
+    print(json.dumps({
+        "scenario": "plan",
+        "aud_rows": args.aud_rows,
+        "prof_rows": args.prof_rows,
+        "best_sec": round(min(times), 4),
+        "mean_sec": round(sum(times) / len(times), 4),
+        "sendable": int((plan["skip_reason"] == "").sum()),
+        "skipped": plan["skip_reason"].value_counts().drop("", errors="ignore").to_dict(),
+    }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Harness do estágio de envio com o OutlookClient real sobre o Outlook falso (roda em Linux).
+
+Mede a vazão do SendPool por número de workers e confere que a taxa total
+nunca passa do limite configurado no TokenBucket. Sai com código 1 se a vazão
+não crescer com os workers (eficiência mínima `--min-efficiency` sobre o ganho
+linear) ou se o limite de taxa for furado.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_send.py --messages 200 --send-latency-ms 40
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.fake_outlook import ComStats, FakeApplication, install  # noqa: E402
+from src.performance_audit.rate_limit import TokenBucket  # noqa: E402
+from src.performance_audit.sender import ComTransport, SendJob, SendPool  # noqa: E402
+
+
+class _Row:
+    def __init__(self, i):
+        self.to_email = f"assessor{i}@empresa.com.br"
+        self.cc_email = ""
+        self.subject = f"Auditoria {i}"
+
+
+def max_in_window(times, window: float) -> int:
+    best, j = 0, 0
+    for i, t in enumerate(times):
+        while t - times[j] > window:
+            j += 1
+        best = max(best, i - j + 1)
+    return best
+
+
+def run(messages: int, workers: int, rate_per_min: float, burst: int, latency_ms: float, fail_every: int):
+    app = install(FakeApplication(ComStats(), send_latency_ms=latency_ms, fail_every=fail_every))
+    from src.performance_audit.outlook_client import OutlookClient
+
+    limiter = TokenBucket(rate_per_min, burst=burst)
+    transport = ComTransport(
+        lambda: OutlookClient(from_smtp=app.smtp, store_hint=app.store_name),
+        send_kwargs={"send_mode": "send", "force_send": True, "retry_send": 3,
+                     "backoff_base": 0.01, "backoff_max": 0.05},
+    )
+    pool = SendPool(transport, limiter=limiter, workers=workers)
+
+    t0 = time.perf_counter()
+    statuses = {}
+    for res in pool.run(SendJob(_Row(i), "<p>corpo</p>") for i in range(messages)):
+        statuses[res.status] = statuses.get(res.status, 0) + 1
+    wall = time.perf_counter() - t0
+
+    times = sorted(app.sent_at)
+    return {
+        "workers": workers,
+        "messages": messages,
+        "rate_per_min": rate_per_min,
+        "burst": burst,
+        "wall_sec": round(wall, 3),
+        "msgs_per_sec": round(messages / wall, 2) if wall else None,
+        # em qualquer janela de 1s cabem no máximo rate/60 + burst envios
+        "max_in_1s": max_in_window(times, 1.0),
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--send-latency-ms", type=float, default=40.0)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--fail-every", type=int, default=0)
+    parser.add_argument("--min-efficiency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    results = []
+
+    # 1) sem limite efetivo: a vazão deve crescer com os workers
+    for w in [int(x) for x in args.workers.split(",")]:
+        results.append(run(args.messages, w, rate_per_min=1_000_000, burst=w,
+                           latency_ms=args.send_latency_ms, fail_every=args.fail_every))
+    base = results[0]
+    failures = []
+    for r in results[1:]:
+        r["speedup"] = round(r["msgs_per_sec"] / base["msgs_per_sec"], 2)
+        r["scales"] = r["speedup"] >= args.min_efficiency * r["workers"] / base["workers"]
+        if not r["scales"]:
+            failures.append(f"{r['workers']} workers: {r['speedup']}x sobre {base['workers']} worker(s)")
+
+    # 2) limite apertado: mais workers não podem furar a taxa configurada
+    rate = 600.0
+    capped = run(min(args.messages, 60), 8, rate_per_min=rate, burst=5, latency_ms=args.send_latency_ms, fail_every=0)
+    limit = rate / 60.0 + capped["burst"]
+    capped["within_rate"] = capped["max_in_1s"] <= limit
+    results.append(capped)
+    if not capped["within_rate"]:
+        failures.append(f"taxa furada: {capped['max_in_1s']} envios em 1s (limite {limit:.0f})")
+
+    print(json.dumps({"scenario": "send", "results": results, "failures": failures}, ensure_ascii=False, indent=2))
+    for f in failures:
+        print(f"FALHA: {f}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
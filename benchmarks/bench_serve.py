@@ -0,0 +1,159 @@
+"""
+Modo serve contra o Outlook falso, num diretório temporário.
+
+Sequência de ciclos (relógio controlado, sem esperar o poll):
+    1. auditoria nova               -> plano + envio de todas as linhas enviáveis
+    2. nada mudou                   -> nenhum envio, nenhuma leitura de planilha
+    3. linhas novas na mesma planilha -> só as linhas novas saem
+    4. segunda auditoria no diretório -> só ela é processada
+    5. relógio passa do intervalo   -> follow-up roda na mesma sessão do Outlook
+
+Em cada ciclo mostra o tempo, os e-mails enviados e as chamadas COM; no fim,
+quantas sessões do Outlook (GetNamespace) e leituras da base de profissionais
+foram necessárias no total.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_serve.py --rows 2000 --extra 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.bench_plan import make_frames  # noqa: E402
+from benchmarks.fake_outlook import ComStats, FakeApplication, install  # noqa: E402
+from benchmarks.generators import write_frame  # noqa: E402
+
+
+class _NullLogger:
+    def info(self, msg, **fields):
+        pass
+
+    warn = error = info
+
+
+def _audit_frame(rows: int, prof_rows: int, first_code: int, seed: int):
+    df_aud, df_prof = make_frames(rows, prof_rows, seed=seed)
+    # códigos de cliente únicos: linhas novas não colidem com as já enviadas
+    df_aud["Cod Cliente"] = range(first_code, first_code + rows)
+    return df_aud, df_prof
+
+
+def _write_settled(df, path: Path):
+    write_frame(df, path)
+    # mtime no passado: o arquivo já conta como estável para o settle_sec
+    past = time.time() - 3600
+    os.utime(path, (past, past))
+
+
+def _config(tmp: Path, prof_path: Path) -> Path:
+    cfg = {
+        "project": {"month_ref": "2025-01"},
+        "paths": {
+            "auditoria_xlsx": str(tmp / "entrada" / "auditoria.xlsx"),
+            "profissionais_xlsx": str(prof_path),
+            "history_xlsx": str(tmp / "history.xlsx"),
+            "history_sqlite": str(tmp / "history.sqlite"),
+            "email_body_html": str(ROOT / "templates" / "email_body.html"),
+            "email_body_digest_html": str(ROOT / "templates" / "email_body_digest.html"),
+            "dispatch_checkpoint": str(tmp / "dispatch_checkpoint.json"),
+            "followup_state": str(tmp / "followup_state.json"),
+            "recipient_cache": str(tmp / "recipient_cache.json"),
+            "serve_state": str(tmp / "serve_state.json"),
+            "status_transitions_dir": str(tmp / "transitions"),
+        },
+        "outlook": {"from_smtp": "riscos@empresa.com.br", "store_hint": "riscos"},
+        "behavior": {"send_mode": "send", "force_send": True, "rate_per_minute": 1e9, "burst": 1000,
+                     "workers": 1, "retry_send": 1},
+        "signature": {"use_local_outlook_signature": False},
+        "history": {"backend": "sqlite", "flush_every_rows": 500, "flush_interval_sec": 30},
+        "followup": {"workers": 1},
+        "cache": {"enabled": False},
+        "serve": {
+            "watch_glob": str(tmp / "entrada" / "*.xlsx"),
+            "plan_dir": str(tmp / "serve"),
+            "settle_sec": 5,
+            "followup_interval_min": 60,
+            "poll_sec": 0,
+        },
+    }
+    path = tmp / "config.json"
+    path.write_text(json.dumps(cfg), encoding="utf-8")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--extra", type=int, default=200)
+    parser.add_argument("--com-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = install(FakeApplication(ComStats(args.com_latency_ms), reply_rate=0.3))
+
+    from src.performance_audit import metrics
+    from src.performance_audit.serve import Server
+
+    with tempfile.TemporaryDirectory(prefix="bench_serve_") as tmp:
+        tmp = Path(tmp)
+        (tmp / "entrada").mkdir()
+        prof_rows = max(100, args.rows // 10)
+        df_aud, df_prof = _audit_frame(args.rows, prof_rows, 1_000_000, seed=7)
+        prof_path = tmp / "profissionais.xlsx"
+        _write_settled(df_prof, prof_path)
+        audit = tmp / "entrada" / "auditoria.xlsx"
+        _write_settled(df_aud, audit)
+
+        now = [time.time()]
+        server = Server(str(_config(tmp, prof_path)), _NullLogger(), clock=lambda: now[0])
+
+        def cycle(name: str):
+            app.stats.reset()
+            metrics.METRICS.reset()
+            sent0 = app.sent
+            t0 = time.perf_counter()
+            res = server.tick()
+            wall = time.perf_counter() - t0
+            counters = metrics.METRICS.summary()["counters"]
+            out = {"wall_sec": round(wall, 3), "files": len(res["files"]), "sent": app.sent - sent0,
+                   "followup": res["followup"], "errors": res["errors"], "com_calls": app.stats.total(),
+                   "sessions": app.stats.calls.get("Application.GetNamespace", 0),
+                   "prof_cache_hits": counters.get("prof_cache_hits", 0)}
+            print(f"{name:>22}: {out['wall_sec']:>7.3f}s | arquivos {out['files']} | enviados {out['sent']:>5} | "
+                  f"follow-up {'sim' if out['followup'] else 'não'} | COM {out['com_calls']:>6} | "
+                  f"profissionais em cache {out['prof_cache_hits']}"
+                  f"{' | ERROS ' + '; '.join(out['errors']) if out['errors'] else ''}")
+            return out
+
+        results = {"primeira_auditoria": cycle("auditoria nova")}
+        # o primeiro ciclo já rodou o follow-up (nunca tinha rodado); o próximo só depois do intervalo
+        results["sem_mudanca"] = cycle("sem mudança")
+
+        extra, _ = _audit_frame(args.extra, prof_rows, 2_000_000, seed=11)
+        _write_settled(pd.concat([df_aud, extra], ignore_index=True), audit)
+        results["linhas_novas"] = cycle("linhas novas")
+
+        second, _ = _audit_frame(args.extra, prof_rows, 3_000_000, seed=13)
+        _write_settled(second, tmp / "entrada" / "auditoria_2.xlsx")
+        results["segunda_auditoria"] = cycle("segunda auditoria")
+
+        now[0] += 61 * 60
+        results["followup"] = cycle("intervalo do follow-up")
+
+        sessions = sum(r["sessions"] for r in results.values())
+        print(f"Envios totais: {app.sent} | ciclos: {server.cycles} | sessões do Outlook abertas: {sessions}")
+
+    print(json.dumps({"rows": args.rows, "extra": args.extra, "results": results}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
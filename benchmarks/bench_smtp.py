@@ -0,0 +1,158 @@
+"""
+Transporte SMTP contra um servidor SMTP falso local (benchmarks/fake_smtp.py).
+
+Cenários:
+    pool        vazão do SendPool + SmtpTransport por tamanho de pool, com e sem
+                reaproveitar a conexão (max_messages_per_connection=1 reabre a
+                cada mensagem, como um envio ingênuo com smtplib)
+    dispatch    dispatch completo com behavior.transport=smtp: confere que o
+                Message-ID gravado no histórico é o que o servidor recebeu e
+                que o follow-up casa as respostas (In-Reply-To) por ele
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_smtp.py --messages 400 --connect-latency-ms 80 --message-latency-ms 5
+
+Também roda contra o aiosmtpd (`python -m aiosmtpd -n -l localhost:8025`) apontando
+smtp.host/smtp.port para ele, com smtp.starttls=false e sem smtp.username.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.fake_smtp import FakeSmtpServer  # noqa: E402
+from benchmarks.generators import DEFAULT_WORKDIR  # noqa: E402
+from benchmarks.harness import NullLogger, make_config  # noqa: E402
+from benchmarks.run_suite import _fake_app  # noqa: E402
+
+_USER, _PASSWORD = "riscos", "segredo"
+
+
+class _Row:
+    def __init__(self, i):
+        self.to_email = f"assessor{i}@empresa.com.br"
+        self.cc_email = f"lider{i % 10}@empresa.com.br"
+        self.subject = f"Auditoria de Desempenho – Cliente {i}"
+
+
+def _settings(srv: FakeSmtpServer, max_messages: int) -> dict:
+    return {
+        "host": srv.host, "port": srv.port, "ssl": False, "starttls": False,
+        "username": _USER, "password": _PASSWORD, "timeout": 10.0,
+        "max_messages": max_messages, "from_addr": "riscos@empresa.com.br",
+    }
+
+
+def run_pool(messages: int, pool_size: int, max_messages: int, connect_ms: float, message_ms: float) -> dict:
+    from src.performance_audit.rate_limit import TokenBucket
+    from src.performance_audit.sender import SendJob, SendPool
+    from src.performance_audit.smtp_transport import SmtpTransport
+
+    with FakeSmtpServer(credentials=(_USER, _PASSWORD), connect_latency_ms=connect_ms,
+                        message_latency_ms=message_ms) as srv:
+        transport = SmtpTransport(_settings(srv, max_messages), retry_send=2, backoff_base=0.01, backoff_max=0.05)
+        pool = SendPool(transport, limiter=TokenBucket(1e9, burst=pool_size), workers=pool_size)
+        statuses = {}
+        t0 = time.perf_counter()
+        for res in pool.run(SendJob(_Row(i), "<p>corpo</p>") for i in range(messages)):
+            statuses[res.status] = statuses.get(res.status, 0) + 1
+        wall = time.perf_counter() - t0
+    return {
+        "pool_size": pool_size,
+        "max_messages_per_connection": max_messages,
+        "messages": messages,
+        "wall_sec": round(wall, 3),
+        "msgs_per_sec": round(messages / wall, 1) if wall else None,
+        "connections": srv.stats["connections"],
+        "max_concurrent": srv.stats["max_concurrent"],
+        "statuses": statuses,
+    }
+
+
+def run_dispatch(rows: int, pool_size: int, workdir: Path, tmp: Path) -> dict:
+    from benchmarks.generators import write_inputs
+
+    inputs = write_inputs(workdir, rows)
+    # Outlook falso instalado só para provar que o envio SMTP não abre sessão COM
+    app = _fake_app(0.0)
+
+    from src.performance_audit.dispatch import dispatch
+    from src.performance_audit.followup import followup
+    from src.performance_audit.history_store import open_history
+
+    os.environ["PERF_AUDIT_SMTP_PASSWORD"] = _PASSWORD
+    with FakeSmtpServer(credentials=(_USER, _PASSWORD)) as srv:
+        cfg = make_config(tmp, **{
+            "paths.auditoria_xlsx": str(inputs["auditoria"]),
+            "paths.profissionais_xlsx": str(inputs["profissionais"]),
+            "behavior.transport": "smtp",
+            "smtp": {"host": srv.host, "port": srv.port, "starttls": False, "username": _USER,
+                     "pool_size": pool_size, "max_messages_per_connection": 100},
+        })
+        t0 = time.perf_counter()
+        dispatch(cfg, NullLogger())
+        wall = time.perf_counter() - t0
+
+    history = open_history(cfg)
+    sent = [r for r in history.iter_rows() if r.get("internet_message_id")]
+    history.close()
+    com_calls = app.stats.total()
+    received = {mid for mid, _ in srv.messages}
+    recorded = {r["internet_message_id"] for r in sent}
+
+    # metade das mensagens respondidas pelo cliente de e-mail do assessor, depois do envio
+    app.clock = datetime.now()
+    for r in sent[::2]:
+        app.add_inbox(f"RE: {r['subject']}", "De acordo.", in_reply_to=r["internet_message_id"])
+    app.fill_inbox(len(sent))
+    followup(cfg, NullLogger())
+    history = open_history(cfg)
+    replied = sum(1 for r in history.iter_rows() if str(r.get("status", "")).upper() == "RESPONDIDO")
+    history.close()
+
+    return {
+        "rows": rows,
+        "pool_size": pool_size,
+        "wall_sec": round(wall, 3),
+        "server_messages": srv.stats["messages"],
+        "connections": srv.stats["connections"],
+        "history_sent": len(sent),
+        "message_ids_match": recorded == received and len(recorded) == len(sent),
+        "com_calls_during_send": com_calls,
+        "replies_expected": len(sent[::2]),
+        "replies_matched": replied,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--pool-sizes", default="1,4")
+    parser.add_argument("--connect-latency-ms", type=float, default=80.0)
+    parser.add_argument("--message-latency-ms", type=float, default=5.0)
+    parser.add_argument("--dispatch-rows", type=int, default=1000)
+    parser.add_argument("--workdir", default=str(DEFAULT_WORKDIR))
+    args = parser.parse_args()
+
+    results = []
+    for size in [int(x) for x in args.pool_sizes.split(",")]:
+        for max_messages in (1, 100):
+            results.append(run_pool(args.messages, size, max_messages,
+                                    args.connect_latency_ms, args.message_latency_ms))
+
+    with tempfile.TemporaryDirectory(prefix="bench_smtp_") as tmp:
+        e2e = run_dispatch(args.dispatch_rows, 4, Path(args.workdir), Path(tmp))
+
+    print(json.dumps({"scenario": "smtp", "pool": results, "dispatch": e2e}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Tempo de inicialização do CLI por subcomando.
+
+Cada caso roda `main.py` num processo novo (várias vezes, fica a mediana) e
+informa quais módulos pesados (pandas, numpy, openpyxl, pyarrow, win32com)
+foram carregados. Os subcomandos com --help medem só o caminho até o argparse;
+`status` roda de verdade contra um histórico sintético (xlsx e sqlite).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_startup.py --repeat 5 --history-rows 20000
+"""
+
+import argparse
+import json
+import runpy
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+HEAVY = ("pandas", "numpy", "openpyxl", "pyarrow", "win32com")
+
+HELP_CASES = ["--help", "plan --help", "dispatch --help", "followup --help", "export-history --help",
+              "status --help"]
+
+
+def run_child(argv: list) -> dict:
+    # dentro do subprocesso: importa e roda o main.py como script, conta o que foi carregado
+    t0 = time.perf_counter()
+    sys.argv = [str(ROOT / "main.py")] + argv
+    try:
+        runpy.run_path(str(ROOT / "main.py"), run_name="__main__")
+    except SystemExit:
+        pass
+    elapsed = time.perf_counter() - t0
+    loaded = sorted(m for m in HEAVY if m in sys.modules)
+    return {"sec": round(elapsed, 4), "heavy": loaded}
+
+
+def _config(tmp: Path, backend: str) -> Path:
+    cfg = {
+        "project": {"month_ref": "2025-01"},
+        "paths": {"history_xlsx": str(tmp / "history.xlsx"), "history_sqlite": str(tmp / "history.sqlite")},
+        "history": {"backend": backend},
+    }
+    path = tmp / f"config_{backend}.json"
+    path.write_text(json.dumps(cfg), encoding="utf-8")
+    return path
+
+
+def _seed(tmp: Path, rows: int):
+    from benchmarks.generators import write_history
+    from src.performance_audit.config import Config
+    from src.performance_audit.history_store import open_history
+
+    write_history(tmp / "history.xlsx", rows)
+    for backend in ("xlsx", "sqlite"):
+        # primeira consulta monta o índice lateral (xlsx) / importa a planilha (sqlite)
+        history = open_history(Config(json.loads(_config(tmp, backend).read_text(encoding="utf-8"))))
+        history.status_counts("2025-01")
+        history.close()
+
+
+def measure(argv: list, repeat: int) -> dict:
+    walls, inner, heavy = [], [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, __file__, "--child", json.dumps(argv)],
+                             capture_output=True, text=True, cwd=ROOT, check=True)
+        walls.append(time.perf_counter() - t0)
+        res = json.loads(out.stdout.strip().splitlines()[-1])
+        inner.append(res["sec"])
+        heavy = res["heavy"]
+    return {"wall_sec": round(statistics.median(walls), 4), "main_sec": round(statistics.median(inner), 4),
+            "heavy_modules": heavy}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--history-rows", type=int, default=20_000)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(json.loads(args.child))))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as tmp:
+        tmp = Path(tmp)
+        _seed(tmp, args.history_rows)
+        cases = {c: c.split() for c in HELP_CASES}
+        for backend in ("xlsx", "sqlite"):
+            cases[f"status ({backend})"] = ["--config", str(_config(tmp, backend)), "status"]
+
+        for name, argv in cases.items():
+            res = measure(argv, args.repeat)
+            results[name] = res
+            print(f"{name:>24}: {res['wall_sec'] * 1000:>7.0f} ms processo | {res['main_sec'] * 1000:>7.0f} ms main | "
+                  f"pesados: {', '.join(res['heavy_modules']) or '-'}")
+
+    print(json.dumps({"repeat": args.repeat, "history_rows": args.history_rows, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
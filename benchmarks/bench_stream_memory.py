@@ -0,0 +1,94 @@
+"""
+Pico de memória do planejamento: leitura completa (pandas) x streaming em blocos (openpyxl read_only).
+
+Gera uma auditoria sintética em xlsx (openpyxl write_only) e roda cada modo
+num subprocesso separado, medindo o pico de RSS de cada um.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_stream_memory.py --aud-rows 1000000 --chunk-rows 50000
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_plan import COLS  # noqa: E402
+from benchmarks.generators import DEFAULT_WORKDIR, write_inputs  # noqa: E402
+
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        import psutil  # Windows: resource não existe
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB, macOS em bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_mode(mode: str, aud: str, prof: str, chunk_rows: int):
+    from src.performance_audit.excel_utils import iter_excel_chunks, read_excel_first_sheet
+    from src.performance_audit.planning import build_plan, plan_from_lookup, prof_lookup
+
+    subject = "Auditoria – Cliente {nome_cliente} – {cod_cliente}"
+    t0 = time.perf_counter()
+    df_prof, _ = read_excel_first_sheet(prof)
+
+    rows = 0
+    if mode == "eager":
+        df_aud, _ = read_excel_first_sheet(aud)
+        rows = len(build_plan(df_aud, df_prof, COLS, subject, ()))
+    else:
+        prof_tbl = prof_lookup(df_prof, COLS, ())
+        for block in iter_excel_chunks(aud, usecols=["Cod Cliente", "Nome Cliente", "Cod Assessor"],
+                                       chunk_rows=chunk_rows):
+            rows += len(plan_from_lookup(block, prof_tbl, COLS, subject))
+
+    return {"mode": mode, "rows": rows, "seconds": round(time.perf_counter() - t0, 2),
+            "peak_rss_mb": round(_peak_rss_mb(), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--aud-rows", type=int, default=1_000_000)
+    parser.add_argument("--prof-rows", type=int, default=10_000)
+    parser.add_argument("--chunk-rows", type=int, default=50_000)
+    parser.add_argument("--workdir", default=str(DEFAULT_WORKDIR))
+    parser.add_argument("--mode", choices=["eager", "streaming"], default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--aud", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--prof", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # subprocesso: mede um modo só, para o pico de RSS não misturar os dois
+        print(json.dumps(run_mode(args.mode, args.aud, args.prof, args.chunk_rows)))
+        return
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    paths = write_inputs(workdir, args.aud_rows, args.prof_rows)
+    print(f"Planilhas prontas em {time.perf_counter() - t0:.1f}s: {paths['auditoria']}")
+
+    results = []
+    for mode in ("eager", "streaming"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--aud", str(paths["auditoria"]),
+             "--prof", str(paths["profissionais"]), "--chunk-rows", str(args.chunk_rows)],
+            check=True, capture_output=True, text=True,
+        )
+        res = json.loads(out.stdout.strip().splitlines()[-1])
+        results.append(res)
+        print(f"{mode:>9}: {res['rows']} linhas | {res['seconds']}s | pico RSS {res['peak_rss_mb']} MB")
+
+    print(json.dumps({"aud_rows": args.aud_rows, "chunk_rows": args.chunk_rows, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+Outlook falso em processo, na fronteira do COM (win32com.client.Dispatch).
+
+`install()` registra módulos win32com/pywintypes/pythoncom falsos em sys.modules,
+então o OutlookClient, o dispatch e o follow-up reais rodam em Linux contra
+esta caixa. Cada acesso a propriedade ou método COM é contado em `ComStats`
+e pode custar uma latência fixa, para simular o custo de ida e volta ao Outlook.
+"""
+
+import itertools
+import random
+import re
+import sys
+import threading
+import time
+import types
+from collections import Counter
+from datetime import datetime, timedelta
+
+PR_INTERNET_MESSAGE_ID = "http://schemas.microsoft.com/mapi/proptag/0x1035001E"
+PR_IN_REPLY_TO_ID = "http://schemas.microsoft.com/mapi/proptag/0x1042001F"
+PR_INTERNET_REFERENCES = "http://schemas.microsoft.com/mapi/proptag/0x1039001F"
+PR_TRANSPORT_MESSAGE_HEADERS = "http://schemas.microsoft.com/mapi/proptag/0x007D001F"
+
+_MAPI_E_NOT_FOUND = -2147221233
+
+_DATE_RX = re.compile(r'datereceived" >= \'([^\']+)\'')
+_LIKE_RX = re.compile(r"subject\" LIKE '%([^%]+)%'")
+_TOKEN_RX = re.compile(r"Token:</b>\s*([^<\s]+)")
+
+
+class ComStats:
+    """Contador de chamadas COM (por nome) com latência opcional por chamada."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def hit(self, name: str):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+
+class _Com:
+    """Objeto COM falso: propriedades em `_p`; leitura e escrita de nomes públicos são contadas."""
+
+    def __init__(self, stats: ComStats, **props):
+        object.__setattr__(self, "_stats", stats)
+        object.__setattr__(self, "_p", dict(props))
+
+    def __getattr__(self, name):
+        props = self.__dict__.get("_p")
+        if props is None or name not in props:
+            raise AttributeError(name)
+        self._stats.hit(f"{type(self).__name__}.{name}")
+        return props[name]
+
+    def __setattr__(self, name, value):
+        if name[:1].isupper():
+            self._stats.hit(f"{type(self).__name__}.{name}=")
+            self._p[name] = value
+        else:
+            object.__setattr__(self, name, value)
+
+    def peek(self, name, default=None):
+        # acesso sem custo, só para o próprio fake (ordenar, filtrar)
+        return self._p.get(name, default)
+
+
+class FakePropertyAccessor(_Com):
+    def __init__(self, stats, values: dict):
+        super().__init__(stats)
+        object.__setattr__(self, "_values", values)
+
+    def GetProperty(self, name):
+        self._stats.hit("PropertyAccessor.GetProperty")
+        if name not in self._values:
+            raise Exception("propriedade não encontrada")
+        return self._values[name]
+
+    def GetProperties(self, names):
+        self._stats.hit("PropertyAccessor.GetProperties")
+        return tuple(self._values.get(n, _MAPI_E_NOT_FOUND) for n in names)
+
+
+class FakeRecipients(_Com):
+    def __init__(self, stats, resolve_ok: bool = True):
+        super().__init__(stats)
+        object.__setattr__(self, "_ok", resolve_ok)
+
+    def ResolveAll(self):
+        self._stats.hit("Recipients.ResolveAll")
+        return self._ok
+
+
+class FakeRecipient(_Com):
+    """Namespace.CreateRecipient: Resolve() consulta o catálogo falso."""
+
+    def __init__(self, app, address: str):
+        super().__init__(app.stats, Resolved=False, AddressEntry=None)
+        object.__setattr__(self, "_app", app)
+        object.__setattr__(self, "_address", address)
+
+    def Resolve(self):
+        self._stats.hit("Recipient.Resolve")
+        ok = self._app.resolve_ok and self._address.lower() not in self._app.unresolvable
+        self._p["Resolved"] = ok
+        self._p["AddressEntry"] = _Com(self._stats, Name=self._address) if ok else None
+        return ok
+
+
+class FakeMailItem(_Com):
+    def __init__(self, app, **props):
+        base = {"To": "", "CC": "", "Subject": "", "HTMLBody": "", "Body": "", "EntryID": "",
+                "ConversationID": "", "ReceivedTime": None, "MessageClass": "IPM.Note"}
+        base.update(props)
+        super().__init__(app.stats, **base)
+        object.__setattr__(self, "_app", app)
+        object.__setattr__(self, "_headers", {})
+
+    @property
+    def Recipients(self):
+        self._stats.hit("FakeMailItem.Recipients")
+        return FakeRecipients(self._stats, self._app.resolve_ok)
+
+    @property
+    def PropertyAccessor(self):
+        self._stats.hit("FakeMailItem.PropertyAccessor")
+        return FakePropertyAccessor(self._stats, self._headers)
+
+    def Save(self):
+        self._stats.hit("FakeMailItem.Save")
+
+    def Display(self):
+        self._stats.hit("FakeMailItem.Display")
+
+    def Move(self, folder):
+        self._stats.hit("FakeMailItem.Move")
+        return self
+
+    def Send(self):
+        self._stats.hit("FakeMailItem.Send")
+        self._app.on_send(self)
+
+
+class FakeItems(_Com):
+    """Items: Count, Item(i) 1-based, Sort e Restrict (entende o filtro DASL do follow-up)."""
+
+    def __init__(self, stats, items):
+        super().__init__(stats)
+        object.__setattr__(self, "_items", list(items))
+
+    @property
+    def Count(self):
+        self._stats.hit("Items.Count")
+        return len(self._items)
+
+    def Item(self, i):
+        self._stats.hit("Items.Item")
+        return self._items[i - 1]
+
+    def Sort(self, prop, descending=False):
+        self._stats.hit("Items.Sort")
+        self._items.sort(key=lambda it: it.peek("ReceivedTime") or datetime.min, reverse=bool(descending))
+
+    def Restrict(self, flt):
+        self._stats.hit("Items.Restrict")
+        out = self._items
+        m = _DATE_RX.search(flt)
+        if m:
+            cut = datetime.strptime(m.group(1), "%Y-%m-%d %H:%M")
+            out = [it for it in out if (it.peek("ReceivedTime") or datetime.min) >= cut]
+        m = _LIKE_RX.search(flt)
+        if m:
+            p = m.group(1)
+            out = [it for it in out if p in it.peek("Subject", "") or p in it.peek("Body", "")]
+        return FakeItems(self._stats, out)
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+class FakeFolder(_Com):
+    def __init__(self, stats, path: str):
+        super().__init__(stats, FolderPath=path)
+        object.__setattr__(self, "messages", [])
+        object.__setattr__(self, "children", {})
+
+    @property
+    def Items(self):
+        self._stats.hit("Folder.Items")
+        return FakeItems(self._stats, self.messages)
+
+    @property
+    def Folders(self):
+        self._stats.hit("Folder.Folders")
+        return _Collection(self._stats, self.children.values(), by_name=self.children)
+
+    def add_folder(self, name: str) -> "FakeFolder":
+        return self.children.setdefault(name, FakeFolder(self._stats, f"{self.peek('FolderPath')}\\{name}"))
+
+
+class FakeStore(_Com):
+    def __init__(self, stats, name: str):
+        super().__init__(stats, DisplayName=name)
+        root = FakeFolder(stats, f"\\\\{name}")
+        object.__setattr__(self, "root", root)
+        object.__setattr__(self, "folders", {
+            5: root.add_folder("Itens Enviados"),
+            6: root.add_folder("Caixa de Entrada"),
+        })
+
+    def GetDefaultFolder(self, n):
+        self._stats.hit("Store.GetDefaultFolder")
+        return self.folders[n]
+
+    def GetRootFolder(self):
+        self._stats.hit("Store.GetRootFolder")
+        return self.root
+
+
+class _Collection(_Com):
+    def __init__(self, stats, items, by_name: dict | None = None):
+        super().__init__(stats)
+        object.__setattr__(self, "_items", list(items))
+        object.__setattr__(self, "_by_name", by_name or {})
+
+    @property
+    def Count(self):
+        self._stats.hit("Collection.Count")
+        return len(self._items)
+
+    def Item(self, i):
+        self._stats.hit("Collection.Item")
+        # como no Outlook: índice 1-based ou nome
+        return self._by_name[i] if isinstance(i, str) else self._items[i - 1]
+
+    def __iter__(self):
+        self._stats.hit("Collection.__iter__")
+        return iter(self._items)
+
+
+class FakeNamespace(_Com):
+    def __init__(self, app):
+        stats = app.stats
+        super().__init__(stats)
+        object.__setattr__(self, "_app", app)
+        object.__setattr__(self, "store", FakeStore(stats, app.store_name))
+        object.__setattr__(self, "stores", [self.store])
+
+    @property
+    def Stores(self):
+        self._stats.hit("Namespace.Stores")
+        return _Collection(self._stats, self.stores)
+
+    @property
+    def DefaultStore(self):
+        self._stats.hit("Namespace.DefaultStore")
+        return self.store
+
+    @property
+    def Accounts(self):
+        self._stats.hit("Namespace.Accounts")
+        return _Collection(self._stats, [_Com(self._stats, SmtpAddress=self._app.smtp)])
+
+    def Logon(self, *args):
+        self._stats.hit("Namespace.Logon")
+
+    def GetDefaultFolder(self, n):
+        self._stats.hit("Namespace.GetDefaultFolder")
+        return self.store.folders[n]
+
+    def CreateRecipient(self, address):
+        self._stats.hit("Namespace.CreateRecipient")
+        return FakeRecipient(self._app, address)
+
+
+class FakeApplication:
+    """
+    Outlook.Application falso.
+
+    `reply_rate` é a fração dos e-mails enviados que ganha uma resposta na
+    Inbox (mesma ConversationID, In-Reply-To apontando para o envio); em
+    `token_in_reply_rate` delas o token continua no assunto. Com `fail_every`
+    cada N-ésimo Send levanta erro (depois da latência), como um Outlook instável;
+    `sent_at` guarda o instante (monotonic) de cada envio aceito.
+    """
+
+    def __init__(self, stats: ComStats | None = None, smtp: str = "riscos@empresa.com.br",
+                 store_name: str = "Riscos", resolve_ok: bool = True, send_latency_ms: float = 0.0,
+                 reply_rate: float = 0.0, token_in_reply_rate: float = 0.5, seed: int = 7,
+                 fail_every: int = 0):
+        self.stats = stats or ComStats()
+        self.smtp = smtp
+        self.store_name = store_name
+        self.resolve_ok = resolve_ok
+        # endereços (minúsculos) que o catálogo falso não resolve
+        self.unresolvable = set()
+        self.send_latency = send_latency_ms / 1000.0
+        self.reply_rate = reply_rate
+        self.token_in_reply_rate = token_in_reply_rate
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.clock = datetime(2025, 1, 2, 8, 0, 0)
+        self.ns = FakeNamespace(self)
+        self.sent = 0
+        self.fail_every = fail_every
+        self.sent_at = []
+        self._attempts = 0
+
+    # ===== superfície usada pelo OutlookClient =====
+    def GetNamespace(self, name):
+        self.stats.hit("Application.GetNamespace")
+        return self.ns
+
+    @property
+    def Session(self):
+        self.stats.hit("Application.Session")
+        return self.ns
+
+    def CreateItem(self, kind):
+        self.stats.hit("Application.CreateItem")
+        return FakeMailItem(self)
+
+    # ===== simulação =====
+    def _tick(self) -> datetime:
+        self.clock += timedelta(seconds=30)
+        return self.clock
+
+    def on_send(self, mail: FakeMailItem):
+        if self.send_latency:
+            time.sleep(self.send_latency)
+        with self._lock:
+            self._attempts += 1
+            if self.fail_every and self._attempts % self.fail_every == 0:
+                raise RuntimeError("falha simulada no Send")
+            n = next(self._ids)
+            self.sent += 1
+            self.sent_at.append(time.monotonic())
+            msg_id = f"<msg{n}@empresa.com.br>"
+            mail._p.update(EntryID=f"EID-S{n:08d}", ConversationID=f"CONV{n:08d}", ReceivedTime=self._tick())
+            mail._headers[PR_INTERNET_MESSAGE_ID] = msg_id
+            self.ns.store.folders[5].messages.append(mail)
+
+            if self.reply_rate and self._rng.random() < self.reply_rate:
+                m = _TOKEN_RX.search(mail.peek("HTMLBody", ""))
+                keep_token = m and self._rng.random() < self.token_in_reply_rate
+                subject = "RE: " + mail.peek("Subject", "")
+                if keep_token:
+                    subject += f" {m.group(1)}"
+                self.add_inbox(subject=subject, body="De acordo.", conversation_id=f"CONV{n:08d}",
+                               in_reply_to=msg_id)
+
+    def add_store(self, name: str) -> FakeStore:
+        store = FakeStore(self.stats, name)
+        self.ns.stores.append(store)
+        return store
+
+    def add_inbox(self, subject: str, body: str, conversation_id: str = "", in_reply_to: str = "",
+                  folder: FakeFolder | None = None, message_class: str = "IPM.Note", auto_submitted: str = ""):
+        """`message_class`/`auto_submitted` simulam ausência temporária e NDR (ex.: "auto-replied")."""
+        n = next(self._ids)
+        item = FakeMailItem(self, Subject=subject, Body=body, EntryID=f"EID-I{n:08d}",
+                            ConversationID=conversation_id or f"CONVX{n:08d}", ReceivedTime=self._tick(),
+                            MessageClass=message_class)
+        if in_reply_to:
+            item._headers[PR_IN_REPLY_TO_ID] = in_reply_to
+            item._headers[PR_INTERNET_REFERENCES] = in_reply_to
+        headers = f"Subject: {subject}\r\n"
+        if auto_submitted:
+            headers += f"Auto-Submitted: {auto_submitted}\r\n"
+        item._headers[PR_TRANSPORT_MESSAGE_HEADERS] = headers
+        (folder or self.ns.store.folders[6]).messages.append(item)
+        return item
+
+    def fill_inbox(self, n: int, token_every: int = 0, tokens=(), folder: FakeFolder | None = None):
+        """Mensagens sem relação com o envio; a cada `token_every` uma cita um dos `tokens`."""
+        tokens = list(tokens)
+        for i in range(n):
+            if token_every and tokens and i % token_every == 0:
+                self.add_inbox(f"Dúvida {tokens[i % len(tokens)]}", "texto " * 40, folder=folder)
+            else:
+                self.add_inbox(f"Assunto {i}", "texto " * 40, folder=folder)
+
+
+def install(app: FakeApplication):
+    """Registra win32com/pywintypes/pythoncom falsos que devolvem `app` no Dispatch."""
+    client = types.ModuleType("win32com.client")
+    client.Dispatch = lambda progid: app
+    win32com = types.ModuleType("win32com")
+    win32com.client = client
+
+    pywintypes = types.ModuleType("pywintypes")
+    pywintypes.com_error = type("com_error", (Exception,), {})
+
+    pythoncom = types.ModuleType("pythoncom")
+    pythoncom.CoInitialize = lambda: None
+    pythoncom.CoUninitialize = lambda: None
+
+    sys.modules.update({"win32com": win32com, "win32com.client": client,
+                        "pywintypes": pywintypes, "pythoncom": pythoncom})
+    return app
@@ -0,0 +1,168 @@
+"""
+Servidor SMTP falso em processo (só stdlib), para testar o transporte smtp em Linux.
+
+Entende o suficiente do protocolo para o smtplib: EHLO/HELO, AUTH PLAIN/LOGIN,
+MAIL, RCPT, DATA, RSET, NOOP e QUIT. Não entrega nada: guarda o Message-ID e
+os destinatários de cada mensagem aceita. Latências opcionais simulam o custo
+de abrir a conexão (TLS + AUTH de um servidor real) e de aceitar cada mensagem.
+
+O transporte também roda contra o aiosmtpd (`python -m aiosmtpd -n -l localhost:8025`)
+com `smtp.starttls: false` e sem `smtp.username`.
+"""
+
+import base64
+import re
+import socketserver
+import threading
+import time
+from collections import Counter
+
+_MSG_ID_RX = re.compile(rb"^Message-ID:\s*(<[^>]+>)", re.IGNORECASE | re.MULTILINE)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def _readline(self) -> str:
+        return self.rfile.readline().decode("utf-8", "replace").rstrip("\r\n")
+
+    def handle(self):
+        srv = self.server.fake
+        srv.on_connect()
+        try:
+            if srv.connect_latency:
+                time.sleep(srv.connect_latency)
+            self._reply("220 fake.smtp ESMTP pronto")
+            rcpts = []
+            while True:
+                line = self._readline()
+                if not line and self.rfile.closed:
+                    break
+                cmd = line[:4].upper()
+                if cmd in ("EHLO", "HELO"):
+                    self._reply("250-fake.smtp")
+                    self._reply("250-AUTH PLAIN LOGIN")
+                    self._reply("250-8BITMIME")
+                    self._reply("250 SIZE 35882577")
+                elif cmd == "AUTH":
+                    parts = line.split()
+                    if parts[1].upper() == "PLAIN":
+                        raw = parts[2] if len(parts) > 2 else (self._reply("334 ") or self._readline())
+                        _, user, pwd = base64.b64decode(raw).decode().split("\0")
+                    else:
+                        self._reply("334 VXNlcm5hbWU6")
+                        user = base64.b64decode(self._readline()).decode()
+                        self._reply("334 UGFzc3dvcmQ6")
+                        pwd = base64.b64decode(self._readline()).decode()
+                    if srv.credentials and (user, pwd) != srv.credentials:
+                        self._reply("535 5.7.8 credenciais invalidas")
+                    else:
+                        self._reply("235 2.7.0 autenticado")
+                elif cmd == "MAIL":
+                    rcpts = []
+                    self._reply("250 2.1.0 ok")
+                elif cmd == "RCPT":
+                    addr = line.partition(":")[2].strip().strip("<>").lower()
+                    if addr in srv.reject:
+                        self._reply("550 5.1.1 destinatario desconhecido")
+                    else:
+                        rcpts.append(addr)
+                        self._reply("250 2.1.5 ok")
+                elif cmd == "DATA":
+                    self._reply("354 fim com <CRLF>.<CRLF>")
+                    chunks = []
+                    while True:
+                        raw = self.rfile.readline()
+                        if raw in (b".\r\n", b".\n", b""):
+                            break
+                        chunks.append(raw)
+                    if srv.message_latency:
+                        time.sleep(srv.message_latency)
+                    m = _MSG_ID_RX.search(b"".join(chunks))
+                    srv.on_message(m.group(1).decode() if m else "", rcpts)
+                    if srv.take_drop():
+                        break  # aceitou a mensagem e caiu antes do 250
+                    self._reply("250 2.0.0 enfileirado")
+                elif cmd in ("RSET", "NOOP"):
+                    self._reply("250 2.0.0 ok")
+                elif cmd == "QUIT":
+                    self._reply("221 2.0.0 tchau")
+                    break
+                elif not line:
+                    break
+                else:
+                    self._reply("502 5.5.2 comando nao suportado")
+        finally:
+            srv.on_disconnect()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeSmtpServer:
+    """
+    Uso:
+        with FakeSmtpServer(message_latency_ms=5) as srv:
+            ...  # smtp.host = "127.0.0.1", smtp.port = srv.port
+        srv.messages  # [(message_id, [destinatários]), ...]
+
+    `drop_after_data=n`: nas n primeiras mensagens a conexão cai depois do
+    DATA aceito, sem o 250 final (a mensagem foi entregue, o cliente não sabe).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, credentials: tuple | None = None,
+                 connect_latency_ms: float = 0.0, message_latency_ms: float = 0.0, reject=(),
+                 drop_after_data: int = 0):
+        self.credentials = credentials
+        self.connect_latency = connect_latency_ms / 1000.0
+        self.message_latency = message_latency_ms / 1000.0
+        self.reject = {a.lower() for a in reject}
+        self.drop_after_data = drop_after_data
+        self.messages = []
+        self.stats = Counter()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def on_connect(self):
+        with self._lock:
+            self.stats["connections"] += 1
+            self._active += 1
+            self.stats["max_concurrent"] = max(self.stats["max_concurrent"], self._active)
+
+    def on_disconnect(self):
+        with self._lock:
+            self._active -= 1
+
+    def take_drop(self) -> bool:
+        with self._lock:
+            if self.drop_after_data <= 0:
+                return False
+            self.drop_after_data -= 1
+            return True
+
+    def on_message(self, message_id: str, rcpts: list):
+        with self._lock:
+            self.stats["messages"] += 1
+            self.messages.append((message_id, rcpts))
+
+    def start(self) -> "FakeSmtpServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-smtp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
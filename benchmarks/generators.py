@@ -0,0 +1,82 @@
+"""
+Geradores de planilhas sintéticas (auditoria, profissionais e histórico) de tamanho paramétrico.
+
+Escrevem com openpyxl write_only, então 100k+ linhas cabem em memória constante.
+"""
+
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_plan import make_frames  # noqa: E402
+from src.performance_audit.history_store import DEFAULT_HEADERS  # noqa: E402
+
+# planilhas geradas ficam fora do repositório e são reaproveitadas entre execuções
+DEFAULT_WORKDIR = Path(tempfile.gettempdir()) / "performance_audit_bench"
+
+
+def write_frame(df, path: Path, sheet_name: str = "Plan1") -> Path:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    ws.append(list(df.columns))
+    for values in df.itertuples(index=False):
+        ws.append([v.item() if hasattr(v, "item") else v for v in values])
+    wb.save(path)
+    return path
+
+
+def write_inputs(workdir: Path, aud_rows: int, prof_rows: int | None = None, seed: int = 7) -> dict:
+    """auditoria_<n>.xlsx e profissionais_<n>.xlsx em `workdir` (reaproveita se já existirem)."""
+    workdir.mkdir(parents=True, exist_ok=True)
+    prof_rows = prof_rows or max(100, aud_rows // 10)
+    paths = {
+        "auditoria": workdir / f"auditoria_{aud_rows}.xlsx",
+        "profissionais": workdir / f"profissionais_{aud_rows}_{prof_rows}.xlsx",
+    }
+    if not all(p.exists() for p in paths.values()):
+        df_aud, df_prof = make_frames(aud_rows, prof_rows, seed=seed)
+        write_frame(df_aud, paths["auditoria"])
+        write_frame(df_prof, paths["profissionais"])
+    return paths
+
+
+def history_rows(n: int, month_ref: str = "2025-01", status: str = "ENVIADO",
+                 start: datetime = datetime(2025, 1, 2, 8, 0, 0)):
+    """Linhas de histórico com token, conversation_id e internet_message_id coerentes entre si."""
+    for i in range(n):
+        sent = (start + timedelta(seconds=30 * i)).strftime("%Y-%m-%d %H:%M:%S")
+        yield {
+            "datetime_sent": sent,
+            "month_ref": month_ref,
+            "cod_cliente": str(100000 + i),
+            "nome_cliente": f"Cliente {i}",
+            "cod_assessor": f"A{i % 500}",
+            "nome_assessor": f"Assessor {i % 500}",
+            "to_email": f"assessor{i % 500}@empresa.com.br",
+            "cc_email": "",
+            "token": f"PERF-BENCH-{i:08d}",
+            "subject": f"Auditoria de Desempenho – Cliente {i}",
+            "entry_id": f"EID-H{i:08d}",
+            "conversation_id": f"CONVH{i:08d}",
+            "internet_message_id": f"<hist{i}@empresa.com.br>",
+            "status": status,
+            "last_update_at": sent,
+            "notes": "",
+        }
+
+
+def write_history(path: Path, n: int, sheet_name: str = "Performance_Audit_History", **kw) -> Path:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    ws.append(DEFAULT_HEADERS)
+    for row in history_rows(n, **kw):
+        ws.append([row.get(h, "") for h in DEFAULT_HEADERS])
+    wb.save(path)
+    return path
@@ -0,0 +1,55 @@
+"""
+Peças comuns dos benchmarks e dos testes: config com todas as saídas num diretório temporário e logger mudo.
+
+Uso:
+    from benchmarks.harness import NullLogger, make_config
+    cfg = make_config(tmp, **{"history.backend": "xlsx"})
+"""
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class NullLogger:
+    def info(self, msg, **fields):
+        pass
+
+    warn = error = info
+
+
+def make_config(tmp: Path, **over):
+    """Config com todos os caminhos de saída em `tmp`; chaves pontuadas sobrescrevem valores."""
+    from src.performance_audit.config import Config
+
+    data = {
+        "project": {"month_ref": "2025-01"},
+        "paths": {
+            "history_xlsx": str(tmp / "history.xlsx"),
+            "history_sqlite": str(tmp / "history.sqlite"),
+            "email_body_html": str(ROOT / "templates" / "email_body.html"),
+            "email_body_digest_html": str(ROOT / "templates" / "email_body_digest.html"),
+            "plan_file": str(tmp / "dispatch_plan.jsonl"),
+            "dispatch_checkpoint": str(tmp / "dispatch_checkpoint.json"),
+            "followup_state": str(tmp / "followup_state.json"),
+            "recipient_cache": str(tmp / "recipient_cache.json"),
+            "serve_state": str(tmp / "serve_state.json"),
+            "status_transitions_dir": str(tmp / "transitions"),
+            "analytics_archive": str(tmp / "analytics"),
+            "analytics_report": str(tmp / "analytics_report.xlsx"),
+        },
+        "outlook": {"from_smtp": "riscos@empresa.com.br", "store_hint": "riscos"},
+        "behavior": {"send_mode": "send", "force_send": True, "rate_per_minute": 1e9, "burst": 1000,
+                     "workers": 1, "retry_send": 1},
+        "signature": {"use_local_outlook_signature": False},
+        "history": {"backend": "sqlite", "flush_every_rows": 500, "flush_interval_sec": 30},
+        "cache": {"enabled": False, "dir": str(tmp / ".cache")},
+        "serve": {"plan_dir": str(tmp / "serve")},
+    }
+    for dotted, value in over.items():
+        cur = data
+        *parents, leaf = dotted.split(".")
+        for part in parents:
+            cur = cur.setdefault(part, {})
+        cur[leaf] = value
+    return Config(data)
@@ -0,0 +1,299 @@
+"""
+Suíte de benchmarks de ponta a ponta, em Linux, contra um Outlook falso (benchmarks/fake_outlook.py).
+
+Cenários:
+    dispatch:<linhas>            plano + envio + histórico (ex.: dispatch:10000)
+    followup:<tokens>x<inbox>    follow-up completo e depois incremental (ex.: followup:1000x20000)
+    folders:<tokens>x<inbox>x<k> follow-up em k pastas/stores, com 1 e com k workers (ex.: folders:1000x20000x4)
+    history:<linhas>             append em sessão + atualização de status em lote (xlsx e sqlite)
+
+Cada cenário roda num subprocesso (pico de RSS isolado) e devolve tempo de parede,
+chamadas COM e pico de memória. O resultado vai em JSON; com --baseline a suíte
+compara com uma execução anterior e sai com código 1 se algum tempo piorar além
+de --tolerance.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/run_suite.py --output /tmp/suite.json
+    python benchmarks/run_suite.py --quick --baseline /tmp/suite.json
+
+Nada é gravado no repositório: as planilhas geradas ficam em --workdir (padrão:
+performance_audit_bench no diretório temporário do sistema) e histórico, estado
+e caches de cada cenário num diretório temporário descartado no fim.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.bench_stream_memory import _peak_rss_mb  # noqa: E402
+from benchmarks.generators import DEFAULT_WORKDIR  # noqa: E402
+from benchmarks.harness import NullLogger, make_config  # noqa: E402
+
+DEFAULT_SCENARIOS = [
+    "dispatch:1000", "dispatch:10000", "dispatch:100000",
+    "followup:1000x20000", "followup:10000x50000", "folders:1000x20000x4",
+    "history:10000",
+]
+QUICK_SCENARIOS = ["dispatch:1000", "followup:500x5000", "history:2000"]
+
+
+def _fake_app(latency_ms: float, **kw):
+    from benchmarks.fake_outlook import ComStats, FakeApplication, install
+
+    return install(FakeApplication(ComStats(latency_ms), **kw))
+
+
+def _com_summary(stats) -> dict:
+    return {"total": stats.total(), "top": dict(stats.calls.most_common(8))}
+
+
+def scenario_dispatch(size: str, args, tmp: Path) -> dict:
+    from benchmarks.generators import write_inputs
+
+    rows = int(size)
+    inputs = write_inputs(Path(args.workdir), rows)
+    app = _fake_app(args.com_latency_ms)
+
+    from src.performance_audit.dispatch import dispatch
+
+    cfg = make_config(tmp, **{
+        "paths.auditoria_xlsx": str(inputs["auditoria"]),
+        "paths.profissionais_xlsx": str(inputs["profissionais"]),
+        "behavior.workers": args.workers,
+        "history.backend": args.history_backend,
+    })
+    t0 = time.perf_counter()
+    dispatch(cfg, NullLogger())
+    return {"wall_sec": time.perf_counter() - t0, "sent": app.sent, "com": _com_summary(app.stats)}
+
+
+def scenario_followup(size: str, args, tmp: Path) -> dict:
+    from benchmarks.generators import history_rows
+
+    n_tokens, n_inbox = (int(x) for x in size.lower().split("x"))
+    app = _fake_app(args.com_latency_ms)
+
+    from src.performance_audit.followup import followup
+    from src.performance_audit.history_store import open_history
+
+    cfg = make_config(tmp, **{"history.backend": args.history_backend})
+    history = open_history(cfg)
+    rows = list(history_rows(n_tokens))
+    with history.writer() as hw:
+        for row in rows:
+            hw.append(row)
+    history.close()
+
+    # ~30% dos tokens respondidos (metade sem o token no texto), o resto é ruído
+    replies = rows[::3]
+    noise = max(0, n_inbox - len(replies))
+    app.fill_inbox(noise // 2)
+    for k, row in enumerate(replies):
+        subject = f"RE: {row['subject']}" + (f" {row['token']}" if k % 2 else "")
+        app.add_inbox(subject, "De acordo.", conversation_id=row["conversation_id"],
+                      in_reply_to=row["internet_message_id"])
+    app.fill_inbox(noise - noise // 2)
+
+    out = {}
+    t0 = time.perf_counter()
+    followup(cfg, NullLogger())
+    out["full_wall_sec"] = round(time.perf_counter() - t0, 3)
+    out["full_com"] = _com_summary(app.stats)
+
+    # segunda execução: só 5% de mensagens novas
+    app.stats.reset()
+    app.fill_inbox(max(1, n_inbox // 20))
+    t1 = time.perf_counter()
+    followup(cfg, NullLogger())
+    out["incremental_wall_sec"] = round(time.perf_counter() - t1, 3)
+    out["incremental_com"] = _com_summary(app.stats)
+    out["wall_sec"] = out["full_wall_sec"] + out["incremental_wall_sec"]
+    return out
+
+
+def scenario_folders(size: str, args, tmp: Path) -> dict:
+    """Respostas espalhadas em K pastas (Inbox, subpasta e stores extras): 1 worker x K workers."""
+    from benchmarks.generators import history_rows
+
+    n_tokens, n_inbox, n_folders = (int(x) for x in size.lower().split("x"))
+    app = _fake_app(args.com_latency_ms)
+
+    from src.performance_audit.followup import followup
+    from src.performance_audit.history_store import open_history
+
+    inbox = app.ns.store.folders[6]
+    folders = [inbox, inbox.add_folder("Equipe")]
+    specs = [{"path": "Inbox"}, {"path": "Inbox/Equipe"}]
+    for k in range(2, n_folders):
+        store = app.add_store(f"Arquivo {k}")
+        folders.append(store.folders[6])
+        specs.append({"store": f"Arquivo {k}", "path": "Inbox"})
+    folders, specs = folders[:n_folders], specs[:n_folders]
+
+    rows = list(history_rows(n_tokens))
+    for k, row in enumerate(rows[::3]):
+        app.add_inbox(f"RE: {row['subject']}", "De acordo.", conversation_id=row["conversation_id"],
+                      in_reply_to=row["internet_message_id"], folder=folders[k % len(folders)])
+    for folder in folders:
+        app.fill_inbox(max(0, n_inbox // len(folders)), folder=folder)
+
+    out = {"wall_sec": 0.0}
+    for workers in (1, len(specs)):
+        run_dir = tmp / f"w{workers}"
+        cfg = make_config(run_dir, **{"history.backend": "sqlite", "followup.folders": specs,
+                                  "followup.workers": workers, "followup.scan_limit": n_inbox * 2})
+        history = open_history(cfg)
+        with history.writer() as hw:
+            for row in rows:
+                hw.append(row)
+        history.close()
+
+        t0 = time.perf_counter()
+        followup(cfg, NullLogger())
+        wall = time.perf_counter() - t0
+        answered = sum(1 for _ in open_history(cfg).iter_rows(statuses=("RESPONDIDO",)))
+        out[f"workers_{workers}"] = {"wall_sec": round(wall, 3), "answered": answered}
+        out["wall_sec"] += wall
+    return out
+
+
+def scenario_history(size: str, args, tmp: Path) -> dict:
+    from benchmarks.generators import history_rows
+    from src.performance_audit.history_store import open_history
+
+    rows = int(size)
+    out = {"wall_sec": 0.0}
+    for backend in ("xlsx", "sqlite"):
+        cfg = make_config(tmp, **{"history.backend": backend})
+        history = open_history(cfg)
+
+        t0 = time.perf_counter()
+        with history.writer() as hw:
+            for row in history_rows(rows):
+                hw.append(row)
+        t_append = time.perf_counter() - t0
+
+        updates = {f"PERF-BENCH-{i:08d}": ("RESPONDIDO", "bench") for i in range(0, rows, 2)}
+        t1 = time.perf_counter()
+        missing = history.update_statuses(updates)
+        t_update = time.perf_counter() - t1
+        history.close()
+
+        out[backend] = {"append_sec": round(t_append, 3), "update_sec": round(t_update, 3),
+                        "updated": len(updates) - len(missing)}
+        out["wall_sec"] += t_append + t_update
+    return out
+
+
+SCENARIOS = {"dispatch": scenario_dispatch, "followup": scenario_followup, "folders": scenario_folders,
+             "history": scenario_history}
+
+
+def run_child(name: str, args) -> dict:
+    kind, size = name.split(":", 1)
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        res = SCENARIOS[kind](size, args, Path(tmp))
+    res["wall_sec"] = round(res["wall_sec"], 3)
+    res["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    return res
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, res in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old or "wall_sec" not in old or "wall_sec" not in res or not old["wall_sec"]:
+            continue
+        ratio = res["wall_sec"] / old["wall_sec"]
+        res["vs_baseline"] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            regressions.append({"scenario": name, "ratio": round(ratio, 3),
+                                "wall_sec": res["wall_sec"], "baseline_wall_sec": old["wall_sec"]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default=None, help="Lista separada por vírgula (padrão: todos).")
+    parser.add_argument("--quick", action="store_true", help="Cenários pequenos, para rodar a cada mudança.")
+    parser.add_argument("--com-latency-ms", type=float, default=0.0, help="Custo de cada chamada COM falsa.")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--history-backend", choices=["xlsx", "sqlite"], default="sqlite")
+    parser.add_argument("--workdir", default=str(DEFAULT_WORKDIR))
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args)))
+        return
+
+    names = args.scenarios.split(",") if args.scenarios else (QUICK_SCENARIOS if args.quick else DEFAULT_SCENARIOS)
+    results = {}
+    for name in names:
+        cmd = [sys.executable, __file__, "--child", name, "--com-latency-ms", str(args.com_latency_ms),
+               "--workers", str(args.workers), "--history-backend", args.history_backend,
+               "--workdir", args.workdir]
+        proc = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+        if proc.returncode != 0:
+            results[name] = {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "falhou"}
+            print(f"{name:>24}: ERRO {results[name]['error']}")
+            continue
+        res = json.loads(proc.stdout.strip().splitlines()[-1])
+        results[name] = res
+        com = res.get("com", res.get("full_com", {})).get("total", "-")
+        print(f"{name:>24}: {res['wall_sec']:>8.2f}s | COM {com} | pico RSS {res['peak_rss_mb']} MB")
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "com_latency_ms": args.com_latency_ms,
+            "workers": args.workers,
+            "history_backend": args.history_backend,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        report["regressions"] = regressions
+        for r in regressions:
+            print(f"REGRESSÃO {r['scenario']}: {r['ratio']}x ({r['baseline_wall_sec']}s -> {r['wall_sec']}s)")
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+    if regressions or any("error" in r for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
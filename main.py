@@ -1,11 +1,14 @@
 import argparse
+import json
 from datetime import datetime
 from pathlib import Path
 
+from src.performance_audit import metrics
 from src.performance_audit.config import Config
 from src.performance_audit.logging_utils import Logger
-from src.performance_audit.dispatch import dispatch
-from src.performance_audit.followup import followup
+
+# os subsistemas (pandas, openpyxl, win32com) são importados sob demanda, dentro
+# de cada subcomando: --help, erro de config e status não pagam esse custo.
 
 
 def build_parser():
@@ -18,28 +21,244 @@ def build_parser():
         default="config.example.json",
         help="Caminho do arquivo de configuração (JSON)."
     )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Grava um perfil cProfile da execução em logs/<run_id>.prof."
+    )
 
     sub = parser.add_subparsers(dest="cmd", required=True)
 
-    sub.add_parser("dispatch", help="Envia auditorias em massa e registra histórico.")
-    sub.add_parser("followup", help="Verifica respostas e atualiza status no histórico.")
+    p_dispatch = sub.add_parser("dispatch", help="Envia auditorias em massa e registra histórico.")
+    src_group = p_dispatch.add_mutually_exclusive_group()
+    src_group.add_argument(
+        "--from-plan",
+        default=None,
+        help="Envia exatamente o plano gerado pelo subcomando plan (JSONL/Parquet)."
+    )
+    src_group.add_argument(
+        "--resume",
+        action="store_true",
+        help="Retoma o último dispatch interrompido (mesmo plano, pulando o que já foi enviado)."
+    )
+
+    p_plan = sub.add_parser("plan", help="Gera o plano de envio em disco, sem abrir o Outlook.")
+    p_plan.add_argument(
+        "--output",
+        default=None,
+        help="Arquivo do plano (.jsonl ou .parquet; padrão: paths.plan_file)."
+    )
+
+    p_followup = sub.add_parser("followup", help="Verifica respostas e atualiza status no histórico.")
+    p_followup.add_argument(
+        "--full-rescan",
+        action="store_true",
+        help="Ignora a marca d'água e varre a Inbox inteira (mais recentes primeiro)."
+    )
+
+    p_serve = sub.add_parser("serve", help="Fica de pé: envia auditorias novas e roda o follow-up periodicamente.")
+    p_serve.add_argument(
+        "--once",
+        action="store_true",
+        help="Roda um único ciclo e sai."
+    )
+
+    p_status = sub.add_parser("status", help="Contagem de status do mês por assessor (sem abrir a planilha inteira).")
+    p_status.add_argument(
+        "--month",
+        default=None,
+        help="Mês de referência (padrão: project.month_ref)."
+    )
+    p_status.add_argument(
+        "--json",
+        action="store_true",
+        help="Saída em JSON."
+    )
+
+    p_analytics = sub.add_parser("analytics", help="Taxa de resposta, tempo até a resposta e cobranças por assessor, "
+                                                   "líder e mês (arquivo Parquet incremental).")
+    p_analytics.add_argument(
+        "--output",
+        default=None,
+        help="Relatório .xlsx (uma aba por tabela) ou .csv (um arquivo por tabela); padrão: paths.analytics_report."
+    )
+    p_analytics.add_argument(
+        "--from-month",
+        default=None,
+        help="Primeiro mês do relatório (aaaa-mm)."
+    )
+    p_analytics.add_argument(
+        "--to-month",
+        default=None,
+        help="Último mês do relatório (aaaa-mm)."
+    )
+    p_analytics.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Descarta o arquivo Parquet e relê o histórico inteiro."
+    )
+
+    p_export = sub.add_parser("export-history", help="Exporta o histórico para a planilha no layout padrão.")
+    p_export.add_argument(
+        "--output",
+        default=None,
+        help="Caminho do xlsx de saída (padrão: paths.history_xlsx)."
+    )
 
     return parser
 
 
+def write_dispatch_plan(cfg, logger, output: str | None):
+    from src.performance_audit.plan_io import plan_chunks, write_plan
+
+    out = output or cfg.get("paths.plan_file", "data/dispatch_plan.jsonl")
+    chunks, meta = plan_chunks(cfg, logger)
+    summary = write_plan(chunks, meta, out)
+
+    counts = summary["counts"]
+    logger.info("==== RESUMO PLANO ====")
+    logger.info(f"Arquivo: {out}")
+    logger.info(f"Total: {counts['total']} | Enviáveis: {counts['sendable']} | Assessores: {counts['assessors']}")
+    for reason, n in counts["skipped"].items():
+        logger.info(f"Pulado ({reason}): {n}")
+
+
+def export_history(cfg, logger, output: str | None):
+    from src.performance_audit.history_store import open_history
+
+    out = output or cfg.get("paths.history_xlsx")
+    history = open_history(cfg)
+    try:
+        if history.backend == "xlsx" and output is None:
+            logger.warn("Backend xlsx: o histórico já é a própria planilha; informe --output para uma cópia.")
+            return
+        n = history.export_xlsx(out)
+    finally:
+        history.close()
+    logger.info(f"Histórico exportado ({history.backend}) -> {out} | linhas: {n}")
+
+
+STATUS_COLUMNS = ("ENVIADO", "PREPARADO", "COBRADO", "RESPONDIDO")
+
+
+def print_status(cfg, month: str | None, as_json: bool):
+    from src.performance_audit.history_store import open_history
+
+    month = month or cfg.get("project.month_ref", "")
+    history = open_history(cfg)
+    try:
+        counts = history.status_counts(month)
+    finally:
+        history.close()
+
+    if as_json:
+        print(json.dumps({"month_ref": month, "backend": history.backend, "counts": counts}, ensure_ascii=False))
+        return
+
+    statuses = list(STATUS_COLUMNS) + sorted(set(counts) - set(STATUS_COLUMNS))
+    assessors = sorted({a for by_assessor in counts.values() for a in by_assessor})
+    print(f"Status {month or '-'} ({history.backend})")
+    print(f"{'assessor':<14}" + "".join(f"{s:>12}" for s in statuses))
+    for a in assessors:
+        print(f"{a or '-':<14}" + "".join(f"{counts.get(s, {}).get(a, 0):>12}" for s in statuses))
+    print(f"{'TOTAL':<14}" + "".join(f"{sum(counts.get(s, {}).values()):>12}" for s in statuses))
+
+
 def main():
     args = build_parser().parse_args()
     cfg = Config.load(args.config)
 
+    if args.cmd == "status":
+        # consulta de leitura: sem arquivo de log, métricas ou perfil
+        print_status(cfg, args.month, args.json)
+        return
+
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
 
-    logger = Logger(str(log_dir / f"run_{datetime.now():%Y%m%d_%H%M%S}.txt"))
+    run_id = f"run_{datetime.now():%Y%m%d_%H%M%S}"
+    logger = Logger(
+        str(log_dir / f"{run_id}.txt"),
+        jsonl_path=str(log_dir / f"{run_id}.jsonl") if cfg.get("logging.jsonl", True) else None,
+        background=bool(cfg.get("logging.background_writer", True)),
+    )
+
+    metrics.METRICS.reset()
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+
+    with logger:
+        ok = False
+        try:
+            if profiler is not None:
+                profiler.enable()
+            if args.cmd == "serve":
+                serve(args, logger, run_id, log_dir)
+            else:
+                run_command(args, cfg, logger)
+            ok = True
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(str(log_dir / f"{run_id}.prof"))
+                logger.info(f"Perfil cProfile: {log_dir / f'{run_id}.prof'}")
+            write_metrics(cfg, logger, args.cmd, run_id, log_dir, ok)
 
+
+def run_command(args, cfg, logger):
     if args.cmd == "dispatch":
-        dispatch(cfg, logger)
+        from src.performance_audit.dispatch import dispatch
+        dispatch(cfg, logger, from_plan=args.from_plan, resume=args.resume)
+    elif args.cmd == "plan":
+        write_dispatch_plan(cfg, logger, args.output)
     elif args.cmd == "followup":
-        followup(cfg, logger)
+        from src.performance_audit.followup import followup
+        followup(cfg, logger, full_rescan=args.full_rescan)
+    elif args.cmd == "export-history":
+        export_history(cfg, logger, args.output)
+    elif args.cmd == "analytics":
+        from src.performance_audit.analytics import analytics
+        analytics(cfg, logger, output=args.output, from_month=args.from_month, to_month=args.to_month,
+                  rebuild=args.rebuild)
+
+
+def serve(args, logger, run_id: str, log_dir: Path):
+    from src.performance_audit.serve import Server
+
+    def on_cycle(result):
+        # métricas por ciclo: o textfile do Prometheus reflete o último ciclo
+        write_metrics(server.cfg, logger, "serve", run_id, log_dir, ok=not result["errors"])
+        metrics.METRICS.reset()
+        # o Logger bufferiza: sem isto o log de um serve longo só chega ao disco no encerramento
+        logger.flush()
+
+    server = Server(args.config, logger, on_cycle=on_cycle)
+    try:
+        server.run(max_cycles=1 if args.once else None)
+    except KeyboardInterrupt:
+        logger.warn("Serve interrompido pelo usuário.")
+
+
+def write_metrics(cfg, logger, cmd: str, run_id: str, log_dir: Path, ok: bool):
+    """Tempos por estágio e contadores da execução: JSON ao lado do log e textfile do Prometheus."""
+    if not cfg.get("metrics.enabled", True):
+        return
+    try:
+        data = metrics.METRICS.write_json(str(log_dir / f"{run_id}.metrics.json"),
+                                          run_id=run_id, command=cmd, ok=ok)
+        textfile_dir = cfg.get("metrics.prometheus_textfile_dir", None)
+        if textfile_dir:
+            metrics.METRICS.write_prometheus(str(Path(textfile_dir) / f"perf_audit_{cmd.replace('-', '_')}.prom"),
+                                             ok=ok, command=cmd)
+    except OSError as ex:
+        logger.warn(f"Métricas não gravadas: {ex}")
+        return
+
+    for stage, st in data["stages"].items():
+        logger.info(f"[MÉTRICA] {stage}: n={st['count']} | p50 {st['p50_ms']}ms | p95 {st['p95_ms']}ms | "
+                    f"máx {st['max_ms']}ms | total {st['total_sec']}s")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+import importlib.util
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import metrics, status_index, transitions
+from .history_store import DEFAULT_HEADERS, open_history
+
+# colunas que o arquivo acrescenta às do histórico, montadas a partir do log de transições
+TRANSITION_COLUMNS = ["first_cobrado_at", "last_cobrado_at", "cobrado_count", "respondido_at"]
+ARCHIVE_COLUMNS = DEFAULT_HEADERS + TRANSITION_COLUMNS
+
+SENT = ("ENVIADO", "COBRADO", "RESPONDIDO")
+
+# tabela -> colunas de agrupamento
+REPORTS = {
+    "mes": ["month_ref"],
+    "assessor": ["cod_assessor"],
+    "lider": ["cc_email"],
+}
+
+# o relatório só precisa destas colunas; o Parquet lê só elas
+REPORT_COLUMNS = ["month_ref", "cod_assessor", "nome_assessor", "cc_email", "status", "datetime_sent",
+                  "cobrado_count", "respondido_at"]
+
+_MANIFEST = "_manifest.json"
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def archive_dir(cfg) -> Path:
+    return Path(cfg.get("paths.analytics_archive", "data/analytics"))
+
+
+def _partition_path(root: Path, month: str) -> Path:
+    return root / f"month_ref={month}" / "part-0.parquet"
+
+
+def _load_manifest(root: Path) -> dict:
+    try:
+        return json.loads((root / _MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(root: Path, manifest: dict):
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = root / (_MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, root / _MANIFEST)
+
+
+def _history_fingerprint(cfg) -> list:
+    if str(cfg.get("history.backend", "xlsx")).lower() == "sqlite":
+        db = cfg.get("paths.history_sqlite", "data/history_performance.sqlite")
+        # no modo WAL as escritas recentes ficam no -wal até o checkpoint
+        return [status_index.fingerprint(db), status_index.fingerprint(db + "-wal")]
+    return [status_index.fingerprint(cfg.get("paths.history_xlsx"))]
+
+
+def _merge_transitions(df: pd.DataFrame, tr_dir: Path, month: str) -> pd.DataFrame:
+    """Primeira/última cobrança, quantidade de cobranças e data da resposta por token."""
+    df = df.drop(columns=[c for c in TRANSITION_COLUMNS if c in df.columns])
+    p = transitions.month_path(tr_dir, month)
+    if p.exists() and p.stat().st_size:
+        tr = pd.read_json(p, lines=True, dtype=False, convert_dates=False)
+        tr["status"] = tr["status"].astype(str).str.upper()
+        cob = (tr[tr["status"] == "COBRADO"].groupby("token")["at"]
+               .agg(first_cobrado_at="min", last_cobrado_at="max", cobrado_count="size"))
+        # hora de chegada da resposta; logs antigos (sem received_at) ficam com a hora do follow-up
+        reply_at = tr["received_at"].fillna(tr["at"]) if "received_at" in tr.columns else tr["at"]
+        resp = (reply_at[tr["status"] == "RESPONDIDO"].groupby(tr["token"]).min().rename("respondido_at"))
+        df = df.merge(cob, left_on="token", right_index=True, how="left")
+        df = df.merge(resp, left_on="token", right_index=True, how="left")
+    else:
+        for c in TRANSITION_COLUMNS:
+            df[c] = np.nan
+
+    # linhas anteriores ao log: o histórico só tem o status atual e o last_update_at
+    status = df["status"].astype(str).str.strip().str.upper()
+    no_log = df["cobrado_count"].isna() & (status == "COBRADO")
+    df["first_cobrado_at"] = df["first_cobrado_at"].mask(no_log, df["last_update_at"])
+    df["last_cobrado_at"] = df["last_cobrado_at"].mask(no_log, df["last_update_at"])
+    df["cobrado_count"] = df["cobrado_count"].mask(no_log, 1).fillna(0).astype("int64")
+    no_reply = df["respondido_at"].isna() & (status == "RESPONDIDO")
+    df["respondido_at"] = df["respondido_at"].mask(no_reply, df["last_update_at"])
+
+    for c in ("first_cobrado_at", "last_cobrado_at", "respondido_at"):
+        df[c] = df[c].fillna("").astype(str)
+    return df[ARCHIVE_COLUMNS]
+
+
+def _write_partition(df: pd.DataFrame, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def update_archive(cfg, logger, rebuild: bool = False) -> dict:
+    """
+    Atualiza o arquivo Parquet (uma partição por month_ref) a partir do histórico.
+
+    Meses anteriores ao `project.month_ref` não mudam mais (dispatch e
+    follow-up só mexem no mês corrente): depois de arquivados com o mês já
+    fechado eles nunca mais são lidos do histórico. O histórico só é lido
+    quando o arquivo dele mudou; se só o log de transições mudou, a partição
+    do mês é remontada a partir dela mesma.
+
+    A economia na releitura é do backend sqlite, onde os meses fechados ficam
+    fora da consulta. No xlsx qualquer mudança no histórico relê a planilha
+    inteira pelo openpyxl (não há como ler só algumas linhas); os meses fechados
+    são descartados na leitura e o ganho fica na montagem e gravação das partições.
+    """
+    if importlib.util.find_spec("pyarrow") is None:
+        raise RuntimeError("analytics precisa do pyarrow (pip install pyarrow).")
+
+    root = archive_dir(cfg)
+    tr_dir = transitions.transitions_dir(cfg)
+    current = str(cfg.get("project.month_ref", "") or "")
+    manifest = {} if rebuild else _load_manifest(root)
+    if rebuild and root.exists():
+        shutil.rmtree(root)
+    months = manifest.setdefault("months", {})
+    closed = {m for m, e in months.items() if e.get("closed")}
+    written = []
+
+    hist_fp = _history_fingerprint(cfg)
+    if hist_fp != manifest.get("history_fingerprint"):
+        buckets = {}
+        skipped = 0
+        history = open_history(cfg)
+        try:
+            with metrics.timer("analytics_history_read"):
+                for row in history.iter_rows(skip_months=closed):
+                    month = str(row.get("month_ref", "") or "").strip()
+                    if not month:
+                        skipped += 1
+                    elif month not in closed:
+                        buckets.setdefault(month, []).append(row)
+        finally:
+            history.close()
+        if skipped:
+            logger.warn(f"Analytics: {skipped} linha(s) do histórico sem month_ref ficaram de fora.")
+
+        with metrics.timer("analytics_archive_write"):
+            for month, rows in sorted(buckets.items()):
+                df = pd.DataFrame(rows).reindex(columns=DEFAULT_HEADERS).fillna("").astype(str)
+                _write_partition(_merge_transitions(df, tr_dir, month), _partition_path(root, month))
+                months[month] = {"rows": len(df)}
+                written.append(month)
+        # mês aberto que sumiu do histórico (linhas apagadas à mão)
+        for month in [m for m in months if m not in closed and m not in buckets]:
+            shutil.rmtree(_partition_path(root, month).parent, ignore_errors=True)
+            del months[month]
+        manifest["history_fingerprint"] = hist_fp
+
+    with metrics.timer("analytics_archive_write"):
+        for month, entry in months.items():
+            tr_fp = status_index.fingerprint(transitions.month_path(tr_dir, month))
+            if month not in written and not entry.get("closed") and tr_fp != entry.get("transitions"):
+                part = _partition_path(root, month)
+                _write_partition(_merge_transitions(pd.read_parquet(part), tr_dir, month), part)
+                written.append(month)
+            entry["transitions"] = tr_fp
+            # a partição está em dia com o histórico: mês passado não precisa mais ser relido
+            entry["closed"] = bool(current) and month < current
+
+    manifest["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _save_manifest(root, manifest)
+    logger.info(f"Analytics: arquivo {root} | {len(months)} mês(es) | regravados: {', '.join(sorted(written)) or '-'}")
+    return {"months": len(months), "written": sorted(written)}
+
+
+def load_archive(cfg, from_month: str | None = None, to_month: str | None = None, columns=None) -> pd.DataFrame:
+    root = archive_dir(cfg)
+    months = sorted(_load_manifest(root).get("months", {}))
+    months = [m for m in months if (not from_month or m >= from_month) and (not to_month or m <= to_month)]
+    frames = [pd.read_parquet(_partition_path(root, m), columns=columns) for m in months]
+    if not frames:
+        return pd.DataFrame(columns=columns or ARCHIVE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    status = df["status"].astype(str).str.strip().str.upper()
+    sent_at = pd.to_datetime(df["datetime_sent"], format=_TS_FORMAT, errors="coerce")
+    replied_at = pd.to_datetime(df["respondido_at"], format=_TS_FORMAT, errors="coerce")
+    hours = (replied_at - sent_at).dt.total_seconds() / 3600
+    return pd.DataFrame({
+        "month_ref": df["month_ref"],
+        "cod_assessor": df["cod_assessor"],
+        "nome_assessor": df["nome_assessor"],
+        "cc_email": df["cc_email"].replace("", "(sem líder)"),
+        "enviado": status.isin(SENT),
+        "respondido": status == "RESPONDIDO",
+        "cobrado_em_aberto": status == "COBRADO",
+        "cobrancas": df["cobrado_count"].astype("int64"),
+        "cobrado_2x": df["cobrado_count"] >= 2,
+        "respondido_apos_cobranca": (status == "RESPONDIDO") & (df["cobrado_count"] > 0),
+        # resposta detectada antes do envio não faz sentido: fica fora da média
+        "horas_resposta": hours.where(hours >= 0),
+    })
+
+
+def aggregate(df: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """Uma linha por grupo: volumes, taxa de resposta, tempo até a resposta e cobranças repetidas."""
+    g = df.groupby(keys, sort=True)
+    out = g.agg(
+        clientes=("enviado", "size"),
+        enviados=("enviado", "sum"),
+        respondidos=("respondido", "sum"),
+        cobrados_em_aberto=("cobrado_em_aberto", "sum"),
+        cobrancas=("cobrancas", "sum"),
+        cobrados_2x_ou_mais=("cobrado_2x", "sum"),
+        respondidos_apos_cobranca=("respondido_apos_cobranca", "sum"),
+        horas_resposta_media=("horas_resposta", "mean"),
+        horas_resposta_mediana=("horas_resposta", "median"),
+    )
+    out["horas_resposta_p90"] = g["horas_resposta"].quantile(0.9)
+    out["taxa_resposta"] = out["respondidos"] / out["enviados"].where(out["enviados"] > 0)
+    if keys == ["cod_assessor"]:
+        out.insert(0, "nome_assessor", g["nome_assessor"].last())
+    return out.round(4).reset_index()
+
+
+def build_report(df: pd.DataFrame) -> dict:
+    prepared = _prepare(df)
+    return {name: aggregate(prepared, keys) for name, keys in REPORTS.items()}
+
+
+def write_report(tables: dict, output: str) -> list:
+    """xlsx: uma aba por tabela; csv: um arquivo `<nome>_<tabela>.csv` por tabela."""
+    p = Path(output)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    if p.suffix.lower() == ".csv":
+        paths = []
+        for name, table in tables.items():
+            out = p.with_name(f"{p.stem}_{name}.csv")
+            table.to_csv(out, index=False, encoding="utf-8-sig")
+            paths.append(out)
+        return paths
+    with pd.ExcelWriter(p, engine="openpyxl") as writer:
+        for name, table in tables.items():
+            table.to_excel(writer, sheet_name=name, index=False)
+    return [p]
+
+
+def analytics(cfg, logger, output: str | None = None, from_month: str | None = None, to_month: str | None = None,
+              rebuild: bool = False) -> dict:
+    update_archive(cfg, logger, rebuild=rebuild)
+    with metrics.timer("analytics_report"):
+        df = load_archive(cfg, from_month, to_month, columns=REPORT_COLUMNS)
+        tables = build_report(df)
+        out = output or cfg.get("paths.analytics_report", "data/analytics_report.xlsx")
+        paths = write_report(tables, out)
+    logger.info(f"Analytics: {len(df)} linha(s) de {from_month or 'início'} a {to_month or 'fim'} | "
+                f"{', '.join(f'{k}: {len(v)}' for k, v in tables.items())} -> {', '.join(map(str, paths))}")
+    return tables
@@ -1 +1,126 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
 
+from unidecode import unidecode
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+FUZZY_CUTOFF = 0.85
+# dois candidatos fuzzy mais próximos que isso são considerados empate
+FUZZY_MARGIN = 0.03
+
+
+class AmbiguousColumnError(RuntimeError):
+    """Mais de uma coluna da planilha casa com o mesmo alias."""
+
+    def __init__(self, aliases, candidates):
+        self.aliases = list(aliases)
+        self.candidates = list(candidates)
+        super().__init__(f"Coluna ambígua para {self.aliases}: candidatas {self.candidates}")
+
+
+def normalize_header(text) -> str:
+    """'Código  Líder', 'codigo_lider' e 'CODIGO-LIDER' viram 'codigolider'."""
+    return _NON_ALNUM.sub("", unidecode(str(text)).casefold())
+
+
+class HeaderIndex:
+    """
+    Índice dos cabeçalhos de uma planilha pelo texto normalizado.
+
+    Cada cabeçalho é normalizado uma vez; a busca por alias é um acesso a dict.
+    Se nenhum alias casar exatamente, tenta o mais parecido (difflib) acima de
+    FUZZY_CUTOFF. Empates levantam AmbiguousColumnError em vez de escolher um.
+    """
+
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+        self._by_key = {}
+        for col in self.columns:
+            self._by_key.setdefault(normalize_header(col), []).append(col)
+
+    def resolve(self, aliases, fuzzy: bool = True):
+        """Devolve (coluna, score): score 1.0 para casamento exato, None se não achar."""
+        for alias in aliases:
+            hits = self._by_key.get(normalize_header(alias))
+            if not hits:
+                continue
+            if len(hits) > 1:
+                raise AmbiguousColumnError(aliases, hits)
+            return hits[0], 1.0
+
+        if not fuzzy:
+            return None, 0.0
+
+        best = {}
+        for alias in aliases:
+            key = normalize_header(alias)
+            for cand in self._by_key:
+                score = difflib.SequenceMatcher(None, key, cand).ratio()
+                if score >= FUZZY_CUTOFF and score > best.get(cand, 0.0):
+                    best[cand] = score
+        if not best:
+            return None, 0.0
+
+        ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)
+        top_key, top_score = ranked[0]
+        tied = [k for k, s in ranked if top_score - s < FUZZY_MARGIN]
+        candidates = [c for k in tied for c in self._by_key[k]]
+        if len(candidates) > 1:
+            raise AmbiguousColumnError(aliases, candidates)
+        return candidates[0], top_score
+
+
+@lru_cache(maxsize=32)
+def _index(columns: tuple) -> HeaderIndex:
+    return HeaderIndex(columns)
+
+
+def find_column(df, aliases, fuzzy_hits: list | None = None):
+    """
+    Nome real da coluna de `df` (ou lista de cabeçalhos) que corresponde a um dos aliases.
+
+    Ignora acentos, caixa, espaços e pontuação. Casamentos aproximados são
+    anexados a `fuzzy_hits` como (aliases, coluna, score) para o chamador avisar.
+    """
+    columns = tuple(str(c) for c in getattr(df, "columns", df))
+    col, score = _index(columns).resolve(aliases)
+    if col is not None and score < 1.0 and fuzzy_hits is not None:
+        fuzzy_hits.append((list(aliases), col, round(score, 3)))
+    return col
+
+
+# ===== Mapeamento resolvido, persistido por assinatura dos cabeçalhos =====
+
+def header_signature(*header_lists) -> str:
+    raw = json.dumps([[str(c) for c in cols] for cols in header_lists], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _read_map_file(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def load_column_map(path: str, signature: str) -> dict | None:
+    return _read_map_file(Path(path)).get(signature)
+
+
+def save_column_map(path: str, signature: str, mapping: dict, keep: int = 50):
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    data = _read_map_file(p)
+    data.pop(signature, None)
+    data[signature] = mapping
+    # mantém só as assinaturas mais recentes (dict preserva a ordem de inserção)
+    data = dict(list(data.items())[-keep:])
+    tmp = p.with_suffix(p.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, p)
@@ -1,3 +1,4 @@
+import copy
 import json
 from pathlib import Path
 
@@ -22,3 +23,15 @@ class Config:
                 return default
         return cur
 
+    def with_values(self, values: dict) -> "Config":
+        """Cópia com chaves pontuadas sobrescritas (ex.: {"paths.auditoria_xlsx": "..."})."""
+        data = copy.deepcopy(self.data)
+        for dotted, value in values.items():
+            cur = data
+            *parents, last = dotted.split(".")
+            for part in parents:
+                if not isinstance(cur.get(part), dict):
+                    cur[part] = {}
+                cur = cur[part]
+            cur[last] = value
+        return Config(data)
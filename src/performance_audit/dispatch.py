@@ -1,294 +1,455 @@
+import json
+import os
 import time
 from datetime import datetime
+from pathlib import Path
 
-import pandas as pd
-
-from .excel_utils import read_excel_first_sheet, excel_is_locked
-from .columns import find_column
-from .token_utils import make_token
-from .history_store import append_row
+from . import metrics
+from .history_store import open_history, sent_key
 from .outlook_client import OutlookClient
-
-
-def _clean_email(e: str) -> str:
-    if e is None:
-        return ""
-    e = str(e).strip().replace("\u00a0", "").replace(" ", "")
-    for ch in ["\u200b", "\u200c", "\u200d", "\ufeff"]:
-        e = e.replace(ch, "")
-    return e
-
-
-def _email_ok(e: str) -> bool:
-    import re
-    return bool(re.match(r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$", _clean_email(e)))
-
-
-def _norm_cod_assessor(raw) -> str:
-    if pd.isna(raw):
-        return ""
-    s = str(raw).strip()
-    if not s:
-        return ""
-
-    # trata casos de número no Excel (ex: 123.0)
-    try:
-        f = float(s.replace(",", "."))
-        if f.is_integer():
-            s = str(int(f))
-    except Exception:
-        pass
-
-    s = s.upper()
-    if not s.startswith("A"):
-        s = "A" + s
-    return s
-
-
-def _load_html(path: str) -> str:
-    try:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read()
-    except Exception:
-        return ""
+from .plan_io import iter_plan, plan_chunks, read_plan, write_plan
+from .planning import (
+    GROUPING_ASSESSOR,
+    GROUPING_NONE,
+    SKIP_BAD_EMAIL,
+    SKIP_NO_PROF,
+    body_sha256,
+    digest_subject,
+    load_html,
+    render_body,
+    render_digest_body,
+)
+from .rate_limit import limiter_from_config
+from .recipients import RecipientCache, plan_addresses, row_addresses
+from .sender import ComTransport, SendJob, SendPool
 
 
 def _load_outlook_signature(signature_name: str) -> str:
-    import os
     appdata = os.environ.get("APPDATA", "")
     sig_dir = os.path.join(appdata, "Microsoft", "Signatures")
     sig_path = os.path.join(sig_dir, f"{signature_name}.htm")
-    return _load_html(sig_path) if os.path.exists(sig_path) else ""
-
-
-def dispatch(cfg, logger):
-    aud_path = cfg.get("paths.auditoria_xlsx")
-    prof_path = cfg.get("paths.profissionais_xlsx")
-    history_xlsx = cfg.get("paths.history_xlsx")
-    sheet_name = cfg.get("history.sheet_name", "Performance_Audit_History")
-
-    # bloqueio Excel aberto
-    if excel_is_locked(aud_path):
-        raise PermissionError(f"Feche a planilha de auditoria: {aud_path}")
-    if excel_is_locked(prof_path):
-        raise PermissionError(f"Feche a base de profissionais: {prof_path}")
+    return load_html(sig_path) if os.path.exists(sig_path) else ""
 
-    df_aud, sh_aud = read_excel_first_sheet(aud_path, None)
-    df_prof, sh_prof = read_excel_first_sheet(prof_path, None)
 
-    logger.info(f"Auditoria carregada | aba: {sh_aud} | linhas: {len(df_aud)}")
-    logger.info(f"Profissionais carregada | aba: {sh_prof} | linhas: {len(df_prof)}")
+def _checkpoint_path(cfg) -> Path:
+    return Path(cfg.get("paths.dispatch_checkpoint", "data/dispatch_checkpoint.json"))
 
-    # ===== Colunas AUDITORIA (tolerante) =====
-    c_cod_cli = find_column(df_aud, ["Cod Cliente", "Código Cliente", "Conta", "Codigo Cliente"])
-    c_nome_cli = find_column(df_aud, ["Nome Cliente", "Cliente", "Nome do Cliente"])
-    c_cod_ass = find_column(df_aud, ["Cod Assessor", "Código Assessor", "Codigo Assessor", "Assessor"])
 
-    if not all([c_cod_cli, c_nome_cli, c_cod_ass]):
-        raise RuntimeError(
-            "Colunas obrigatórias não encontradas na auditoria. "
-            f"cod_cliente={c_cod_cli}, nome_cliente={c_nome_cli}, cod_assessor={c_cod_ass}"
-        )
-
-    # ===== Colunas PROFISSIONAIS (tolerante) =====
-    p_cod = find_column(df_prof, ["Cod Assessor", "Código", "Codigo", "Cod Profissional"])
-    p_nome = find_column(df_prof, ["Nome Assessor", "Nome", "Assessor"])
-    p_email = find_column(df_prof, ["E-mail", "Email", "Email Profissional", "E-mail Profissional"])
+def _read_checkpoint(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
 
-    p_cod_lider = find_column(df_prof, ["Cod Lider", "Código Líder", "Codigo Lider", "Cod Supervisor"])
-    p_email_lider = find_column(df_prof, ["E-mail Líder", "Email Lider", "E-mail Supervisor", "Email Supervisor"])
 
-    if not all([p_cod, p_nome, p_email]):
-        raise RuntimeError(
-            "Colunas obrigatórias não encontradas na base de profissionais. "
-            f"cod={p_cod}, nome={p_nome}, email={p_email}"
-        )
+def _write_checkpoint(path: Path, state: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
 
-    # ===== Normaliza base de profissionais =====
-    df_prof["_COD_NORM"] = df_prof[p_cod].apply(_norm_cod_assessor)
-    df_prof = df_prof[df_prof["_COD_NORM"] != ""].copy()
-    df_prof = df_prof.drop_duplicates(subset="_COD_NORM", keep="last")
-    prof_map = df_prof.set_index("_COD_NORM").to_dict(orient="index")
 
-    # ===== Limpa base de auditoria =====
-    df_aud["_COD_ASS_NORM"] = df_aud[c_cod_ass].apply(_norm_cod_assessor)
-    df_aud["_COD_CLI_STR"] = df_aud[c_cod_cli].astype(str).str.strip()
-    df_aud = df_aud[(df_aud["_COD_ASS_NORM"] != "") & (df_aud["_COD_CLI_STR"].str.lower() != "nan")].copy()
+def _plan_source(cfg, logger, from_plan: str | None, persist_to: Path):
+    """
+    (blocos do plano, meta, month_ref, arquivo do plano).
 
-    if df_aud.empty:
+    Sem --from-plan o plano calculado é gravado em `persist_to` antes do envio:
+    é ele que o --resume reabre, com os mesmos tokens.
+    """
+    month_ref = cfg.get("project.month_ref", "")
+    chunk_rows = int(cfg.get("ingest.chunk_rows", 50_000))
+
+    if not from_plan:
+        chunks, meta = plan_chunks(cfg, logger)
+        meta["counts"] = write_plan(chunks, meta, str(persist_to))["counts"]
+        if isinstance(chunks, list):
+            return chunks, meta, month_ref, str(persist_to)
+        # streaming: os blocos já foram consumidos na gravação; relê do disco
+        chunks, _ = iter_plan(str(persist_to), chunk_rows)
+        return chunks, meta, month_ref, str(persist_to)
+
+    chunks, meta = iter_plan(from_plan, chunk_rows)
+    if meta.get("grouping", GROUPING_NONE) == GROUPING_ASSESSOR:
+        # digest: um e-mail pode cobrir linhas de blocos diferentes; lê o plano inteiro
+        plan, meta = read_plan(from_plan)
+        chunks = [plan]
+
+    plan_month = meta.get("month_ref", month_ref)
+    if month_ref and plan_month and plan_month != month_ref:
+        raise RuntimeError(f"Plano de {plan_month} não corresponde ao month_ref configurado ({month_ref}).")
+    counts = meta.get("counts", {})
+    logger.info(f"Plano carregado: {from_plan} | criado em {meta.get('created_at', '-')} | "
+                f"linhas: {counts.get('total', '-')}")
+    return chunks, meta, plan_month, from_plan
+
+
+def _resolve_recipients(cfg, logger, chunks, plan_file: str, month_ref: str, already_sent: set,
+                        make_client) -> set:
+    """
+    Resolve no catálogo, uma vez cada, os endereços To/CC das linhas ainda não enviadas.
+
+    Retorna os endereços (minúsculos) que não resolveram; eles são listados
+    no log antes de qualquer e-mail ser criado.
+    """
+    chunk_rows = int(cfg.get("ingest.chunk_rows", 50_000))
+    plans = chunks if isinstance(chunks, list) else iter_plan(plan_file, chunk_rows)[0]
+
+    def pending():
+        for plan in plans:
+            if already_sent and len(plan):
+                done = [sent_key(month_ref, c, a) in already_sent
+                        for c, a in zip(plan["cod_cliente"], plan["cod_assessor"])]
+                plan = plan[[not d for d in done]]
+            yield plan
+
+    ttl = float(cfg.get("outlook.recipient_cache_ttl_hours", 12))
+    cache = RecipientCache(cfg.get("paths.recipient_cache", "data/recipient_cache.json") if ttl > 0 else None, ttl)
+
+    with metrics.timer("recipient_prepass"):
+        addresses = plan_addresses(pending())
+
+        def make_resolver():
+            return make_client().resolve_address
+
+        res = cache.resolve_all(sorted(addresses), make_resolver)
+    cache.save()
+
+    logger.info(f"Destinatários: {len(addresses)} endereço(s) único(s) | cache: {res['cached']} | "
+                f"resolvidos agora: {res['resolved']} | falharam: {len(res['failed'])}")
+    for addr in res["failed"]:
+        logger.warn(f"[NAO_RESOLVIDO] {addr}: {addresses[addr]} linha(s) não serão enviadas.",
+                    address=addr, rows=addresses[addr], status="NAO_RESOLVIDO")
+    return set(res["failed"])
+
+
+def dispatch(cfg, logger, from_plan: str | None = None, resume: bool = False, client=None):
+    """
+    Envia o plano e registra o histórico.
+
+    `client` é um OutlookClient já aberto (modo serve): com um worker o envio
+    roda nele, na thread de quem chama, sem nova sessão do Outlook. O meio de
+    envio vem de `behavior.transport` (com | smtp).
+    """
+    checkpoint = _checkpoint_path(cfg)
+    if resume:
+        state = _read_checkpoint(checkpoint)
+        if state is None:
+            raise RuntimeError(f"Nenhum checkpoint de dispatch para retomar: {checkpoint}")
+        if state.get("status") == "concluido":
+            logger.info(f"Dispatch de {state.get('started_at', '-')} já foi concluído; nada a retomar.")
+            return
+        from_plan = state["plan_file"]
+        logger.info(f"Retomando dispatch iniciado em {state.get('started_at', '-')} | plano: {from_plan}")
+
+    persist_to = checkpoint.with_name(checkpoint.stem + ".plan.jsonl")
+    with metrics.timer("plan"):
+        chunks, meta, month_ref, plan_file = _plan_source(cfg, logger, from_plan, persist_to)
+
+    if meta.get("counts", {}).get("total") == 0 or (
+            isinstance(chunks, list) and all(c.empty for c in chunks)):
         logger.warn("Nenhuma linha válida na auditoria após limpeza.")
         return
 
-    # ===== Outlook =====
-    from_smtp = cfg.get("outlook.from_smtp")
-    store_hint = cfg.get("outlook.store_hint", "riscos")
-    oc = OutlookClient(from_smtp=from_smtp, store_hint=store_hint)
-
-    sent_folder = oc.get_sent_folder() if cfg.get("outlook.use_sent_folder_override", True) else None
-
-    # ===== Assinatura (opcional) =====
-    signature_html = ""
-    if cfg.get("signature.use_local_outlook_signature", True):
-        signature_html = _load_outlook_signature(cfg.get("signature.signature_windows_name", ""))
-
-    # ===== Template corpo =====
-    body_template_path = cfg.get("paths.email_body_html")
-    body_template = _load_html(body_template_path)
-
-    # ===== Comportamento =====
-    send_mode = str(cfg.get("behavior.send_mode", "display")).lower()   # display | send
-    force_send = bool(cfg.get("behavior.force_send", True))
-    delay = float(cfg.get("behavior.delay_between_emails_sec", 2.5))
-    retry_send = int(cfg.get("behavior.retry_send", 2))
-    max_emails = cfg.get("behavior.max_emails", None)
-
-    # ===== Regras de e-mail =====
-    month_ref = cfg.get("project.month_ref", "")
-    subject_tpl = cfg.get("email.subject_template", "Auditoria – Cliente {nome_cliente} – {cod_cliente}")
-    sla_days = cfg.get("email.sla_business_days", 3)
-    skip_cc_codes = set(cfg.get("cc_rules.skip_cc_if_leader_in_codes", []))
-
-    total = 0
-    sent = 0
-    skipped_no_prof = 0
-    skipped_bad_email = 0
-
-    for _, row in df_aud.iterrows():
-        total += 1
-        if max_emails and sent >= int(max_emails):
-            logger.warn("Limite max_emails atingido. Encerrando.")
-            break
-
-        cod_cliente = str(row.get(c_cod_cli, "")).strip()
-        nome_cliente = str(row.get(c_nome_cli, "")).strip()
-        cod_ass = _norm_cod_assessor(row.get(c_cod_ass, ""))
-
-        if cod_ass not in prof_map:
-            skipped_no_prof += 1
-            logger.warn(f"[PULADO] Cliente {cod_cliente}: assessor {cod_ass} não encontrado na base.")
-            continue
-
-        prof = prof_map[cod_ass]
-        nome_assessor = str(prof.get(p_nome, "")).strip()
-        to_email = _clean_email(prof.get(p_email, ""))
-
-        if not _email_ok(to_email):
-            skipped_bad_email += 1
-            logger.warn(f"[PULADO] Cliente {cod_cliente}: assessor {cod_ass} sem e-mail válido.")
-            continue
-
-        # ===== CC do líder (mesma proposta do seu script) =====
-        cc_email = ""
-        cod_lider = _norm_cod_assessor(prof.get(p_cod_lider, "")) if p_cod_lider else ""
-
-        if cod_lider and cod_lider in skip_cc_codes:
-            cc_email = ""
-        elif cod_lider and cod_lider in prof_map:
-            cc_candidate = _clean_email(prof_map[cod_lider].get(p_email, ""))
-            if _email_ok(cc_candidate):
-                cc_email = cc_candidate
-        elif p_email_lider:
-            cc_candidate = _clean_email(prof.get(p_email_lider, ""))
-            if _email_ok(cc_candidate):
-                cc_email = cc_candidate
-
-        token = make_token("PERF")
-        subject = subject_tpl.format(nome_cliente=nome_cliente, cod_cliente=cod_cliente)
-
-        # corpo com placeholders
-        body = body_template.format(
-            nome_assessor=nome_assessor,
-            nome_cliente=nome_cliente,
-            cod_cliente=cod_cliente,
-            sla_business_days=sla_days
+    # ===== Histórico: o que já saiu neste mês não é enviado de novo =====
+    history = open_history(cfg)
+    try:
+        replayed = history.recover()
+        if replayed:
+            logger.warn(f"Histórico: {replayed} linha(s) recuperada(s) do journal da execução anterior.")
+        t_keys = time.perf_counter()
+        already_sent = history.sent_keys(month_ref)
+        logger.info(f"Histórico: {len(already_sent)} cliente(s) já enviados em {month_ref} "
+                    f"({time.perf_counter() - t_keys:.2f}s)")
+
+        state = {
+            "started_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "month_ref": month_ref,
+            "plan_file": plan_file,
+            "status": "em_andamento",
+        }
+        _write_checkpoint(checkpoint, state)
+
+        # ===== Outlook =====
+        from_smtp = cfg.get("outlook.from_smtp")
+        store_hint = cfg.get("outlook.store_hint", "riscos")
+
+        def make_client():
+            return OutlookClient(from_smtp=from_smtp, store_hint=store_hint)
+
+        # modo serve: a sessão já aberta atende a pré-resolução e, com um worker, o envio
+        # (objetos COM não passam entre threads: com mais workers cada um abre a sua)
+        warm_client = (lambda: client) if client is not None else make_client
+
+        # ===== Assinatura (opcional) =====
+        signature_html = ""
+        if cfg.get("signature.use_local_outlook_signature", True):
+            signature_html = _load_outlook_signature(cfg.get("signature.signature_windows_name", ""))
+
+        # ===== Template corpo =====
+        grouping = meta.get("grouping", GROUPING_NONE)
+        if grouping == GROUPING_ASSESSOR:
+            body_template_path = cfg.get("paths.email_body_digest_html", "templates/email_body_digest.html")
+        else:
+            body_template_path = cfg.get("paths.email_body_html")
+        body_template = load_html(body_template_path)
+        if meta.get("template_sha256") and body_sha256(body_template) != meta["template_sha256"]:
+            raise RuntimeError(f"Template do corpo mudou desde a geração do plano: {body_template_path}")
+
+        # ===== Comportamento =====
+        send_mode = str(cfg.get("behavior.send_mode", "display")).lower()   # display | send
+        force_send = bool(cfg.get("behavior.force_send", True))
+        retry_send = int(cfg.get("behavior.retry_send", 2))
+        max_emails = cfg.get("behavior.max_emails", None)
+        workers = int(cfg.get("behavior.workers", 1))
+        transport_name = str(cfg.get("behavior.transport", "com")).lower()   # com | smtp
+        if transport_name not in ("com", "smtp"):
+            raise ValueError(f"behavior.transport inválido: {transport_name} (use com ou smtp)")
+        if transport_name == "smtp":
+            if send_mode == "display" or not force_send:
+                raise ValueError("behavior.transport=smtp só envia direto: use send_mode=send e force_send=true.")
+            # uma conexão persistente por worker
+            workers = int(cfg.get("smtp.pool_size", workers))
+        elif send_mode == "display" or not force_send:
+            # rascunhos abertos na tela: um de cada vez
+            workers = 1
+
+        limiter = limiter_from_config(cfg)
+
+        # ===== Destinatários: cada endereço do plano é resolvido uma vez, antes do primeiro e-mail =====
+        # (catálogo do Outlook: no SMTP quem recusa destinatário é o servidor, no próprio envio)
+        prepass = transport_name == "com" and bool(cfg.get("outlook.recipient_prepass", True))
+        unresolved = set()
+        if prepass:
+            unresolved = _resolve_recipients(cfg, logger, chunks, plan_file, month_ref, already_sent, warm_client)
+
+        # ===== Regras de e-mail =====
+        sla_days = cfg.get("email.sla_business_days", 3)
+
+        digest_subject_tpl = cfg.get(
+            "email.digest_subject_template",
+            "Auditoria de Desempenho – {qtd_clientes} cliente(s) – {nome_assessor}"
         )
-
-        # token no corpo (fundamental pro follow-up)
-        body += f"<br><br><p><small><b>Token:</b> {token}</small></p>"
-
-        # assinatura (se existir)
-        if signature_html:
-            body += "<br><br>" + signature_html
-
-        # ===== montar e-mail =====
-        mail = oc.create_mail()
-        mail.To = to_email
-        if cc_email:
-            mail.CC = cc_email
-        mail.Subject = subject
-        mail.HTMLBody = body
-
-        if not mail.Recipients.ResolveAll():
-            logger.warn(f"[PULADO] Cliente {cod_cliente}: destinatários não resolvidos.")
-            continue
-
-        # ===== display / send =====
-        if send_mode == "display" or not force_send:
-            try:
-                mail.Save()
-            except Exception:
-                pass
-            mail.Display()
-            status = "PREPARADO"
+        partial = set()
+
+        # no modo digest cada token é um e-mail
+        email_budget = int(max_emails) if max_emails else None
+
+        rows_seen = 0
+        processed = 0
+        sent = 0
+        skipped_no_prof = 0
+        skipped_bad_email = 0
+        skipped_unresolved = 0
+        skipped_body = 0
+        skipped_limit = 0
+        skipped_done = 0
+        failed = 0
+        interrupted = 0
+        failure = None
+
+        def _log_skipped(plan):
+            nonlocal skipped_no_prof, skipped_bad_email
+            for row in plan[plan["skip_reason"] != ""].itertuples(index=False):
+                if row.skip_reason == SKIP_NO_PROF:
+                    skipped_no_prof += 1
+                    logger.warn(f"[PULADO] Cliente {row.cod_cliente}: assessor {row.cod_assessor} não encontrado na base.",
+                                cod_cliente=row.cod_cliente, cod_assessor=row.cod_assessor, status="PULADO",
+                                reason=row.skip_reason)
+                elif row.skip_reason == SKIP_BAD_EMAIL:
+                    skipped_bad_email += 1
+                    logger.warn(f"[PULADO] Cliente {row.cod_cliente}: assessor {row.cod_assessor} sem e-mail válido.",
+                                cod_cliente=row.cod_cliente, cod_assessor=row.cod_assessor, status="PULADO",
+                                reason=row.skip_reason)
+
+        def _sendable(plan):
+            nonlocal email_budget, skipped_limit, skipped_done
+            sendable = plan[plan["skip_reason"] == ""]
+            if already_sent and len(sendable):
+                done = [sent_key(month_ref, c, a) in already_sent
+                        for c, a in zip(sendable["cod_cliente"], sendable["cod_assessor"])]
+                skipped_done += sum(done)
+                sendable = sendable[[not d for d in done]]
+            if email_budget is None:
+                return sendable
+            tokens = sendable["token"].drop_duplicates()
+            if len(tokens) > email_budget:
+                if skipped_limit == 0:
+                    logger.warn(f"Limite max_emails atingido: enviando no máximo {int(max_emails)} e-mails.")
+                keep = set(tokens.head(email_budget))
+                skipped_limit += len(tokens) - len(keep)
+                sendable = sendable[sendable["token"].isin(keep)]
+                email_budget = 0
+            else:
+                email_budget -= len(tokens)
+            return sendable
+
+        def _grouped():
+            nonlocal rows_seen
+            for plan in chunks:
+                rows_seen += len(plan)
+                _log_skipped(plan)
+                sendable = _sendable(plan)
+                if grouping == GROUPING_ASSESSOR:
+                    full = plan["token"].value_counts()
+                    for token, grp in sendable.groupby("token", sort=False):
+                        rows = list(grp.itertuples(index=False))
+                        if len(rows) < full[token]:
+                            # parte do grupo já foi enviada antes: o e-mail sai só com o restante
+                            subject = digest_subject(digest_subject_tpl, rows)
+                            rows = [r._replace(subject=subject) for r in rows]
+                            partial.add(token)
+                        yield rows, render_digest_body(body_template, rows, sla_days, token)
+                else:
+                    for row in sendable.itertuples(index=False):
+                        yield [row], render_body(body_template, row, sla_days, row.token)
+
+        def jobs():
+            nonlocal skipped_body, skipped_unresolved
+            for rows, body in _grouped():
+                row = rows[0]
+                if unresolved and any(a.lower() in unresolved for a in row_addresses(row)):
+                    skipped_unresolved += len(rows)
+                    logger.warn(f"[PULADO] Cliente {row.cod_cliente}: destinatário não resolvido na pré-resolução.",
+                                token=row.token, cod_cliente=row.cod_cliente, cod_assessor=row.cod_assessor,
+                                status="PULADO", reason="nao_resolvido", clientes=len(rows))
+                    continue
+                if row.token not in partial and body_sha256(body) != row.body_sha256:
+                    skipped_body += len(rows)
+                    logger.warn(f"[PULADO] Cliente {row.cod_cliente}: corpo diverge do plano (token={row.token}).",
+                                token=row.token, cod_cliente=row.cod_cliente, cod_assessor=row.cod_assessor,
+                                status="PULADO", reason="corpo_divergente", clientes=len(rows))
+                    continue
+
+                # assinatura (se existir)
+                if signature_html:
+                    body += "<br><br>" + signature_html
+                yield SendJob(row, body, rows=rows)
+
+        if transport_name == "smtp":
+            from .smtp_transport import smtp_transport_from_config
+            transport = smtp_transport_from_config(cfg)
+            inline = False
         else:
-            try:
-                mail.Save()
-            except Exception:
-                pass
-
-            last_ex = None
-            ok = False
-            for _ in range(retry_send):
-                try:
-                    mail.Send()
-                    ok = True
-                    break
-                except Exception as ex:
-                    last_ex = ex
-                    time.sleep(1.2)
-
-            if not ok:
-                raise RuntimeError(f"Falha ao enviar (após {retry_send} tentativas): {last_ex}")
-
-            status = "ENVIADO"
-            sent += 1
-
-            # move para "Enviados" da store alvo (se configurado)
-            if sent_folder is not None:
-                try:
-                    mail.Move(sent_folder)
-                except Exception:
-                    pass
-
-        ids = oc.extract_ids(mail)
-
-        # ===== registrar histórico =====
-        append_row(history_xlsx, sheet_name, {
-            "datetime_sent": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "month_ref": month_ref,
-            "cod_cliente": cod_cliente,
-            "nome_cliente": nome_cliente,
-            "cod_assessor": cod_ass,
-            "nome_assessor": nome_assessor,
-            "to_email": to_email,
-            "cc_email": cc_email,
-            "token": token,
-            "subject": subject,
-            "entry_id": ids.get("entry_id", ""),
-            "conversation_id": ids.get("conversation_id", ""),
-            "internet_message_id": ids.get("internet_message_id", ""),
-            "status": status,
-            "last_update_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "notes": ""
-        })
-
-        logger.info(f"[{status}] Cliente {cod_cliente} | {cod_ass} -> {to_email} (CC: {cc_email or '-'}) | token={token}")
-
-        time.sleep(delay)
-
-    logger.info("==== RESUMO DISPATCH ====")
-    logger.info(f"Total processado: {total}")
-    logger.info(f"Enviados: {sent}")
-    logger.info(f"Pulado (sem assessor na base): {skipped_no_prof}")
-    logger.info(f"Pulado (e-mail inválido): {skipped_bad_email}")
+            inline = client is not None and workers == 1
+            transport = ComTransport(
+                warm_client if inline else make_client,
+                send_kwargs={
+                    "send_mode": send_mode,
+                    "force_send": force_send,
+                    "retry_send": retry_send,
+                    "backoff_base": float(cfg.get("behavior.backoff_base_sec", 1.0)),
+                    "backoff_max": float(cfg.get("behavior.backoff_max_sec", 30.0)),
+                    "resolve": not prepass,
+                },
+                use_sent_folder=bool(cfg.get("outlook.use_sent_folder_override", True)),
+            )
+        pool = SendPool(transport, limiter=limiter, workers=workers, inline=inline)
+        logger.info(f"Envio: {transport.name} | {workers} worker(s) | limite {limiter.max_rate:.1f} msg/min | "
+                    f"rajada {limiter.burst}")
+
+        with history.writer() as hw:
+            if hw.replayed:
+                logger.warn(f"Histórico: {hw.replayed} linha(s) recuperada(s) do journal da execução anterior.")
+
+            for res in pool.run(jobs()):
+                row = res.job.row
+                rows = res.job.rows
+                processed += len(rows)
+                who = (f"Cliente {row.cod_cliente}" if len(rows) == 1
+                       else f"Assessor {row.cod_assessor} ({len(rows)} clientes)")
+
+                if res.status == "NAO_RESOLVIDO":
+                    skipped_unresolved += len(rows)
+                    logger.warn(f"[PULADO] {who}: destinatários não resolvidos.",
+                                token=row.token, cod_cliente=row.cod_cliente, cod_assessor=row.cod_assessor,
+                                status="PULADO", reason="nao_resolvido", clientes=len(rows),
+                                elapsed_ms=round(res.elapsed_ms, 1))
+                    continue
+
+                if res.status == "FALHA":
+                    # o pool já parou sozinho: o que já foi enviado continua sendo registrado
+                    failed += len(rows)
+                    if failure is None:
+                        failure = res
+                    logger.error(f"[FALHA] {who}: {res.error} (após {retry_send} tentativas)",
+                                 token=row.token, cod_cliente=row.cod_cliente, cod_assessor=row.cod_assessor,
+                                 status="FALHA", retries=res.retries, elapsed_ms=round(res.elapsed_ms, 1))
+                    continue
+
+                if res.status == "INTERROMPIDO":
+                    # não saiu: fica para o dispatch --resume
+                    interrupted += len(rows)
+                    logger.warn(f"[INTERROMPIDO] {who}: não enviado após falha anterior | token={row.token}",
+                                token=row.token, cod_cliente=row.cod_cliente, cod_assessor=row.cod_assessor,
+                                status="INTERROMPIDO", clientes=len(rows))
+                    continue
+
+                status = res.status
+                if status == "ENVIADO":
+                    sent += 1
+                # SMTP: o servidor aceitou o e-mail mas recusou parte dos destinatários
+                notes = f"Destinatários recusados: {', '.join(res.refused)}" if res.refused else ""
+
+                # ===== registrar histórico (uma linha por cliente, todas com o token do e-mail) =====
+                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                for r in rows:
+                    hw.append({
+                        "datetime_sent": now,
+                        "month_ref": month_ref,
+                        "cod_cliente": r.cod_cliente,
+                        "nome_cliente": r.nome_cliente,
+                        "cod_assessor": r.cod_assessor,
+                        "nome_assessor": r.nome_assessor,
+                        "to_email": r.to_email,
+                        "cc_email": r.cc_email,
+                        "token": r.token,
+                        "subject": r.subject,
+                        "entry_id": res.ids.get("entry_id", ""),
+                        "conversation_id": res.ids.get("conversation_id", ""),
+                        "internet_message_id": res.ids.get("internet_message_id", ""),
+                        "status": status,
+                        "last_update_at": now,
+                        "notes": notes
+                    })
+
+                logger.info(f"[{status}] {who} | {row.cod_assessor} -> {row.to_email} "
+                            f"(CC: {row.cc_email or '-'}) | token={row.token}",
+                            token=row.token, cod_cliente=row.cod_cliente, cod_assessor=row.cod_assessor,
+                            status=status, clientes=len(rows), retries=res.retries,
+                            elapsed_ms=round(res.elapsed_ms, 1))
+                if res.refused:
+                    logger.warn(f"[RECUSADO] {who}: servidor recusou {', '.join(res.refused)} | token={row.token}",
+                                token=row.token, cod_cliente=row.cod_cliente, cod_assessor=row.cod_assessor,
+                                status="RECUSADO", refused=res.refused)
+
+        if rows_seen == 0:
+            logger.warn("Nenhuma linha válida na auditoria após limpeza.")
+
+        total = processed + skipped_no_prof + skipped_bad_email + skipped_body + skipped_done
+        logger.info("==== RESUMO DISPATCH ====")
+        logger.info(f"Total processado: {total}")
+        logger.info(f"Enviados (e-mails): {sent}")
+        logger.info(f"Pulado (sem assessor na base): {skipped_no_prof}")
+        logger.info(f"Pulado (e-mail inválido): {skipped_bad_email}")
+        logger.info(f"Pulado (destinatário não resolvido): {skipped_unresolved}")
+        if failed or interrupted:
+            logger.info(f"Falhas: {failed} | interrompidos: {interrupted}")
+        if skipped_body:
+            logger.info(f"Pulado (corpo diverge do plano): {skipped_body}")
+        if skipped_done:
+            logger.info(f"Pulado (já enviado neste mês): {skipped_done}")
+        if skipped_limit:
+            logger.info(f"Não enviados (limite max_emails): {skipped_limit} e-mail(s)")
+    finally:
+        # também em exceção: no sqlite a conexão não fica aberta se o envio falhar
+        history.close()
+
+    state["status"] = "falha" if failure is not None else "concluido"
+    state["failed"] = failed
+    state["interrupted"] = interrupted
+    state["finished_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _write_checkpoint(checkpoint, state)
+
+    if failure is not None:
+        raise RuntimeError(f"Falha ao enviar (após {retry_send} tentativas): {failure.error}")
 
@@ -1 +1,210 @@
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from pathlib import Path
 
+import pandas as pd
+
+_CHUNK = 1024 * 1024
+
+
+def excel_is_locked(path: str) -> bool:
+    """True se a planilha estiver aberta no Excel (arquivo ~$ ao lado ou sem acesso de escrita)."""
+    p = Path(path)
+    if not p.exists():
+        return False
+
+    if (p.parent / f"~${p.name}").exists():
+        return True
+
+    try:
+        fd = os.open(str(p), os.O_RDWR)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    os.close(fd)
+    return False
+
+
+def excel_engine() -> str:
+    # calamine (Rust) é bem mais rápido que openpyxl para ler; usa se estiver instalado
+    if importlib.util.find_spec("python_calamine") is not None:
+        return "calamine"
+    return "openpyxl"
+
+
+def _first_sheet(path: str, sheet_name: str | None, engine: str) -> str:
+    if sheet_name:
+        return sheet_name
+    with pd.ExcelFile(path, engine=engine) as xf:
+        return xf.sheet_names[0]
+
+
+def read_excel_header(path: str, sheet_name: str | None = None):
+    """Lê só o cabeçalho: DataFrame sem linhas, usado para resolver colunas antes da leitura."""
+    engine = excel_engine()
+    sh = _first_sheet(path, sheet_name, engine)
+    return pd.read_excel(path, sheet_name=sh, nrows=0, engine=engine), sh
+
+
+def file_fingerprint(path: str) -> dict:
+    p = Path(path)
+    st = p.stat()
+    h = hashlib.blake2b(digest_size=16)
+    with open(p, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return {
+        "path": str(p.resolve()),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "content": h.hexdigest(),
+    }
+
+
+def _cache_key(fingerprint: dict, sheet_name: str | None, usecols) -> str:
+    raw = json.dumps({"fp": fingerprint, "sheet": sheet_name, "usecols": list(usecols) if usecols else None},
+                     sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _write_snapshot(df: pd.DataFrame, target: Path, sheet_name: str):
+    tmp = target.with_suffix(".tmp")
+    try:
+        df.to_parquet(tmp, index=False)
+    except Exception:
+        # colunas object com tipos misturados (ex.: 123.0 e "A123"): grava como texto, preservando vazios
+        fixed = df.copy()
+        for c in fixed.columns[fixed.dtypes == object]:
+            s = fixed[c]
+            fixed[c] = s.where(s.isna(), s.astype(str))
+        fixed.to_parquet(tmp, index=False)
+    os.replace(tmp, target)
+    target.with_suffix(".json").write_text(json.dumps({"sheet_name": sheet_name}), encoding="utf-8")
+
+
+def read_excel_first_sheet(path: str, sheet_name: str | None = None, usecols=None, cache_dir: str | None = None):
+    """
+    Lê a aba indicada (ou a primeira) e devolve (DataFrame, nome_da_aba).
+
+    `usecols` restringe a leitura às colunas já resolvidas. Com `cache_dir`
+    o resultado fica num snapshot Parquet chaveado por caminho, tamanho,
+    mtime e hash do conteúdo: com a base inalterada a próxima leitura
+    não passa pelo parser de Excel.
+    """
+    snapshot = None
+    if cache_dir and _parquet_available():
+        key = _cache_key(file_fingerprint(path), sheet_name, usecols)
+        snapshot = Path(cache_dir) / f"{Path(path).stem}-{key}.parquet"
+        if snapshot.exists():
+            try:
+                meta = json.loads(snapshot.with_suffix(".json").read_text(encoding="utf-8"))
+                df = pd.read_parquet(snapshot)
+                os.utime(snapshot)  # marca uso recente para a evicção
+                return df, meta["sheet_name"]
+            except Exception:
+                pass
+
+    engine = excel_engine()
+    sh = _first_sheet(path, sheet_name, engine)
+    df = pd.read_excel(path, sheet_name=sh, usecols=list(usecols) if usecols else None, engine=engine)
+
+    if snapshot is not None:
+        try:
+            snapshot.parent.mkdir(parents=True, exist_ok=True)
+            _write_snapshot(df, snapshot, sh)
+        except Exception:
+            # cache é só otimização: falha ao gravar não impede a execução
+            pass
+
+    return df, sh
+
+
+def iter_excel_chunks(path: str, sheet_name: str | None = None, usecols=None, chunk_rows: int = 50_000):
+    """
+    Lê a aba em modo streaming (openpyxl read_only) e entrega DataFrames de até `chunk_rows` linhas.
+
+    A memória fica limitada ao tamanho do bloco, não ao tamanho do arquivo.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        # mesmo texto de cabeçalho que o pandas usa, para casar com as colunas resolvidas
+        header = [str(h) if h is not None else "" for h in next(rows, ())]
+
+        wanted = list(usecols) if usecols else [h for h in header if h]
+        missing = [c for c in wanted if c not in header]
+        if missing:
+            raise RuntimeError(f"Colunas não encontradas em {Path(path).name}: {missing}")
+        idx = [header.index(c) for c in wanted]
+
+        buf = []
+        for values in rows:
+            if values is None:
+                continue
+            picked = [values[i] if i < len(values) else None for i in idx]
+            if all(v is None for v in picked):
+                continue
+            buf.append(picked)
+            if len(buf) >= chunk_rows:
+                yield pd.DataFrame(buf, columns=wanted)
+                buf = []
+        if buf:
+            yield pd.DataFrame(buf, columns=wanted)
+    finally:
+        wb.close()
+
+
+def evict_cache(cache_dir: str, max_age_days: float | None = 30, max_total_mb: float | None = 512) -> int:
+    """Remove snapshots mais velhos que `max_age_days` e os menos usados até caber em `max_total_mb`."""
+    d = Path(cache_dir)
+    if not d.exists():
+        return 0
+
+    now = time.time()
+    entries = []
+    for f in d.glob("*.parquet"):
+        try:
+            st = f.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, f))
+
+    removed = 0
+
+    def _drop(f: Path):
+        nonlocal removed
+        for p in (f, f.with_suffix(".json")):
+            try:
+                p.unlink()
+            except OSError:
+                pass
+        removed += 1
+
+    keep = []
+    for mtime, size, f in entries:
+        if max_age_days is not None and now - mtime > max_age_days * 86400:
+            _drop(f)
+        else:
+            keep.append((mtime, size, f))
+
+    if max_total_mb is not None:
+        budget = max_total_mb * 1024 * 1024
+        total = sum(size for _, size, _ in keep)
+        for mtime, size, f in sorted(keep):
+            if total <= budget:
+                break
+            _drop(f)
+            total -= size
+
+    return removed
@@ -1,109 +1,579 @@
-from openpyxl import load_workbook
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
 
-from .history_store import update_status_by_token
-from .outlook_client import OutlookClient
+from . import metrics, transitions
+from .history_store import OPEN_STATUSES, open_history
+from .token_utils import TOKEN_RX, is_valid_token, month_prefix, parse_token
 
+# limita varredura da caixa pra evitar ficar pesado
+DEFAULT_SCAN_LIMIT = 5000
 
-def _iter_inbox_items(ns):
-    inbox = ns.GetDefaultFolder(6)  # 6 = Inbox
-    items = inbox.Items
+# cabeçalhos de resposta expostos como propriedades MAPI (lidos via PropertyAccessor)
+PR_IN_REPLY_TO_ID = "http://schemas.microsoft.com/mapi/proptag/0x1042001F"
+PR_INTERNET_REFERENCES = "http://schemas.microsoft.com/mapi/proptag/0x1039001F"
+PR_TRANSPORT_MESSAGE_HEADERS = "http://schemas.microsoft.com/mapi/proptag/0x007D001F"
+
+# relatórios (NDR, confirmação de leitura) e ausência temporária: citam o e-mail
+# original (mesma conversa, In-Reply-To, token no corpo) mas não são resposta
+AUTO_REPLY_CLASSES = ("REPORT.", "IPM.NOTE.RULES.OOFTEMPLATE")
+_AUTO_SUBMITTED_RX = re.compile(r"^Auto-Submitted:[ \t]*([^\r\n;( \t]*)", re.IGNORECASE | re.MULTILINE)
+
+_MSG_ID_RX = re.compile(r"<([^<>\s]+)>")
+
+# o filtro de data do Restrict (DASL) é em UTC e o ReceivedTime vem em hora local:
+# recua o corte pelo maior fuso possível e confere a data exata no cliente
+_RESTRICT_MARGIN = timedelta(hours=14)
+
+
+def _restrict_filter(since: datetime | None, token_prefix: str) -> str:
+    clauses = []
+    if since is not None:
+        cut = since - _RESTRICT_MARGIN
+        clauses.append(f"\"urn:schemas:httpmail:datereceived\" >= '{cut:%Y-%m-%d %H:%M}'")
+    if token_prefix:
+        p = token_prefix.replace("'", "''")
+        clauses.append(f"(\"urn:schemas:httpmail:subject\" LIKE '%{p}%' "
+                       f"OR \"urn:schemas:httpmail:textdescription\" LIKE '%{p}%')")
+    return "@SQL=" + " AND ".join(clauses) if clauses else ""
+
+
+def _inbox_items(folder, since: datetime | None = None, token_prefix: str = "", newest_first: bool = True):
+    """
+    Itens da pasta, ordenados por ReceivedTime.
+
+    Com `since`/`token_prefix` o Outlook filtra do lado dele (Items.Restrict):
+    só chegam itens recebidos depois do corte e com o prefixo do token no
+    assunto ou no corpo. Se o Restrict falhar, devolve a pasta inteira.
+    """
+    items = folder.Items
+    flt = _restrict_filter(since, token_prefix)
+    if flt:
+        try:
+            items = items.Restrict(flt)
+        except Exception:
+            items = folder.Items
     try:
-        items.Sort("[ReceivedTime]", True)  # mais recentes primeiro
+        items.Sort("[ReceivedTime]", newest_first)
     except Exception:
         pass
     return items
 
 
-def _has_token_in_mail(item, token: str) -> bool:
-    token = token.strip()
-    if not token:
-        return False
+def _prefix_entry_ids(folder, since: datetime | None, token_prefix: str, limit: int) -> set | None:
+    """
+    EntryIDs dos itens com o prefixo do token, filtrados pelo Outlook.
 
+    São os únicos que podem casar pelo texto: o Body dos demais não precisa
+    ser lido. None se o Restrict não estiver disponível (aí lê o Body de todos).
+    """
+    if not token_prefix:
+        return None
     try:
-        subj = str(getattr(item, "Subject", "") or "")
-        if token in subj:
-            return True
+        items = folder.Items.Restrict(_restrict_filter(since, token_prefix))
+        n = items.Count
     except Exception:
-        pass
+        return None
+    if n > limit:
+        return None
+    return {_read_prop(items.Item(i), "EntryID") for i in range(1, n + 1)}
 
+
+def _read_prop(item, name: str) -> str:
+    # cada getattr é uma chamada COM: quem chama garante que lê uma vez só
     try:
-        body = str(getattr(item, "Body", "") or "")
-        if token in body:
+        return str(metrics.com_get(item, name, f"MailItem.{name}", "") or "")
+    except Exception:
+        return ""
+
+
+def _received_at(item) -> datetime | None:
+    # pywintypes.datetime -> datetime ingênuo, com precisão de segundos
+    try:
+        v = metrics.com_get(item, "ReceivedTime", "MailItem.ReceivedTime")
+        return datetime(v.year, v.month, v.day, v.hour, v.minute, v.second)
+    except Exception:
+        return None
+
+
+def _fmt_time(value: datetime | None) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else ""
+
+
+class Watermark:
+    """Marca d'água de uma pasta: ReceivedTime do último item lido e EntryIDs nesse mesmo segundo."""
+
+    def __init__(self, received: datetime | None = None, entry_ids=()):
+        self.received = received
+        self.entry_ids = set(entry_ids)
+        self.seen = 0
+        # corte fixo desta execução: a marca avança, o filtro não
+        self._start = (received, frozenset(self.entry_ids))
+
+    @classmethod
+    def from_dict(cls, data: dict | None) -> "Watermark":
+        if not data or not data.get("received_time"):
+            return cls()
+        return cls(datetime.strptime(data["received_time"], "%Y-%m-%d %H:%M:%S"), data.get("entry_ids", []))
+
+    def to_dict(self) -> dict:
+        return {
+            "received_time": _fmt_time(self.received),
+            "entry_ids": sorted(self.entry_ids),
+        }
+
+    def is_new(self, received: datetime | None, entry_id: str) -> bool:
+        start, start_ids = self._start
+        if start is None or received is None:
             return True
+        if received != start:
+            return received > start
+        return entry_id not in start_ids
+
+    def advance(self, received: datetime | None, entry_id: str):
+        self.seen += 1
+        if received is None:
+            return
+        if self.received is None or received > self.received:
+            self.received = received
+            self.entry_ids = {entry_id}
+        elif received == self.received:
+            self.entry_ids.add(entry_id)
+
+
+def _message_ids(text: str) -> list:
+    ids = _MSG_ID_RX.findall(text or "")
+    if not ids and text and text.strip():
+        ids = [text.strip()]
+    return ids
+
+
+def _reply_headers(item) -> tuple:
+    """(In-Reply-To, References) do item numa única chamada ao PropertyAccessor, quando possível."""
+    try:
+        pa = metrics.com_get(item, "PropertyAccessor", "PropertyAccessor")
     except Exception:
-        pass
+        return "", ""
+    try:
+        values = metrics.com_call("PropertyAccessor", pa.GetProperties, [PR_IN_REPLY_TO_ID, PR_INTERNET_REFERENCES])
+    except Exception:
+        values = []
+        for prop in (PR_IN_REPLY_TO_ID, PR_INTERNET_REFERENCES):
+            try:
+                values.append(metrics.com_call("PropertyAccessor", pa.GetProperty, prop))
+            except Exception:
+                values.append("")
+    # propriedade ausente volta como código de erro (int) no GetProperties
+    return tuple(v if isinstance(v, str) else "" for v in (list(values) + ["", ""])[:2])
 
-    return False
 
+def is_auto_submitted(value: str) -> bool:
+    """Cabeçalho Auto-Submitted (RFC 3834): qualquer valor diferente de "no" é mensagem automática."""
+    value = str(value or "").strip().lower()
+    return bool(value) and value != "no"
 
-def followup(cfg, logger):
-    history_xlsx = cfg.get("paths.history_xlsx")
-    sheet_name = cfg.get("history.sheet_name", "Performance_Audit_History")
-    month_ref = cfg.get("project.month_ref", "")
 
+def _is_auto_reply(item) -> bool:
+    """Ausência temporária, NDR ou outra mensagem automática; só é consultado para itens que casaram."""
+    if _read_prop(item, "MessageClass").upper().startswith(AUTO_REPLY_CLASSES):
+        return True
+    try:
+        pa = metrics.com_get(item, "PropertyAccessor", "PropertyAccessor")
+        headers = metrics.com_call("PropertyAccessor", pa.GetProperty, PR_TRANSPORT_MESSAGE_HEADERS)
+    except Exception:
+        return False
+    m = _AUTO_SUBMITTED_RX.search(headers if isinstance(headers, str) else "")
+    return bool(m) and is_auto_submitted(m.group(1))
+
+
+class ReplyIndex:
+    """
+    Mapas conversation_id -> token e internet_message_id -> token montados do histórico.
+
+    Uma resposta é reconhecida pela ConversationID do item ou pelos cabeçalhos
+    In-Reply-To/References, sem ler o Body. IDs que apontam para mais de um
+    token (ex.: assunto repetido entre meses) ficam fora do mapa.
+    """
+
+    def __init__(self):
+        self.by_conversation = {}
+        self.by_message_id = {}
+
+    @staticmethod
+    def _put(mapping: dict, key: str, token: str):
+        if not key:
+            return
+        if mapping.get(key, token) != token:
+            mapping[key] = None  # ambíguo: decide pelo token no texto
+        else:
+            mapping[key] = token
+
+    def add(self, token: str, conversation_id: str = "", internet_message_id: str = ""):
+        self._put(self.by_conversation, str(conversation_id or "").strip(), token)
+        for mid in _message_ids(str(internet_message_id or "")):
+            self._put(self.by_message_id, mid, token)
+
+    def __bool__(self):
+        return bool(self.by_conversation or self.by_message_id)
+
+    def match(self, item) -> tuple:
+        """(tokens, critério) para o item; conjunto vazio se os IDs não resolverem."""
+        if self.by_conversation:
+            token = self.by_conversation.get(_read_prop(item, "ConversationID").strip())
+            if token:
+                return {token}, "conversation_id"
+        if self.by_message_id:
+            in_reply_to, references = _reply_headers(item)
+            for mid in _message_ids(in_reply_to) + _message_ids(references)[::-1]:
+                token = self.by_message_id.get(mid)
+                if token:
+                    return {token}, "in_reply_to"
+        return set(), ""
+
+
+class TokenMatcher:
+    """
+    Casa todos os tokens abertos de uma vez.
+
+    Se todos estão no formato determinístico (token_utils), o texto passa por
+    um único regex do formato, o verificador descarta falsos positivos e o
+    resto é um lookup no conjunto. Tokens antigos caem na alternância compilada.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = {str(t or "").strip() for t in tokens} - {""}
+        self.structured = bool(self.tokens) and all(is_valid_token(t) for t in self.tokens)
+        if self.structured:
+            self._rx = TOKEN_RX
+            return
+        # mais longos primeiro: evita que um token prefixo de outro "roube" o match
+        ordered = sorted(self.tokens, key=len, reverse=True)
+        self._rx = re.compile("|".join(re.escape(t) for t in ordered)) if ordered else None
+
+    def find(self, text: str) -> set:
+        if self._rx is None or not text:
+            return set()
+        if self.structured:
+            found = {m.group(0) for m in self._rx.finditer(text)}
+            return {t for t in found if t in self.tokens and is_valid_token(t)}
+        return set(self._rx.findall(text))
+
+
+def common_prefix(tokens, fallback: str = "PERF-") -> str:
+    """Prefixo do mês quando todos os tokens abertos são do mesmo mês; senão `fallback`."""
+    prefixes = set()
+    for token in tokens:
+        info = parse_token(token)
+        if info is None:
+            return fallback
+        prefixes.add(month_prefix(info["month_ref"], info["prefix"]))
+    return prefixes.pop() if len(prefixes) == 1 else fallback
+
+
+def scan_mailbox(items, tokens, scan_limit: int = DEFAULT_SCAN_LIMIT, watermark: Watermark | None = None,
+                 reply_index: ReplyIndex | None = None, body_candidates: set | None = None) -> dict:
+    """
+    Varre a caixa uma única vez procurando todos os tokens abertos.
+
+    Com `reply_index` a resposta é resolvida primeiro por ConversationID e
+    In-Reply-To/References; só itens sem correspondência caem na busca do
+    token no Subject e, por último, no Body (só dos EntryIDs em
+    `body_candidates`, quando informado). Cada propriedade é lida no máximo
+    uma vez, independente da quantidade de tokens. Com `watermark`, itens já
+    vistos em execuções anteriores são pulados antes da leitura do conteúdo
+    e a marca avança a cada item lido. Retorna {token: dados da mensagem}.
+    """
+    matcher = TokenMatcher(tokens)
+    matches = {}
+    if not matcher.tokens:
+        return matches
+
+    for i in range(1, min(items.Count, scan_limit) + 1):
+        it = items.Item(i)
+        metrics.inc("mailbox_items")
+
+        entry_id = None
+        received = None
+        if watermark is not None:
+            received = _received_at(it)
+            entry_id = _read_prop(it, "EntryID")
+            if not watermark.is_new(received, entry_id):
+                continue
+            watermark.advance(received, entry_id)
+
+        found, how = reply_index.match(it) if reply_index else (set(), "")
+        found &= matcher.tokens
+        subj = None
+        if not found:
+            subj = _read_prop(it, "Subject")
+            found, how = matcher.find(subj), "token_assunto"
+            if not found - matches.keys():
+                if body_candidates is not None and entry_id is None:
+                    entry_id = _read_prop(it, "EntryID")
+                if body_candidates is None or entry_id in body_candidates:
+                    found, how = matcher.find(_read_prop(it, "Body")), "token_corpo"
+        found -= matches.keys()
+        if not found:
+            continue
+        # conferido antes de aceitar qualquer critério (IDs ou token): a resposta
+        # automática não fecha o token e a busca segue pelos próximos itens
+        if _is_auto_reply(it):
+            metrics.inc("auto_replies_skipped")
+            continue
+
+        hit = {
+            "entry_id": entry_id if entry_id is not None else _read_prop(it, "EntryID"),
+            "subject": subj if subj is not None else _read_prop(it, "Subject"),
+            "received_time": _fmt_time(received if received is not None else _received_at(it)),
+            "matched_by": how,
+        }
+        metrics.inc("replies", len(found), matched_by=how)
+        for token in found:
+            matches[token] = hit
+
+        # todos os tokens já têm resposta: não precisa ler o resto da caixa
+        if len(matches) == len(matcher.tokens):
+            break
+
+    return matches
+
+
+def _folder_key(folder) -> str:
+    try:
+        return str(folder.FolderPath)
+    except Exception:
+        return "Inbox"
+
+
+def _load_state(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(path: Path, state: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _parse_sent(value: str) -> datetime | None:
+    try:
+        return datetime.strptime(str(value).strip(), "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def _folder_specs(cfg) -> list:
+    """Pastas a varrer (`followup.folders`): {"store": trecho do nome, "path": "Inbox/Sub"}; padrão = Inbox."""
+    specs = []
+    for spec in cfg.get("followup.folders", None) or [{}]:
+        if isinstance(spec, str):
+            spec = {"path": spec}
+        specs.append({"store": str(spec.get("store", "") or ""), "path": str(spec.get("path", "") or "Inbox")})
+    return specs
+
+
+def _scan_folder(folder, open_tokens, reply_index: ReplyIndex, first_sent: datetime | None, state: dict,
+                 scan_limit: int, token_prefix: str, full_rescan: bool) -> dict:
+    """Varre uma pasta contra todos os tokens e devolve os matches parciais e a nova marca d'água."""
+    folder_key = _folder_key(folder)
+    body_candidates = None
+    since = None
+    if full_rescan:
+        # caminho antigo: pasta inteira, mais recentes primeiro, sem Restrict
+        watermark = Watermark()
+        items = _inbox_items(folder)
+    else:
+        # só o que chegou depois da marca d'água (e nunca antes do primeiro envio em aberto)
+        watermark = Watermark.from_dict(state.get(folder_key))
+        since = max((d for d in (watermark.received, first_sent) if d), default=None)
+        if reply_index:
+            # com IDs no histórico a resposta pode vir sem o token: filtra só pela data,
+            # e o Body só é lido nos itens que o Outlook achou com o prefixo
+            items = _inbox_items(folder, since=since, newest_first=False)
+            body_candidates = _prefix_entry_ids(folder, since, token_prefix, scan_limit)
+        else:
+            items = _inbox_items(folder, since=since, token_prefix=token_prefix, newest_first=False)
+
+    previous = watermark.received
+    with metrics.timer("inbox_scan"):
+        matches = scan_mailbox(items, open_tokens, scan_limit, watermark=watermark, reply_index=reply_index,
+                               body_candidates=body_candidates)
+    return {"folder": folder_key, "matches": matches, "state": watermark.to_dict(),
+            "summary": f"{folder_key} a partir de {since or 'início'} | {watermark.seen} item(ns) novo(s) lido(s) | "
+                       f"{len(matches)} resposta(s) | marca: {previous or '-'} -> {watermark.received or '-'}"}
+
+
+def _scan_spec(oc, spec: dict, scan_kwargs: dict) -> dict:
+    folder = oc.get_folder(spec["store"], spec["path"])
+    return _scan_folder(folder, **scan_kwargs)
+
+
+def _folder_worker(spec: dict, from_smtp: str, store_hint: str, scan_kwargs: dict) -> dict:
+    # cada thread tem o seu apartamento COM e o seu OutlookClient
+    from .outlook_client import OutlookClient
+    from .sender import _com_init
+
+    com = _com_init()
+    try:
+        oc = OutlookClient(from_smtp=from_smtp, store_hint=store_hint)
+        return _scan_spec(oc, spec, scan_kwargs)
+    finally:
+        if com is not None:
+            com.CoUninitialize()
+
+
+def _scan_outlook(cfg, logger, scan_kwargs: dict, full_rescan: bool, client=None) -> list:
+    """Pastas de `followup.folders`, uma por worker COM (ou em sequência no `client` do modo serve)."""
+    specs = _folder_specs(cfg)
+    workers = max(1, min(int(cfg.get("followup.workers", len(specs))), len(specs)))
+    if client is not None:
+        workers = 1
     from_smtp = cfg.get("outlook.from_smtp")
     store_hint = cfg.get("outlook.store_hint", "riscos")
-    oc = OutlookClient(from_smtp=from_smtp, store_hint=store_hint)
+    logger.info(f"Follow-up: {len(specs)} pasta(s) | {workers} worker(s)"
+                f"{' | varredura completa' if full_rescan else ''}")
 
-    wb = load_workbook(history_xlsx)
-    if sheet_name not in wb.sheetnames:
-        raise RuntimeError(f"Aba de histórico não encontrada: {sheet_name}")
+    results = [None] * len(specs)
+    errors = []
+    def _failed(i, ex):
+        errors.append(ex)
+        logger.error(f"Follow-up: falha em {specs[i]['store'] or 'store padrão'}/{specs[i]['path']}: {ex}")
 
-    ws = wb[sheet_name]
-    header = [c.value for c in ws[1]]
+    if client is not None:
+        for i, spec in enumerate(specs):
+            try:
+                results[i] = _scan_spec(client, spec, scan_kwargs)
+            except Exception as ex:
+                _failed(i, ex)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="followup") as pool:
+            futures = {pool.submit(_folder_worker, spec, from_smtp, store_hint, scan_kwargs): i
+                       for i, spec in enumerate(specs)}
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    results[i] = fut.result()
+                except Exception as ex:
+                    _failed(i, ex)
+    if errors:
+        # sem todas as pastas não dá para decidir quem ficou sem resposta
+        raise RuntimeError(f"Follow-up interrompido: {len(errors)} pasta(s) com erro.")
+    return results
 
-    col_token = header.index("token") + 1
-    col_status = header.index("status") + 1
-    col_month = header.index("month_ref") + 1
 
-    items = _iter_inbox_items(oc.ns)
+def followup(cfg, logger, full_rescan: bool = False, client=None):
+    """
+    Marca como RESPONDIDO/COBRADO os tokens em aberto do mês.
 
-    checked = 0
-    answered = 0
-    rebilled = 0
+    `client` (modo serve) é um OutlookClient já aberto na thread atual: as
+    pastas são lidas em sequência com ele, sem pool (objetos COM não passam
+    entre apartamentos). Com `followup.backend: files` as respostas vêm das
+    exportações em `followup.export_paths` (mail_export), sem Outlook.
+    """
+    month_ref = cfg.get("project.month_ref", "")
+    scan_limit = int(cfg.get("followup.scan_limit", DEFAULT_SCAN_LIMIT))
+    token_prefix = cfg.get("followup.token_prefix", None)
+    state_path = Path(cfg.get("paths.followup_state", "data/followup_state.json"))
+    backend = str(cfg.get("followup.backend", "outlook")).lower()   # outlook | files
+    if backend not in ("outlook", "files"):
+        raise ValueError(f"followup.backend inválido: {backend} (use outlook ou files)")
 
-    # limita varredura da caixa pra evitar ficar pesado
-    scan_limit = 5000
+    history = open_history(cfg)
 
-    for r in range(2, ws.max_row + 1):
-        token = str(ws.cell(r, col_token).value or "").strip()
-        status = str(ws.cell(r, col_status).value or "").strip().upper()
-        mref = str(ws.cell(r, col_month).value or "").strip()
+    # dispatch interrompido pode ter deixado linhas só no journal
+    replayed = history.recover()
+    if replayed:
+        logger.warn(f"Histórico: {replayed} linha(s) recuperada(s) do journal antes do follow-up.")
 
-        if month_ref and mref != month_ref:
-            continue
+    # ===== tokens em aberto (no modo digest várias linhas dividem o mesmo token) =====
+    open_tokens = {}
+    first_sent = None
+    reply_index = ReplyIndex()
+    with metrics.timer("history_load"):
+        for row in history.iter_rows(month_ref, statuses=OPEN_STATUSES):
+            token = str(row.get("token", "") or "").strip()
+            if token:
+                open_tokens[token] = None
+                reply_index.add(token, row.get("conversation_id", ""), row.get("internet_message_id", ""))
+                sent_at = _parse_sent(row.get("datetime_sent", ""))
+                if sent_at and (first_sent is None or sent_at < first_sent):
+                    first_sent = sent_at
+    open_tokens = list(open_tokens)
+    if not token_prefix:
+        # tokens do mesmo mês: o Restrict filtra por PERF-<aaaamm>- em vez de só PERF-
+        token_prefix = common_prefix(open_tokens)
 
-        if status not in ["ENVIADO", "COBRADO"]:
-            continue
+    # ===== uma varredura por pasta (ou caminho exportado); o tempo total é o da maior =====
+    state = _load_state(state_path)
+    if backend == "files":
+        from .mail_export import scan_exports
+        results = scan_exports(cfg, logger, open_tokens, reply_index, first_sent, state, full_rescan=full_rescan)
+    else:
+        scan_kwargs = {
+            "open_tokens": open_tokens,
+            "reply_index": reply_index,
+            "first_sent": first_sent,
+            "state": state,
+            "scan_limit": scan_limit,
+            "token_prefix": token_prefix,
+            "full_rescan": full_rescan,
+        }
+        results = _scan_outlook(cfg, logger, scan_kwargs, full_rescan, client)
 
-        checked += 1
-        found = False
+    # ===== junta os matches parciais na ordem configurada das pastas =====
+    matches = {}
+    for res in results:
+        for token, hit in res["matches"].items():
+            matches.setdefault(token, dict(hit, folder=res["folder"]))
+        state[res["folder"]] = res["state"]
+        logger.info(f"Follow-up: {res['summary']}")
 
-        for i in range(1, min(items.Count, scan_limit) + 1):
-            it = items.Item(i)
-            if _has_token_in_mail(it, token):
-                found = True
-                break
+    checked = 0
+    answered = 0
+    rebilled = 0
+    updates = {}
+
+    for token in open_tokens:
+        checked += 1
 
-        if found:
+        if token in matches:
             answered += 1
-            update_status_by_token(
-                history_xlsx, sheet_name, token,
-                "RESPONDIDO",
-                notes="Resposta encontrada na Inbox via token."
-            )
-            logger.info(f"[RESPONDIDO] token={token}")
+            how = matches[token]["matched_by"]
+            folder = matches[token]["folder"]
+            updates[token] = ("RESPONDIDO", f"Resposta encontrada em {folder} ({how}).")
+            logger.info(f"[RESPONDIDO] token={token} ({how})", token=token, status="RESPONDIDO", matched_by=how,
+                        folder=folder)
         else:
             rebilled += 1
-            update_status_by_token(
-                history_xlsx, sheet_name, token,
-                "COBRADO",
-                notes="Sem resposta detectada (token não encontrado na Inbox)."
-            )
-            logger.warn(f"[COBRADO] token={token} (sem resposta detectada)")
+            updates[token] = ("COBRADO", "Sem resposta detectada (token não encontrado nas pastas verificadas).")
+            logger.warn(f"[COBRADO] token={token} (sem resposta detectada)", token=token, status="COBRADO")
+
+    # ===== grava todas as decisões de uma vez =====
+    try:
+        not_found = history.update_statuses(updates)
+    finally:
+        history.close()
+    # a marca d'água só avança com as decisões gravadas: se a atualização
+    # falhar, a próxima execução relê as mesmas mensagens em vez de perdê-las
+    if open_tokens:
+        _save_state(state_path, state)
+    for token in not_found:
+        logger.warn(f"[HISTÓRICO] token={token} não encontrado ao atualizar status.")
+    # cada cobrança fica registrada (o histórico só guarda a última): base do relatório de analytics
+    missing = set(not_found)
+    # a resposta vale pela hora em que chegou, não pela hora desta execução
+    transitions.append(transitions.transitions_dir(cfg), month_ref,
+                       {t: status for t, (status, _) in updates.items() if t not in missing},
+                       received={t: hit["received_time"] for t, hit in matches.items() if hit.get("received_time")})
 
     logger.info("==== FOLLOW-UP RESUMO ====")
     logger.info(f"Registros verificados: {checked}")
     logger.info(f"Respondidos: {answered}")
     logger.info(f"Cobrados (sem resposta): {rebilled}")
-
@@ -0,0 +1,223 @@
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+from . import metrics
+from .history_store import (
+    DEFAULT_HEADERS,
+    OPEN_STATUSES,
+    SENT_STATUSES,
+    export_rows_xlsx,
+    iter_history_rows,
+    sent_key,
+)
+
+TABLE = "history"
+
+_INDEXES = {
+    "ix_history_token": "token",
+    "ix_history_month_status": "month_ref, status",
+    "ix_history_cod_assessor": "cod_assessor",
+    "ix_history_conversation_id": "conversation_id",
+}
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    con = sqlite3.connect(str(db_path), timeout=30)
+    con.row_factory = sqlite3.Row
+    # WAL: leitores (followup, export) não bloqueiam o dispatch gravando
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    return con
+
+
+def _ensure_schema(con: sqlite3.Connection):
+    cols = ", ".join(f"{h} TEXT NOT NULL DEFAULT ''" for h in DEFAULT_HEADERS)
+    con.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols})")
+    for name, expr in _INDEXES.items():
+        con.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE} ({expr})")
+    con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    # status é gravado sempre em maiúsculas, para as consultas compararem direto pelo
+    # índice (month_ref, status); bancos de antes disso são normalizados uma vez
+    if con.execute("SELECT 1 FROM meta WHERE key = 'status_upper'").fetchone() is None:
+        con.execute(f"UPDATE {TABLE} SET status = UPPER(TRIM(status)) WHERE status != UPPER(TRIM(status))")
+        con.execute("INSERT INTO meta (key, value) VALUES ('status_upper', ?)",
+                    (f"{datetime.now():%Y-%m-%d %H:%M:%S}",))
+    con.commit()
+
+
+def _status(value) -> str:
+    return str(value or "").strip().upper()
+
+
+def _params(row: dict) -> tuple:
+    values = {h: "" if row.get(h) is None else str(row.get(h)) for h in DEFAULT_HEADERS}
+    values["status"] = _status(values["status"])
+    return tuple(values[h] for h in DEFAULT_HEADERS)
+
+
+_INSERT = (
+    f"INSERT INTO {TABLE} ({', '.join(DEFAULT_HEADERS)}) "
+    f"VALUES ({', '.join('?' for _ in DEFAULT_HEADERS)})"
+)
+
+
+class SqliteWriter:
+    """Sessão de escrita: inserts em transação, commit a cada N linhas ou T segundos."""
+
+    def __init__(self, con: sqlite3.Connection, flush_every: int = 50, flush_interval_sec: float = 30.0):
+        self.con = con
+        self.flush_every = max(1, int(flush_every))
+        self.flush_interval_sec = float(flush_interval_sec)
+        # o SQLite já é durável por commit: não há journal para reaplicar
+        self.replayed = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        self._last_flush = time.monotonic()
+        return self
+
+    def append(self, row: dict):
+        with metrics.timer("history_append"):
+            self.con.execute(_INSERT, _params(row))
+        self._pending += 1
+        if (self._pending >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval_sec):
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with metrics.timer("history_flush"):
+                self.con.commit()
+            self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+
+class SqliteHistory:
+    """Backend de histórico em SQLite; a planilha vira formato de exportação."""
+
+    backend = "sqlite"
+
+    def __init__(self, db_path: str, import_xlsx: str | None = None,
+                 sheet_name: str = "Performance_Audit_History",
+                 flush_every: int = 50, flush_interval_sec: float = 30.0):
+        self.db_path = Path(db_path)
+        self.sheet_name = sheet_name
+        self.flush_every = flush_every
+        self.flush_interval_sec = flush_interval_sec
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.con = _connect(self.db_path)
+        _ensure_schema(self.con)
+
+        self.imported = 0
+        if import_xlsx and self._meta("imported_from_xlsx") is None:
+            self.imported = self.import_xlsx(import_xlsx, sheet_name)
+
+    def _meta(self, key: str) -> str | None:
+        row = self.con.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def import_xlsx(self, history_xlsx: str, sheet_name: str) -> int:
+        """
+        Importa a planilha de histórico existente uma única vez.
+
+        A marca fica gravada mesmo sem planilha: a partir da primeira abertura o
+        banco é a fonte, e uma planilha que apareça depois (o `export-history`
+        grava em `paths.history_xlsx`) nunca é reimportada.
+        """
+        if self._meta("imported_from_xlsx") is not None:
+            return 0
+
+        n = 0
+        p = Path(history_xlsx)
+        with self.con:
+            if p.exists():
+                for row in iter_history_rows(history_xlsx, sheet_name):
+                    self.con.execute(_INSERT, _params(row))
+                    n += 1
+            self.con.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                ("imported_from_xlsx", f"{p.resolve() if p.exists() else 'sem planilha'} | {n} linhas | "
+                                       f"{datetime.now():%Y-%m-%d %H:%M:%S}"),
+            )
+        return n
+
+    def recover(self) -> int:
+        return 0
+
+    def writer(self) -> SqliteWriter:
+        return SqliteWriter(self.con, flush_every=self.flush_every, flush_interval_sec=self.flush_interval_sec)
+
+    def iter_rows(self, month_ref: str = "", statuses=None, skip_months=()):
+        sql = f"SELECT {', '.join(DEFAULT_HEADERS)} FROM {TABLE}"
+        where, params = [], []
+        if month_ref:
+            where.append("month_ref = ?")
+            params.append(month_ref)
+        if skip_months:
+            skip = sorted(skip_months)
+            where.append(f"month_ref NOT IN ({', '.join('?' for _ in skip)})")
+            params.extend(skip)
+        if statuses:
+            where.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(_status(s) for s in statuses)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id"
+
+        for r in self.con.execute(sql, params):
+            yield dict(r)
+
+    def sent_keys(self, month_ref: str, statuses=SENT_STATUSES) -> set:
+        # uma consulta pelo índice (month_ref, status)
+        sql = (f"SELECT DISTINCT month_ref, cod_cliente, cod_assessor FROM {TABLE} "
+               f"WHERE month_ref = ? AND status IN ({', '.join('?' for _ in statuses)})")
+        params = [month_ref, *(_status(s) for s in statuses)]
+        with metrics.timer("history_sent_keys"):
+            return {sent_key(*r) for r in self.con.execute(sql, params)}
+
+    def update_statuses(self, updates: dict, statuses=OPEN_STATUSES) -> list:
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # só as linhas em aberto do token mudam (ver history_store.update_statuses)
+        where, extra = "token = ?", []
+        if statuses:
+            where += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            extra = [_status(s) for s in statuses]
+        not_found = []
+        with metrics.timer("history_update"), self.con:
+            for token, (new_status, notes) in updates.items():
+                if notes:
+                    cur = self.con.execute(
+                        f"UPDATE {TABLE} SET status = ?, last_update_at = ?, notes = ? WHERE {where}",
+                        (_status(new_status), now, notes, str(token).strip(), *extra),
+                    )
+                else:
+                    cur = self.con.execute(
+                        f"UPDATE {TABLE} SET status = ?, last_update_at = ? WHERE {where}",
+                        (_status(new_status), now, str(token).strip(), *extra),
+                    )
+                if cur.rowcount == 0:
+                    not_found.append(token)
+        return not_found
+
+    def status_counts(self, month_ref: str) -> dict:
+        """{status: {cod_assessor: linhas}} do mês: um GROUP BY pelo índice (month_ref, status)."""
+        out = {}
+        sql = (f"SELECT status, cod_assessor, COUNT(*) FROM {TABLE} "
+               f"WHERE month_ref = ? GROUP BY status, cod_assessor")
+        for status, assessor, n in self.con.execute(sql, (month_ref,)):
+            out.setdefault(status or "", {})[assessor or ""] = n
+        return out
+
+    def export_xlsx(self, out_xlsx: str, sheet_name: str | None = None) -> int:
+        return export_rows_xlsx(self.iter_rows(), out_xlsx, sheet_name or self.sheet_name)
+
+    def close(self):
+        self.con.close()
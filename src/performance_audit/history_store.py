@@ -1,8 +1,19 @@
 
+import json
+import os
+import time
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
-from openpyxl import Workbook, load_workbook
-from openpyxl.worksheet.worksheet import Worksheet
+from typing import TYPE_CHECKING
+
+from . import metrics
+from . import status_index
+
+# openpyxl só é importado ao abrir a planilha: o subcomando status e o
+# backend sqlite não pagam esse custo na inicialização
+if TYPE_CHECKING:
+    from openpyxl.worksheet.worksheet import Worksheet
 
 DEFAULT_HEADERS = [
     "datetime_sent",
@@ -23,8 +34,92 @@ DEFAULT_HEADERS = [
     "notes"
 ]
 
+# linhas ainda em aberto no follow-up: são as únicas que update_statuses altera
+OPEN_STATUSES = ("ENVIADO", "COBRADO")
+
+
+# espera máxima pela trava do histórico (um save de planilha grande leva alguns segundos)
+LOCK_TIMEOUT_SEC = 120.0
+
+
+class FileLock:
+    """
+    Trava exclusiva entre processos sobre um arquivo `.lock`.
+
+    Usa msvcrt.locking no Windows e fcntl.flock nos demais: o sistema operacional
+    solta a trava se o processo morrer, então não sobra lock órfão. Também vale
+    entre threads do mesmo processo (cada FileLock abre o arquivo de novo).
+    """
+
+    def __init__(self, path, timeout: float = LOCK_TIMEOUT_SEC):
+        self.path = Path(path)
+        self.timeout = float(timeout)
+        self._fd = None
+
+    def _try_lock(self) -> bool:
+        try:
+            if os.name == "nt":
+                import msvcrt
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def acquire(self, blocking: bool = True) -> bool:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT)
+        deadline = time.monotonic() + self.timeout
+        while not self._try_lock():
+            if not blocking or time.monotonic() >= deadline:
+                os.close(self._fd)
+                self._fd = None
+                if not blocking:
+                    return False
+                raise RuntimeError(f"Histórico em uso por outro processo há mais de {self.timeout:.0f}s: {self.path}")
+            time.sleep(0.05)
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
 
-def _get_or_create_sheet(wb, sheet_name: str) -> Worksheet:
+
+def history_lock(history_xlsx: str) -> FileLock:
+    """Trava de todo ler-alterar-salvar da planilha (sessão de escrita, follow-up, replay do journal)."""
+    p = Path(history_xlsx)
+    return FileLock(p.with_name(p.name + ".lock"))
+
+
+def journal_lock(history_xlsx: str) -> FileLock:
+    """Fica com a sessão de escrita enquanto ela existir: o journal de uma sessão viva não é reaplicado."""
+    jp = journal_path(history_xlsx)
+    return FileLock(jp.with_name(jp.name + ".lock"))
+
+
+def _get_or_create_sheet(wb, sheet_name: str) -> "Worksheet":
     if sheet_name in wb.sheetnames:
         ws = wb[sheet_name]
         # se a aba existir mas estiver vazia, garante header
@@ -45,49 +140,257 @@ def _get_or_create_sheet(wb, sheet_name: str) -> Worksheet:
     return ws
 
 
+def _open_workbook(p: Path):
+    from openpyxl import Workbook, load_workbook
+
+    if p.exists():
+        return load_workbook(p)
+    wb = Workbook()
+    # remove "Sheet" padrão do openpyxl se existir
+    if "Sheet" in wb.sheetnames and len(wb.sheetnames) == 1:
+        wb.remove(wb["Sheet"])
+    return wb
+
+
+def _row_values(row: dict) -> list:
+    return [row.get(h, "") for h in DEFAULT_HEADERS]
+
+
 def append_row(history_xlsx: str, sheet_name: str, row: dict):
     p = Path(history_xlsx)
     p.parent.mkdir(parents=True, exist_ok=True)
 
-    if p.exists():
-        wb = load_workbook(p)
-    else:
-        wb = Workbook()
-        # remove "Sheet" padrão do openpyxl se existir
-        if "Sheet" in wb.sheetnames and len(wb.sheetnames) == 1:
-            wb.remove(wb["Sheet"])
+    with history_lock(history_xlsx):
+        wb = _open_workbook(p)
+        ws = _get_or_create_sheet(wb, sheet_name)
+        ws.append(_row_values(row))
+        before = status_index.fingerprint(p)
+        wb.save(p)
+        status_index.apply_deltas(p, status_index.count_rows([row]), before)
 
-    ws = _get_or_create_sheet(wb, sheet_name)
 
-    values = [
-        row.get("datetime_sent", ""),
-        row.get("month_ref", ""),
-        row.get("cod_cliente", ""),
-        row.get("nome_cliente", ""),
-        row.get("cod_assessor", ""),
-        row.get("nome_assessor", ""),
-        row.get("to_email", ""),
-        row.get("cc_email", ""),
-        row.get("token", ""),
-        row.get("subject", ""),
-        row.get("entry_id", ""),
-        row.get("conversation_id", ""),
-        row.get("internet_message_id", ""),
-        row.get("status", ""),
-        row.get("last_update_at", ""),
-        row.get("notes", "")
-    ]
-
-    ws.append(values)
-    wb.save(p)
+def journal_path(history_xlsx: str) -> Path:
+    p = Path(history_xlsx)
+    return p.with_name(p.name + ".journal.jsonl")
 
 
-def update_status_by_token(history_xlsx: str, sheet_name: str, token: str, new_status: str, notes: str = ""):
+def _read_journal(jp: Path) -> list:
+    rows = []
+    if not jp.exists():
+        return rows
+    with open(jp, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                # última linha truncada por queda do processo: descarta
+                continue
+    return rows
+
+
+def _replay_into(ws, rows: list) -> int:
+    # o save pode ter acontecido antes de truncar o journal: evita duplicar
+    header = [c.value for c in ws[1]]
+    existing = set()
+    if "token" in header and "cod_cliente" in header:
+        col_token = header.index("token")
+        col_cli = header.index("cod_cliente")
+        for values in ws.iter_rows(min_row=2, values_only=True):
+            existing.add((str(values[col_token] or ""), str(values[col_cli] or "")))
+
+    replayed = 0
+    for row in rows:
+        key = (str(row.get("token", "") or ""), str(row.get("cod_cliente", "") or ""))
+        if key in existing:
+            continue
+        ws.append(_row_values(row))
+        existing.add(key)
+        replayed += 1
+    return replayed
+
+
+def replay_journal(history_xlsx: str, sheet_name: str) -> int:
+    """
+    Reaplica no xlsx as linhas do journal que não chegaram a ser salvas.
+
+    Se uma sessão de escrita ainda estiver de pé (outro dispatch), o journal
+    é dela e fica como está: só o de uma sessão encerrada ou morta é reaplicado.
+    """
+    jp = journal_path(history_xlsx)
+    if not jp.exists():
+        return 0
+    owner = journal_lock(history_xlsx)
+    if not owner.acquire(blocking=False):
+        return 0
+    try:
+        rows = _read_journal(jp)
+        if not rows:
+            return 0
+
+        p = Path(history_xlsx)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        with history_lock(history_xlsx):
+            wb = _open_workbook(p)
+            ws = _get_or_create_sheet(wb, sheet_name)
+            replayed = _replay_into(ws, rows)
+            wb.save(p)
+            status_index.invalidate(p)
+        jp.unlink()
+        return replayed
+    finally:
+        owner.release()
+
+
+class HistoryWriter:
+    """
+    Sessão de escrita no histórico: abre o workbook uma vez e salva em lotes.
+
+    Cada linha vai primeiro para um journal JSONL (com fsync) e só sai dele
+    quando o xlsx é salvo. Se o processo cair, a próxima sessão reaplica o
+    journal antes de continuar.
+
+    Cada save acontece sob a trava do histórico; se a planilha mudou no disco
+    desde o último save desta sessão (follow-up rodando ao mesmo tempo), ela é
+    relida e as linhas pendentes são reaplicadas antes de salvar, para não
+    sobrescrever a mudança do outro processo.
+    """
+
+    def __init__(self, history_xlsx: str, sheet_name: str,
+                 flush_every: int = 50, flush_interval_sec: float = 30.0):
+        self.path = Path(history_xlsx)
+        self.sheet_name = sheet_name
+        self.flush_every = max(1, int(flush_every))
+        self.flush_interval_sec = float(flush_interval_sec)
+        self.journal_path = journal_path(history_xlsx)
+        self.replayed = 0
+
+        self._wb = None
+        self._ws = None
+        self._journal = None
+        self._owner = None
+        self._saved = None
+        self._rows = []
+        self._pending = 0
+        self._deltas = Counter()
+        self._last_flush = time.monotonic()
+
+    def _load(self):
+        self._wb = _open_workbook(self.path)
+        self._ws = _get_or_create_sheet(self._wb, self.sheet_name)
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # uma sessão por histórico: o journal é exclusivo dela até o __exit__
+        self._owner = journal_lock(str(self.path))
+        self._owner.acquire()
+        try:
+            with history_lock(str(self.path)):
+                self._load()
+                leftover = _read_journal(self.journal_path)
+                if leftover:
+                    self.replayed = _replay_into(self._ws, leftover)
+                    self._wb.save(self.path)
+                    status_index.invalidate(self.path)
+                self._saved = status_index.fingerprint(self.path)
+
+            self._journal = open(self.journal_path, "w", encoding="utf-8")
+        except BaseException:
+            self._owner.release()
+            raise
+        self._last_flush = time.monotonic()
+        return self
+
+    def append(self, row: dict):
+        with metrics.timer("history_append"):
+            self._journal.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+            values = _row_values(row)
+            self._ws.append(values)
+            self._rows.append(values)
+            self._deltas[status_index.row_key(row)] += 1
+            self._pending += 1
+
+        if (self._pending >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval_sec):
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with metrics.timer("history_flush"), history_lock(str(self.path)):
+                before = status_index.fingerprint(self.path)
+                if before != self._saved:
+                    # outro processo salvou a planilha: parte da versão dele
+                    metrics.inc("history_reloads")
+                    self._load()
+                    for values in self._rows:
+                        self._ws.append(values)
+                self._wb.save(self.path)
+                self._saved = status_index.fingerprint(self.path)
+                status_index.apply_deltas(self.path, self._deltas, before)
+                self._deltas.clear()
+                self._rows.clear()
+                # linhas já estão no xlsx: zera o journal
+                self._journal.seek(0)
+                self._journal.truncate()
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.flush()
+        finally:
+            self._journal.close()
+            self._journal = None
+            # journal vazio após flush bem-sucedido: não deixa arquivo solto
+            try:
+                if self.journal_path.stat().st_size == 0:
+                    self.journal_path.unlink()
+            except OSError:
+                pass
+            self._owner.release()
+        return False
+
+
+def _token_row_index(ws, col_token: int) -> dict:
+    # uma única passada na aba: token -> linhas (1-based)
+    index = {}
+    for r, (value,) in enumerate(ws.iter_rows(min_row=2, min_col=col_token, max_col=col_token, values_only=True), start=2):
+        token = str(value or "").strip()
+        if token:
+            index.setdefault(token, []).append(r)
+    return index
+
+
+def update_statuses(history_xlsx: str, sheet_name: str, updates: dict, statuses=OPEN_STATUSES) -> list:
+    """
+    Aplica várias mudanças de status com uma leitura e um único save.
+
+    `updates` é {token: (novo_status, notes)}. Só as linhas do token com status
+    em `statuses` mudam (None = todas): um token repetido em outro envio
+    (reenvio após FALHA, por exemplo) não reescreve linhas já encerradas.
+    Retorna os tokens sem nenhuma dessas linhas no histórico.
+    """
+    if not updates:
+        return []
+
     p = Path(history_xlsx)
     if not p.exists():
         raise FileNotFoundError(f"Histórico não encontrado: {p.resolve()}")
 
-    wb = load_workbook(p)
+    # a sessão de escrita de um dispatch em andamento salva sob a mesma trava
+    with history_lock(history_xlsx):
+        return _update_statuses(p, sheet_name, updates, statuses)
+
+
+def _update_statuses(p: Path, sheet_name: str, updates: dict, statuses) -> list:
+    wb = _open_workbook(p)
     ws = _get_or_create_sheet(wb, sheet_name)
 
     header = [c.value for c in ws[1]]
@@ -99,20 +402,184 @@ def update_status_by_token(history_xlsx: str, sheet_name: str, token: str, new_s
     col_status = header.index("status") + 1
     col_last = header.index("last_update_at") + 1 if "last_update_at" in header else None
     col_notes = header.index("notes") + 1 if "notes" in header else None
+    col_month = header.index("month_ref") + 1 if "month_ref" in header else None
+    col_assessor = header.index("cod_assessor") + 1 if "cod_assessor" in header else None
 
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    index = _token_row_index(ws, col_token)
+    wanted = {s.upper() for s in statuses} if statuses else None
 
-    found = False
-    for r in range(2, ws.max_row + 1):
-        cur_token = str(ws.cell(r, col_token).value or "").strip()
-        if cur_token == token:
+    not_found = []
+    deltas = Counter()
+    for token, (new_status, notes) in updates.items():
+        rows = index.get(str(token).strip(), [])
+        if wanted:
+            rows = [r for r in rows if str(ws.cell(r, col_status).value or "").strip().upper() in wanted]
+        if not rows:
+            not_found.append(token)
+            continue
+        for r in rows:
+            key = status_index.row_key({
+                "month_ref": ws.cell(r, col_month).value if col_month else "",
+                "status": ws.cell(r, col_status).value,
+                "cod_assessor": ws.cell(r, col_assessor).value if col_assessor else "",
+            })
+            deltas[key] -= 1
+            deltas[(key[0], str(new_status).strip().upper(), key[2])] += 1
             ws.cell(r, col_status).value = new_status
             if col_last:
                 ws.cell(r, col_last).value = now
             if notes and col_notes:
                 ws.cell(r, col_notes).value = notes
-            found = True
-            break
+
+    if len(not_found) < len(updates):
+        before = status_index.fingerprint(p)
+        wb.save(p)
+        status_index.apply_deltas(p, deltas, before)
+    return not_found
+
+
+def update_status_by_token(history_xlsx: str, sheet_name: str, token: str, new_status: str, notes: str = ""):
+    return not update_statuses(history_xlsx, sheet_name, {token: (new_status, notes)}, statuses=None)
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+def iter_history_rows(history_xlsx: str, sheet_name: str, skip_months=()):
+    p = Path(history_xlsx)
+    if not p.exists():
+        return
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(p, read_only=True)
+    try:
+        if sheet_name not in wb.sheetnames:
+            raise RuntimeError(f"Aba de histórico não encontrada: {sheet_name}")
+
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header = [str(h or "").strip() for h in next(rows, ())]
+        # o openpyxl lê a linha inteira de qualquer forma; pular aqui só evita montar o dict
+        col_month = header.index("month_ref") if skip_months and "month_ref" in header else None
+        for values in rows:
+            if not any(v is not None for v in values):
+                continue
+            if col_month is not None and _cell_text(values[col_month]).strip() in skip_months:
+                continue
+            yield {h: _cell_text(v) for h, v in zip(header, values) if h}
+    finally:
+        wb.close()
+
+
+def export_rows_xlsx(rows, out_xlsx: str, sheet_name: str) -> int:
+    """Grava as linhas (dicts) numa planilha nova no layout DEFAULT_HEADERS."""
+    from openpyxl import Workbook
+
+    p = Path(out_xlsx)
+    p.parent.mkdir(parents=True, exist_ok=True)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    ws.freeze_panes = "A2"
+    ws.append(DEFAULT_HEADERS)
+
+    n = 0
+    for row in rows:
+        ws.append(_row_values(row))
+        n += 1
 
     wb.save(p)
-    return found
+    return n
+
+
+# status que indicam e-mail já enviado (ou rascunho já criado) para o cliente no mês
+SENT_STATUSES = ("ENVIADO", "PREPARADO", "COBRADO", "RESPONDIDO")
+
+
+def sent_key(month_ref, cod_cliente, cod_assessor) -> tuple:
+    return str(month_ref).strip(), str(cod_cliente).strip(), str(cod_assessor).strip()
+
+
+class XlsxHistory:
+    """Backend de histórico sobre a planilha (comportamento original)."""
+
+    backend = "xlsx"
+
+    def __init__(self, history_xlsx: str, sheet_name: str,
+                 flush_every: int = 50, flush_interval_sec: float = 30.0):
+        self.history_xlsx = history_xlsx
+        self.sheet_name = sheet_name
+        self.flush_every = flush_every
+        self.flush_interval_sec = flush_interval_sec
+
+    def recover(self) -> int:
+        return replay_journal(self.history_xlsx, self.sheet_name)
+
+    def writer(self) -> HistoryWriter:
+        return HistoryWriter(self.history_xlsx, self.sheet_name,
+                             flush_every=self.flush_every, flush_interval_sec=self.flush_interval_sec)
+
+    def iter_rows(self, month_ref: str = "", statuses=None, skip_months=()):
+        wanted = {s.upper() for s in statuses} if statuses else None
+        for row in iter_history_rows(self.history_xlsx, self.sheet_name, skip_months=set(skip_months)):
+            if month_ref and row.get("month_ref", "").strip() != month_ref:
+                continue
+            if wanted and row.get("status", "").strip().upper() not in wanted:
+                continue
+            yield row
+
+    def sent_keys(self, month_ref: str, statuses=SENT_STATUSES) -> set:
+        """Chaves (month_ref, cod_cliente, cod_assessor) já enviadas: uma leitura da planilha."""
+        with metrics.timer("history_sent_keys"):
+            return {sent_key(r.get("month_ref", ""), r.get("cod_cliente", ""), r.get("cod_assessor", ""))
+                    for r in self.iter_rows(month_ref, statuses)}
+
+    def update_statuses(self, updates: dict, statuses=OPEN_STATUSES) -> list:
+        with metrics.timer("history_update"):
+            return update_statuses(self.history_xlsx, self.sheet_name, updates, statuses)
+
+    def status_counts(self, month_ref: str) -> dict:
+        """{status: {cod_assessor: linhas}} do mês, pelo índice lateral (reconstruído se estiver defasado)."""
+        if not Path(self.history_xlsx).exists():
+            return {}
+        counts = status_index.load_counts(self.history_xlsx)
+        if counts is None:
+            counts = status_index.save_counts(self.history_xlsx,
+                                              status_index.count_rows(iter_history_rows(self.history_xlsx,
+                                                                                        self.sheet_name)))
+        return counts.get(month_ref, {})
+
+    def export_xlsx(self, out_xlsx: str, sheet_name: str | None = None) -> int:
+        return export_rows_xlsx(self.iter_rows(), out_xlsx, sheet_name or self.sheet_name)
+
+    def close(self):
+        pass
+
+
+def open_history(cfg):
+    """Escolhe o backend de histórico conforme `history.backend` (xlsx | sqlite)."""
+    history_xlsx = cfg.get("paths.history_xlsx")
+    sheet_name = cfg.get("history.sheet_name", "Performance_Audit_History")
+    flush_every = int(cfg.get("history.flush_every_rows", 50))
+    flush_interval = float(cfg.get("history.flush_interval_sec", 30))
+
+    backend = str(cfg.get("history.backend", "xlsx")).lower()
+    if backend == "xlsx":
+        return XlsxHistory(history_xlsx, sheet_name,
+                           flush_every=flush_every, flush_interval_sec=flush_interval)
+    if backend == "sqlite":
+        from .history_sqlite import SqliteHistory
+        return SqliteHistory(
+            cfg.get("paths.history_sqlite", "data/history_performance.sqlite"),
+            import_xlsx=history_xlsx,
+            sheet_name=sheet_name,
+            flush_every=flush_every,
+            flush_interval_sec=flush_interval,
+        )
+    raise ValueError(f"history.backend inválido: {backend} (use xlsx ou sqlite)")
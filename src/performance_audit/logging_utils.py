@@ -1,29 +1,144 @@
+import atexit
+import json
+import queue
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
+_STOP = object()
+
 
 class Logger:
-    def __init__(self, log_path: str | None = None):
+    """
+    Log em texto (console + arquivo) com sink JSONL opcional para análise.
+
+    Os arquivos ficam abertos em modo append com buffer. Com `background=True`
+    a escrita vai para uma thread alimentada por fila, e o loop de envio nunca
+    espera por disco ou console; a thread descarrega os arquivos a cada
+    `flush_interval` segundos ou `flush_bytes` escritos, para que uma queda do
+    processo perca no máximo esse trecho do log.
+    """
+
+    def __init__(self, log_path: str | None = None, jsonl_path: str | None = None,
+                 background: bool = False, buffer_size: int = 64 * 1024,
+                 flush_interval: float = 1.0, flush_bytes: int = 16 * 1024):
         self.log_path = Path(log_path) if log_path else None
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+
+        self._fh = None
+        self._jsonl = None
         if self.log_path:
             self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.log_path, "a", encoding="utf-8", buffering=buffer_size)
+        if self.jsonl_path:
+            self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+            self._jsonl = open(self.jsonl_path, "a", encoding="utf-8", buffering=buffer_size)
+
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self._queue = None
+        self._thread = None
+        if background:
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._drain, name="logger-writer", daemon=True)
+            self._thread.start()
+
+        self._closed = False
+        atexit.register(self.close)
+
+    def info(self, msg: str, **fields):
+        self._write("INFO", msg, fields)
 
-    def info(self, msg: str):
-        self._write("[INFO] " + msg)
+    def warn(self, msg: str, **fields):
+        self._write("WARN", msg, fields)
 
-    def warn(self, msg: str):
-        self._write("[WARN] " + msg)
+    def error(self, msg: str, **fields):
+        self._write("ERRO", msg, fields)
 
-    def error(self, msg: str):
-        self._write("[ERRO] " + msg)
+    def _write(self, level: str, msg: str, fields: dict):
+        now = datetime.now()
+        line = f"{now:%Y-%m-%d %H:%M:%S} [{level}] {msg}"
+        record = None
+        if self._jsonl:
+            record = {"ts": now.isoformat(timespec="milliseconds"), "level": level, "msg": msg}
+            record.update(fields)
 
-    def _write(self, msg: str):
-        line = f"{datetime.now():%Y-%m-%d %H:%M:%S} {msg}"
+        if self._queue is not None and not self._closed:
+            self._queue.put((line, record))
+        else:
+            self._emit(line, record)
+
+    def _emit(self, line: str, record: dict | None) -> int:
         print(line)
-        if self.log_path:
+        written = 0
+        try:
+            if self._fh:
+                written += self._fh.write(line + "\n")
+            if self._jsonl and record is not None:
+                written += self._jsonl.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except Exception:
+            pass
+        return written
+
+    def _drain(self):
+        pending = 0
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, last_flush + self.flush_interval - time.monotonic()) if pending else None
             try:
-                existing = self.log_path.read_text(encoding="utf-8") if self.log_path.exists() else ""
-                self.log_path.write_text(existing + line + "\n", encoding="utf-8")
-            except Exception:
-                pass
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                try:
+                    if item is _STOP:
+                        break
+                    pending += self._emit(*item)
+                finally:
+                    self._queue.task_done()
+            # descarrega o que está no buffer por tempo ou volume, sem esperar o close()
+            if pending and (pending >= self.flush_bytes
+                            or time.monotonic() - last_flush >= self.flush_interval):
+                self._flush_files()
+                pending = 0
+                last_flush = time.monotonic()
+
+    def _flush_files(self):
+        for f in (self._fh, self._jsonl):
+            if f:
+                try:
+                    f.flush()
+                except Exception:
+                    pass
+
+    def flush(self):
+        # com a thread de escrita, espera a fila esvaziar antes de descarregar os arquivos
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+        self._flush_files()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+        self.flush()
+        for f in (self._fh, self._jsonl):
+            if f:
+                try:
+                    f.close()
+                except Exception:
+                    pass
+        self._fh = None
+        self._jsonl = None
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,357 @@
+import mmap
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from email.header import decode_header, make_header
+from email.parser import BytesHeaderParser
+from email.utils import parseaddr, parsedate_to_datetime
+from glob import glob
+from pathlib import Path
+
+from . import metrics
+from .followup import is_auto_submitted
+from .token_utils import CHECK_LEN, KEY_LEN, month_prefix, parse_token
+
+# Backend de arquivos do follow-up: exportações .eml, mbox e Maildir.
+#
+# Cada arquivo é mapeado em memória e varrido por um único regex em bytes que
+# acha, de uma vez, qualquer token em aberto e qualquer Message-ID enviado
+# (citado no In-Reply-To/References da resposta). Só as mensagens com
+# ocorrência têm os cabeçalhos interpretados; o resto nunca vira objeto Python.
+# Os arquivos (e pedaços de mbox grandes) são distribuídos num pool de processos.
+
+DEFAULT_CHUNK_MB = 64
+
+_MBOX_SEP = b"\nFrom "
+_HEADER_END = re.compile(rb"\r?\n\r?\n")
+_MSG_ID_RX = re.compile(r"<([^<>\s]+)>")
+# Date vem com fuso, o primeiro envio em hora local: mesmo recuo do Restrict do Outlook
+_DATE_MARGIN = timedelta(hours=14)
+# bytes do início do arquivo usados para reconhecer um mbox que só cresceu
+_HEAD_BYTES = 4096
+# arquivos de índice de clientes de e-mail que ficam junto das exportações
+_SKIP_SUFFIXES = {".msf", ".idx", ".db", ".json"}
+
+# contexto de cada processo do pool (montado uma vez no initializer)
+_CTX = {}
+
+
+def export_sources(cfg) -> list:
+    """Itens de `followup.export_paths`: arquivo, diretório (Maildir, .eml, mbox) ou glob."""
+    sources = cfg.get("followup.export_paths", None) or []
+    if isinstance(sources, str):
+        sources = [sources]
+    return [str(s) for s in sources if str(s or "").strip()]
+
+
+def _skip(path: Path) -> bool:
+    if path.name.startswith(".") or path.suffix.lower() in _SKIP_SUFFIXES:
+        return True
+    # Maildir: tmp/ guarda mensagens ainda em entrega
+    return path.parent.name == "tmp" and (path.parent.parent / "cur").is_dir()
+
+
+def export_files(source: str) -> list:
+    p = Path(source)
+    if p.is_file():
+        return [p]
+    if p.is_dir():
+        return sorted(f for f in p.rglob("*") if f.is_file() and not _skip(f))
+    return sorted(Path(f) for f in glob(source, recursive=True) if Path(f).is_file() and not _skip(Path(f)))
+
+
+def build_patterns(tokens, message_ids) -> tuple:
+    """
+    (regex dos tokens, regex dos Message-IDs), cada um em bytes e cobrindo todas as chaves.
+
+    Tokens no formato atual viram prefixos literais do mês (`PERF-202501-`)
+    seguidos do formato da chave, para o motor de regex saltar direto para
+    os candidatos; tokens antigos entram como alternância literal. Message-IDs
+    entram pelos domínios (`<...@dominio>`); o ID exato é conferido num dict.
+    Os dois ficam separados: numa alternância só o `re` perde a busca pelo
+    prefixo literal e a varredura fica dezenas de vezes mais lenta.
+    """
+    tok_rx = mid_rx = None
+    tokens = sorted({t for t in tokens if t}, key=len, reverse=True)
+    infos = [parse_token(t) for t in tokens]
+    if tokens and all(infos):
+        prefixes = sorted({month_prefix(i["month_ref"], i["prefix"]) for i in infos})
+        tok_rx = re.compile(rb"(?:%s)[A-Z2-7]{%d}-[A-Z2-7]{%d}"
+                            % (b"|".join(re.escape(p.encode("ascii")) for p in prefixes), KEY_LEN, CHECK_LEN))
+    elif tokens:
+        tok_rx = re.compile(b"|".join(re.escape(t.encode("utf-8")) for t in tokens))
+    domains = sorted({mid.rpartition("@")[2] for mid in message_ids if "@" in mid})
+    if domains:
+        mid_rx = re.compile(rb"<([^<>\s@]+@(?:%s))>" % b"|".join(re.escape(d.encode("utf-8")) for d in domains))
+    return tok_rx, mid_rx
+
+
+def _init_worker(tokens, reply_ids: dict, own_addrs, first_cut):
+    tok_rx, mid_rx = build_patterns(tokens, reply_ids)
+    _CTX.clear()
+    _CTX.update(
+        tok_rx=tok_rx,
+        mid_rx=mid_rx,
+        tokens=frozenset(tokens),
+        # ID ambíguo (None) fica de fora: decide pelo token no texto
+        reply_ids=reply_ids,
+        own_addrs=frozenset(a.lower() for a in own_addrs if a),
+        first_cut=first_cut,
+    )
+
+
+def _received(value: str) -> datetime | None:
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+
+def _tokens_in(data: bytes) -> list:
+    rx = _CTX["tok_rx"]
+    if rx is None:
+        return []
+    found = (m.group(0).decode("utf-8", "replace") for m in rx.finditer(data))
+    return list(dict.fromkeys(t for t in found if t in _CTX["tokens"]))
+
+
+def _decode(value) -> str:
+    # Subject com encoded-words (=?utf-8?q?...?=) volta como texto
+    try:
+        return str(make_header(decode_header(str(value or ""))))
+    except Exception:
+        return str(value or "")
+
+
+def _read_message(mm, msg_start: int, msg_end: int, is_mbox: bool, body_tokens: list, path: str) -> dict | None:
+    """Interpreta só os cabeçalhos da mensagem e decide o casamento como o scan_mailbox do Outlook."""
+    hdr_start = mm.find(b"\n", msg_start, msg_end) + 1 if is_mbox else msg_start
+    he = _HEADER_END.search(mm, hdr_start, msg_end)
+    hdr_end, body_start = (he.start(), he.end()) if he else (msg_end, msg_end)
+    headers = BytesHeaderParser().parsebytes(mm[hdr_start:hdr_end])
+
+    def header(name: str) -> str:
+        return str(headers.get(name, "") or "")
+
+    reply_ids = _CTX["reply_ids"]
+    # mensagem nossa (diário/journal também guarda o que foi enviado)
+    own = _MSG_ID_RX.findall(header("Message-ID"))
+    if (own and own[0] in reply_ids) or parseaddr(header("From"))[1].lower() in _CTX["own_addrs"]:
+        return None
+    received = _received(header("Date"))
+    if _CTX["first_cut"] and received and received < _CTX["first_cut"]:
+        return None
+    # ausência temporária e NDR citam o original (In-Reply-To, token no corpo) mas não são resposta
+    if is_auto_submitted(header("Auto-Submitted").split(";")[0]) or headers.get_content_type() == "multipart/report":
+        return None
+
+    found, how = [], ""
+    for mid in _MSG_ID_RX.findall(header("In-Reply-To")) + _MSG_ID_RX.findall(header("References"))[::-1]:
+        token = reply_ids.get(mid)
+        if token and token in _CTX["tokens"]:
+            found, how = [token], "in_reply_to"
+            break
+    subject = _decode(headers.get("Subject", ""))
+    if not found:
+        found, how = _tokens_in(subject.encode("utf-8")), "token_assunto"
+    if not found:
+        found, how = list(dict.fromkeys(t for pos, t in body_tokens if pos >= body_start)), "token_corpo"
+    if not found:
+        return None
+    return {
+        "tokens": found,
+        "hit": {
+            "entry_id": f"{path}:{msg_start}",
+            "subject": subject,
+            "received_time": received.strftime("%Y-%m-%d %H:%M:%S") if received else "",
+            "matched_by": how,
+        },
+    }
+
+
+def scan_range(path: str, start: int, end: int) -> dict:
+    """Varre [start, end) de um arquivo (limites em fronteira de mensagem); roda no processo do pool."""
+    out = {"path": path, "start": start, "hits": [], "bytes": 0, "candidates": 0, "parsed": 0}
+    tok_rx, mid_rx = _CTX["tok_rx"], _CTX["mid_rx"]
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        end = min(end, size)
+        if end <= start:
+            return out
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            is_mbox = mm[:5] == b"From "
+            by_message = {}
+
+            def candidate(pos: int) -> list:
+                out["candidates"] += 1
+                msg_start = mm.rfind(_MBOX_SEP, start, pos) + 1 if is_mbox else 0
+                return by_message.setdefault(max(msg_start, start), [])
+
+            if tok_rx is not None:
+                for m in tok_rx.finditer(mm, start, end):
+                    token = m.group(0).decode("utf-8", "replace")
+                    if token in _CTX["tokens"]:
+                        candidate(m.start()).append((m.start(), token))
+            if mid_rx is not None:
+                for m in mid_rx.finditer(mm, start, end):
+                    if m.group(1).decode("utf-8", "replace") in _CTX["reply_ids"]:
+                        candidate(m.start())
+
+            for msg_start in sorted(by_message):
+                msg_end = end
+                if is_mbox:
+                    nxt = mm.find(_MBOX_SEP, msg_start, end)
+                    msg_end = nxt + 1 if nxt >= 0 else end
+                out["parsed"] += 1
+                res = _read_message(mm, msg_start, msg_end, is_mbox, by_message[msg_start], path)
+                if res:
+                    out["hits"].append((msg_start, res["tokens"], res["hit"]))
+    out["bytes"] = end - start
+    return out
+
+
+def scan_batch(ranges: list) -> list:
+    """Vários pedaços numa tarefa do pool: Maildir/pastas de .eml têm milhares de arquivos pequenos."""
+    return [scan_range(path, start, end) for path, start, end in ranges]
+
+
+def _batches(tasks: list, chunk: int) -> list:
+    """Agrupa os pedaços em lotes de até `chunk` bytes, maiores primeiro."""
+    batches, cur, size = [], [], 0
+    for k in sorted(range(len(tasks)), key=lambda k: tasks[k][2] - tasks[k][3]):
+        cur.append(k)
+        size += tasks[k][3] - tasks[k][2]
+        if size >= chunk:
+            batches.append(cur)
+            cur, size = [], 0
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+def _file_plan(path: Path, prev: dict | None, chunk: int, full_rescan: bool) -> tuple:
+    """([(início, fim), ...], estado do arquivo) — só o que mudou desde a última varredura."""
+    st = path.stat()
+    if prev and not full_rescan and prev.get("size") == st.st_size and prev.get("mtime_ns") == st.st_mtime_ns:
+        return [], prev
+    entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "resume_at": 0, "head_crc": 0}
+    if st.st_size == 0:
+        return [], entry
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = st.st_size
+        is_mbox = mm[:5] == b"From "
+        entry["head_crc"] = zlib.crc32(mm[:_HEAD_BYTES])
+        if is_mbox:
+            # próxima execução recomeça da última mensagem (pode ter sido gravada pela metade)
+            entry["resume_at"] = mm.rfind(_MBOX_SEP, 0, size) + 1
+
+        start = 0
+        if prev and not full_rescan:
+            # mbox que só recebeu mensagens no fim: maior que antes e com o mesmo começo
+            prev_size = int(prev.get("size", 0))
+            if is_mbox and size > prev_size and zlib.crc32(mm[:min(_HEAD_BYTES, prev_size)]) == prev.get("head_crc"):
+                start = int(prev.get("resume_at", 0))
+
+        if not is_mbox or size - start <= chunk:
+            return [(start, size)], entry
+        ranges = []
+        a = start
+        while a < size:
+            nxt = mm.find(_MBOX_SEP, a + chunk) if a + chunk < size else -1
+            if nxt < 0:
+                ranges.append((a, size))
+                break
+            ranges.append((a, nxt + 1))
+            a = nxt + 1
+        return ranges, entry
+
+
+def scan_exports(cfg, logger, open_tokens, reply_index, first_sent: datetime | None, state: dict,
+                 full_rescan: bool = False) -> list:
+    """
+    Follow-up sobre exportações em `followup.export_paths`, no mesmo formato de
+    resultado da varredura das pastas do Outlook: um item por caminho, com
+    {token: dados da mensagem} e o estado a gravar. Arquivos sem mudança desde
+    a última execução são pulados; mbox que só cresceu é lido a partir da
+    última mensagem já vista.
+    """
+    sources = export_sources(cfg)
+    if not sources:
+        raise ValueError("followup.backend=files precisa de followup.export_paths.")
+    chunk = max(1, int(float(cfg.get("followup.export_chunk_mb", DEFAULT_CHUNK_MB)) * 1024 * 1024))
+    workers = max(1, int(cfg.get("followup.export_workers", 0) or os.cpu_count() or 1))
+    own_addrs = {cfg.get("outlook.from_smtp") or "", cfg.get("smtp.from_addr") or ""}
+    tokens = list(open_tokens)
+    if not tokens:
+        return [{"folder": source, "matches": {}, "state": state.get(source) or {"files": {}},
+                 "summary": f"{source} | nenhum token em aberto"} for source in sources]
+    first_cut = first_sent - _DATE_MARGIN if first_sent else None
+
+    tasks = []
+    plans = []
+    with metrics.timer("export_plan"):
+        for i, source in enumerate(sources):
+            prev_files = (state.get(source) or {}).get("files", {})
+            files = {}
+            for path in export_files(source):
+                key = str(path)
+                ranges, entry = _file_plan(path, prev_files.get(key), chunk, full_rescan)
+                files[key] = entry
+                tasks.extend((i, key, a, b) for a, b in ranges)
+            if not files:
+                logger.warn(f"Follow-up: nenhum arquivo em {source}.")
+            plans.append({"source": source, "files": files})
+
+    init_args = (tokens, dict(reply_index.by_message_id), own_addrs, first_cut)
+    n_files = len({(i, key) for i, key, _, _ in tasks})
+    batches = _batches(tasks, chunk)
+    workers = min(workers, len(batches)) or 1
+    logger.info(f"Follow-up (arquivos): {len(sources)} caminho(s) | {n_files} arquivo(s) a ler em "
+                f"{len(tasks)} pedaço(s) | {workers} processo(s){' | varredura completa' if full_rescan else ''}")
+
+    outputs = [None] * len(tasks)
+    with metrics.timer("export_scan"):
+        if workers == 1:
+            _init_worker(*init_args)
+            outputs = [scan_range(key, a, b) for _, key, a, b in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+                # maiores primeiro: o tempo total não fica preso num mbox grande no fim da fila
+                futures = {pool.submit(scan_batch, [tasks[k][1:] for k in batch]): batch for batch in batches}
+                for fut, batch in futures.items():
+                    for k, out in zip(batch, fut.result()):
+                        outputs[k] = out
+
+    per_source = [[] for _ in sources]
+    order = {}
+    for (i, key, _, _), out in zip(tasks, outputs):
+        per_source[i].append(out)
+        order.setdefault(key, len(order))
+        metrics.inc("export_bytes", out["bytes"])
+        metrics.inc("export_candidates", out["candidates"])
+        metrics.inc("export_messages_parsed", out["parsed"])
+
+    results = []
+    for i, plan in enumerate(plans):
+        matches = {}
+        outs = sorted(per_source[i], key=lambda o: (order[o["path"]], o["start"]))
+        for out in outs:
+            for _, found, hit in out["hits"]:
+                for token in found:
+                    if token not in matches:
+                        matches[token] = hit
+                        metrics.inc("replies", matched_by=hit["matched_by"])
+        read = sum(o["bytes"] for o in outs)
+        results.append({
+            "folder": plan["source"],
+            "matches": matches,
+            "state": {"files": plan["files"]},
+            "summary": f"{plan['source']} | {len({o['path'] for o in outs})} arquivo(s) lido(s), "
+                       f"{read / 1048576:.1f} MB | {len(matches)} resposta(s)",
+        })
+    return results
@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _label_str(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    """
+    Tempos por estágio e contadores de uma execução.
+
+    `timer(estágio)` mede um trecho; `inc(nome, **labels)` conta eventos
+    (chamadas COM, retries). Seguro entre threads. No fim da execução o
+    resumo vai para JSON e, opcionalmente, para um textfile do Prometheus.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+            self._counters = {}
+            self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def inc(self, name: str, n: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {k: sorted(v) for k, v in self._samples.items()}
+            counters = dict(self._counters)
+
+        stages = {}
+        for stage, values in samples.items():
+            stages[stage] = {
+                "count": len(values),
+                "total_sec": round(sum(values), 4),
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+
+        flat = {}
+        for (name, labels), n in sorted(counters.items()):
+            flat[name + _label_str(labels)] = n
+        return {"elapsed_sec": round(time.time() - self.started_at, 3), "stages": stages, "counters": flat}
+
+    def write_json(self, path: str, **meta) -> dict:
+        data = dict(meta)
+        data.update(self.summary())
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        return data
+
+    def write_prometheus(self, path: str, prefix: str = "perf_audit", ok: bool = True, **labels):
+        """Textfile para o collector do node_exporter (gravado via rename atômico)."""
+        base = tuple(sorted((k, v) for k, v in labels.items() if v))
+        summ = self.summary()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Tempo por estágio (quantis da execução).",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for stage, st in summ["stages"].items():
+            lb = base + (("stage", stage),)
+            for q, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("1", "max_ms")):
+                lines.append(f"{prefix}_stage_seconds{_label_str(lb + (('quantile', q),))} {st[key] / 1000:.6f}")
+            lines.append(f"{prefix}_stage_seconds_sum{_label_str(lb)} {st['total_sec']:.6f}")
+            lines.append(f"{prefix}_stage_seconds_count{_label_str(lb)} {st['count']}")
+
+        with self._lock:
+            counters = dict(self._counters)
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (n, lbs), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{prefix}_{name}_total{_label_str(base + lbs)} {value}")
+
+        lines.append(f"# TYPE {prefix}_last_run_timestamp_seconds gauge")
+        lines.append(f"{prefix}_last_run_timestamp_seconds{_label_str(base)} {time.time():.0f}")
+        lines.append(f"# TYPE {prefix}_last_run_success gauge")
+        lines.append(f"{prefix}_last_run_success{_label_str(base)} {1 if ok else 0}")
+        lines.append(f"# TYPE {prefix}_last_run_duration_seconds gauge")
+        lines.append(f"{prefix}_last_run_duration_seconds{_label_str(base)} {summ['elapsed_sec']}")
+
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(p.suffix + ".tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, p)
+
+
+# registro da execução corrente: os módulos só chamam timer()/inc()
+METRICS = Metrics()
+timer = METRICS.timer
+inc = METRICS.inc
+observe = METRICS.observe
+
+
+# ===== chamadas COM =====
+# cada leitura, escrita ou método de um objeto do Outlook é uma ida e volta ao
+# processo do Outlook: conta uma em `com_calls` por chamada feita (mesmo que falhe)
+
+def com_get(obj, name: str, call: str, *default):
+    inc("com_calls", call=call)
+    return getattr(obj, name, *default)
+
+
+def com_set(obj, name: str, value, call: str):
+    inc("com_calls", call=call)
+    setattr(obj, name, value)
+
+
+def com_call(call: str, method, *args):
+    inc("com_calls", call=call)
+    return method(*args)
@@ -1,64 +1,134 @@
-import win32com.client as win32
-import pywintypes
+import re
+
+from . import metrics
+
+# win32com/pywintypes são importados só ao criar o cliente: os módulos que
+# importam o OutlookClient (dispatch, followup) carregam sem pywin32
 
 PR_INTERNET_MESSAGE_ID = "http://schemas.microsoft.com/mapi/proptag/0x1035001E"
 
 
 class OutlookClient:
     def __init__(self, from_smtp: str, store_hint: str = "riscos"):
+        import pywintypes
+        import win32com.client as win32
+
         self.from_smtp = from_smtp
         self.store_hint = store_hint
+        self._com_error = pywintypes.com_error
+        self._sent_folder = None
 
-        self.outlook = win32.Dispatch("Outlook.Application")
-        self.ns = self.outlook.GetNamespace("MAPI")
-        self.ns.Logon("", "", False, False)
+        with metrics.timer("outlook_connect"):
+            self.outlook = metrics.com_call("Session", win32.Dispatch, "Outlook.Application")
+            self.ns = metrics.com_call("Session", self.outlook.GetNamespace, "MAPI")
+            metrics.com_call("Session", self.ns.Logon, "", "", False, False)
 
-        self.account = self._find_account(from_smtp)
+            self.account = self._find_account(from_smtp)
         if not self.account:
             raise RuntimeError(f"Conta '{from_smtp}' não encontrada no Outlook clássico.")
 
     def _find_account(self, smtp: str):
         for acc in self.outlook.Session.Accounts:
             try:
-                if str(acc.SmtpAddress).lower() == smtp.lower():
+                if str(metrics.com_get(acc, "SmtpAddress", "Account.SmtpAddress")).lower() == smtp.lower():
                     return acc
             except Exception:
                 continue
         return None
 
-    def get_sent_folder(self):
+    def _find_store(self, hint: str):
         try:
             for i in range(1, self.ns.Stores.Count + 1):
-                store = self.ns.Stores.Item(i)
+                store = metrics.com_call("Store", self.ns.Stores.Item, i)
                 try:
-                    if store and store.DisplayName and self.store_hint.lower() in store.DisplayName.lower():
-                        return store.GetDefaultFolder(5)  # 5 = Sent Items
+                    name = metrics.com_get(store, "DisplayName", "Store") if store else ""
+                    if name and hint.lower() in name.lower():
+                        return store
                 except Exception:
                     continue
-        except pywintypes.com_error:
+        except self._com_error:
             pass
+        return None
 
+    def get_sent_folder(self):
+        # a busca percorre as stores: num cliente reaproveitado (modo serve) é feita uma vez
+        if self._sent_folder is None:
+            self._sent_folder = self._lookup_sent_folder()
+        return self._sent_folder
+
+    def _lookup_sent_folder(self):
+        store = self._find_store(self.store_hint)
+        if store is not None:
+            try:
+                return store.GetDefaultFolder(5)  # 5 = Sent Items
+            except Exception:
+                pass
         return self.ns.GetDefaultFolder(5)
 
+    def get_folder(self, store: str = "", path: str = "Inbox"):
+        """
+        Pasta de uma store (trecho do DisplayName; vazio = store padrão).
+
+        `path` é separado por "/": começa na Inbox da store quando o primeiro
+        nível é "Inbox" (ex.: "Inbox/Equipe A"), senão na raiz (ex.: "Arquivo/2024").
+        """
+        target = None
+        if store:
+            target = self._find_store(store)
+            if target is None:
+                raise RuntimeError(f"Store '{store}' não encontrada no Outlook.")
+
+        parts = [p for p in re.split(r"[\\/]", path or "") if p.strip()]
+        if not parts or parts[0].strip().lower() in ("inbox", "caixa de entrada"):
+            folder = metrics.com_call("Store.folder", (target or self.ns).GetDefaultFolder, 6)
+            parts = parts[1:]
+        else:
+            root = target if target is not None else metrics.com_get(self.ns, "DefaultStore", "Store.folder")
+            folder = metrics.com_call("Store.folder", root.GetRootFolder)
+
+        for name in parts:
+            try:
+                folders = metrics.com_get(folder, "Folders", "Folder.Folders")
+                folder = metrics.com_call("Folder.Folders", folders.Item, name.strip())
+            except Exception:
+                raise RuntimeError(f"Pasta '{path}' não encontrada (store: {store or 'padrão'}).")
+        return folder
+
+    def resolve_address(self, address: str) -> tuple:
+        """(resolvido, nome no catálogo) de um endereço, sem criar e-mail."""
+        try:
+            rcp = metrics.com_call("Recipient.Resolve", self.ns.CreateRecipient, address)
+            metrics.com_call("Recipient.Resolve", rcp.Resolve)
+            if not metrics.com_get(rcp, "Resolved", "Recipient.Resolve"):
+                return False, ""
+        except Exception:
+            return False, ""
+        try:
+            entry = metrics.com_get(rcp, "AddressEntry", "Recipient.AddressEntry")
+            name = str(metrics.com_get(entry, "Name", "Recipient.AddressEntry") or "")
+        except Exception:
+            name = ""
+        return True, name
+
     def create_mail(self):
-        mail = self.outlook.CreateItem(0)
+        mail = metrics.com_call("Application.CreateItem", self.outlook.CreateItem, 0)
         try:
-            mail.SendUsingAccount = self.account
+            metrics.com_set(mail, "SendUsingAccount", self.account, "MailItem.set")
         except Exception:
             pass
         try:
-            mail.SentOnBehalfOfName = self.from_smtp
+            metrics.com_set(mail, "SentOnBehalfOfName", self.from_smtp, "MailItem.set")
         except Exception:
             pass
         return mail
 
     def extract_ids(self, mail_item) -> dict:
-        entry_id = getattr(mail_item, "EntryID", "") or ""
-        conversation_id = getattr(mail_item, "ConversationID", "") or ""
+        entry_id = metrics.com_get(mail_item, "EntryID", "MailItem.ids", "") or ""
+        conversation_id = metrics.com_get(mail_item, "ConversationID", "MailItem.ids", "") or ""
         internet_msg_id = ""
         try:
-            pa = mail_item.PropertyAccessor
-            internet_msg_id = pa.GetProperty(PR_INTERNET_MESSAGE_ID) or ""
+            pa = metrics.com_get(mail_item, "PropertyAccessor", "MailItem.ids")
+            internet_msg_id = metrics.com_call("MailItem.ids", pa.GetProperty, PR_INTERNET_MESSAGE_ID) or ""
         except Exception:
             internet_msg_id = ""
         return {
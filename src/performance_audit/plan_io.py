@@ -0,0 +1,443 @@
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from . import metrics
+from .columns import find_column, header_signature, load_column_map, save_column_map
+from .excel_utils import evict_cache, excel_is_locked, iter_excel_chunks, read_excel_first_sheet, read_excel_header
+from .planning import (
+    GROUPING_ASSESSOR,
+    GROUPING_NONE,
+    PLAN_FILE_COLUMNS,
+    body_sha256,
+    digest_subject,
+    load_html,
+    plan_from_lookup,
+    prof_lookup,
+    render_body,
+    render_digest_body,
+)
+from .token_utils import make_token
+
+
+def resolve_columns(df_aud: pd.DataFrame, df_prof: pd.DataFrame, fuzzy_hits: list | None = None) -> dict:
+    # ===== Colunas AUDITORIA (tolerante) =====
+    c_cod_cli = find_column(df_aud, ["Cod Cliente", "Código Cliente", "Conta", "Codigo Cliente"], fuzzy_hits)
+    c_nome_cli = find_column(df_aud, ["Nome Cliente", "Cliente", "Nome do Cliente"], fuzzy_hits)
+    c_cod_ass = find_column(df_aud, ["Cod Assessor", "Código Assessor", "Codigo Assessor", "Assessor"], fuzzy_hits)
+
+    if not all([c_cod_cli, c_nome_cli, c_cod_ass]):
+        raise RuntimeError(
+            "Colunas obrigatórias não encontradas na auditoria. "
+            f"cod_cliente={c_cod_cli}, nome_cliente={c_nome_cli}, cod_assessor={c_cod_ass}"
+        )
+
+    # ===== Colunas PROFISSIONAIS (tolerante) =====
+    p_cod = find_column(df_prof, ["Cod Assessor", "Código", "Codigo", "Cod Profissional"], fuzzy_hits)
+    p_nome = find_column(df_prof, ["Nome Assessor", "Nome", "Assessor"], fuzzy_hits)
+    p_email = find_column(df_prof, ["E-mail", "Email", "Email Profissional", "E-mail Profissional"], fuzzy_hits)
+
+    p_cod_lider = find_column(df_prof, ["Cod Lider", "Código Líder", "Codigo Lider", "Cod Supervisor"], fuzzy_hits)
+    p_email_lider = find_column(df_prof, ["E-mail Líder", "Email Lider", "E-mail Supervisor", "Email Supervisor"], fuzzy_hits)
+
+    if not all([p_cod, p_nome, p_email]):
+        raise RuntimeError(
+            "Colunas obrigatórias não encontradas na base de profissionais. "
+            f"cod={p_cod}, nome={p_nome}, email={p_email}"
+        )
+
+    return {
+        "c_cod_cli": c_cod_cli, "c_nome_cli": c_nome_cli, "c_cod_ass": c_cod_ass,
+        "p_cod": p_cod, "p_nome": p_nome, "p_email": p_email,
+        "p_cod_lider": p_cod_lider, "p_email_lider": p_email_lider,
+    }
+
+
+def _used_columns(cols: dict, prefix: str) -> list:
+    return list(dict.fromkeys(v for k, v in cols.items() if k.startswith(prefix) and v))
+
+
+def _check_locks(cfg):
+    aud_path = cfg.get("paths.auditoria_xlsx")
+    prof_path = cfg.get("paths.profissionais_xlsx")
+
+    # bloqueio Excel aberto
+    if excel_is_locked(aud_path):
+        raise PermissionError(f"Feche a planilha de auditoria: {aud_path}")
+    if excel_is_locked(prof_path):
+        raise PermissionError(f"Feche a base de profissionais: {prof_path}")
+
+
+def _cache_dir(cfg):
+    cache_dir = cfg.get("cache.dir", "data/.cache") if cfg.get("cache.enabled", True) else None
+    if cache_dir:
+        evict_cache(cache_dir, cfg.get("cache.max_age_days", 30), cfg.get("cache.max_total_mb", 512))
+    return cache_dir
+
+
+def _cached_map_valid(cols: dict, hdr_aud, hdr_prof) -> bool:
+    aud, prof = set(map(str, hdr_aud.columns)), set(map(str, hdr_prof.columns))
+    return all(not v or v in (aud if k.startswith("c_") else prof) for k, v in cols.items())
+
+
+def _file_stamp(path) -> tuple:
+    st = os.stat(path)
+    return str(Path(path).resolve()), st.st_size, st.st_mtime_ns
+
+
+def _prof_header(cfg, prof_cache: dict | None):
+    path = cfg.get("paths.profissionais_xlsx")
+    if prof_cache is None:
+        return read_excel_header(path, None)
+    stamp = _file_stamp(path)
+    cached = prof_cache.get("header")
+    if cached and cached[0] == stamp:
+        return cached[1], cached[2]
+    hdr_prof, sh_prof = read_excel_header(path, None)
+    prof_cache["header"] = (stamp, hdr_prof, sh_prof)
+    return hdr_prof, sh_prof
+
+
+def _resolve_headers(cfg, logger, cache_dir, prof_cache: dict | None = None):
+    hdr_aud, sh_aud = read_excel_header(cfg.get("paths.auditoria_xlsx"), None)
+    hdr_prof, sh_prof = _prof_header(cfg, prof_cache)
+
+    # planilhas mensais costumam repetir o cabeçalho: reaproveita o mapeamento já resolvido
+    map_path = Path(cache_dir) / "columns_map.json" if cache_dir else None
+    signature = header_signature(hdr_aud.columns, hdr_prof.columns)
+    if map_path is not None:
+        cols = load_column_map(map_path, signature)
+        if cols and _cached_map_valid(cols, hdr_aud, hdr_prof):
+            return cols, sh_aud, sh_prof
+
+    fuzzy_hits = []
+    cols = resolve_columns(hdr_aud, hdr_prof, fuzzy_hits)
+    for aliases, col, score in fuzzy_hits:
+        logger.warn(f"Coluna por aproximação: '{col}' para {aliases} (similaridade {score})",
+                    column=col, score=score)
+
+    if map_path is not None:
+        try:
+            save_column_map(map_path, signature, cols)
+        except OSError:
+            pass
+    return cols, sh_aud, sh_prof
+
+
+def _load_prof_lookup(cfg, logger, sh_prof: str, cols: dict, cache_dir, skip_cc_codes,
+                      prof_cache: dict | None = None):
+    """
+    Tabela de profissionais já no formato de `prof_lookup`.
+
+    Com `prof_cache` (modo serve) a tabela fica em memória entre ciclos e só
+    é relida quando a planilha muda (caminho, tamanho, mtime) ou quando o
+    mapeamento de colunas / regras de CC mudam.
+    """
+    path = cfg.get("paths.profissionais_xlsx")
+    key = None
+    if prof_cache is not None:
+        key = (_file_stamp(path), sh_prof, tuple(sorted((k, v) for k, v in cols.items() if k.startswith("p_"))),
+               tuple(sorted(skip_cc_codes)))
+        if prof_cache.get("key") == key:
+            metrics.inc("prof_cache_hits")
+            return prof_cache["lookup"]
+
+    df_prof, _ = read_excel_first_sheet(path, sh_prof, usecols=_used_columns(cols, "p_"), cache_dir=cache_dir)
+    prof = prof_lookup(df_prof, cols, skip_cc_codes)
+    logger.info(f"Profissionais carregada | aba: {sh_prof} | linhas: {len(df_prof)}")
+    if prof_cache is not None:
+        prof_cache.update(key=key, lookup=prof)
+    return prof
+
+
+def load_inputs(cfg, logger, skip_cc_codes=(), prof_cache: dict | None = None):
+    """
+    Lê a auditoria e a tabela de profissionais só com as colunas usadas.
+
+    O cabeçalho é resolvido primeiro; a leitura completa traz apenas as
+    colunas encontradas e passa pelo cache Parquet (`cache.*`). Retorna
+    (auditoria, tabela de `prof_lookup`, colunas).
+    """
+    cache_dir = _cache_dir(cfg)
+    cols, sh_aud, sh_prof = _resolve_headers(cfg, logger, cache_dir, prof_cache)
+
+    t0 = time.perf_counter()
+    df_aud, _ = read_excel_first_sheet(cfg.get("paths.auditoria_xlsx"), sh_aud,
+                                       usecols=_used_columns(cols, "c_"), cache_dir=cache_dir)
+    logger.info(f"Auditoria carregada | aba: {sh_aud} | linhas: {len(df_aud)}")
+    prof = _load_prof_lookup(cfg, logger, sh_prof, cols, cache_dir, skip_cc_codes, prof_cache)
+
+    elapsed = time.perf_counter() - t0
+    metrics.observe("excel_load", elapsed)
+    logger.info(f"Leitura das planilhas: {elapsed:.2f}s")
+    return df_aud, prof, cols
+
+
+def _settings(cfg) -> dict:
+    grouping = str(cfg.get("behavior.grouping", GROUPING_NONE)).lower()
+    if grouping not in (GROUPING_NONE, GROUPING_ASSESSOR):
+        raise ValueError(f"behavior.grouping inválido: {grouping} (use none ou assessor)")
+
+    if grouping == GROUPING_ASSESSOR:
+        body_template = load_html(cfg.get("paths.email_body_digest_html", "templates/email_body_digest.html"))
+    else:
+        body_template = load_html(cfg.get("paths.email_body_html"))
+
+    return {
+        "month_ref": cfg.get("project.month_ref", ""),
+        "subject_tpl": cfg.get("email.subject_template", "Auditoria – Cliente {nome_cliente} – {cod_cliente}"),
+        "digest_subject_tpl": cfg.get(
+            "email.digest_subject_template",
+            "Auditoria de Desempenho – {qtd_clientes} cliente(s) – {nome_assessor}"
+        ),
+        "skip_cc_codes": set(cfg.get("cc_rules.skip_cc_if_leader_in_codes", [])),
+        "sla_days": cfg.get("email.sla_business_days", 3),
+        "grouping": grouping,
+        "body_template": body_template,
+    }
+
+
+def _meta(cfg, st: dict, streaming: bool) -> dict:
+    return {
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "month_ref": st["month_ref"],
+        "auditoria_xlsx": str(cfg.get("paths.auditoria_xlsx")),
+        "profissionais_xlsx": str(cfg.get("paths.profissionais_xlsx")),
+        "template_sha256": body_sha256(st["body_template"]),
+        "grouping": st["grouping"],
+        "streaming": streaming,
+    }
+
+
+def _assign_row_tokens(plan: pd.DataFrame, body_template: str, sla_days, month_ref: str):
+    tokens = []
+    hashes = []
+    for row in plan.itertuples(index=False):
+        if row.skip_reason:
+            tokens.append("")
+            hashes.append("")
+            continue
+        token = make_token(month_ref, row.cod_cliente, row.cod_assessor)
+        tokens.append(token)
+        hashes.append(body_sha256(render_body(body_template, row, sla_days, token)))
+    plan["token"] = tokens
+    plan["body_sha256"] = hashes
+
+
+def prepare_plan(cfg, logger, prof_cache: dict | None = None):
+    """
+    Carrega as planilhas e calcula tudo o que o envio precisa, sem Outlook.
+
+    Retorna (plano, meta): o plano traz token e hash do corpo renderizado
+    (sem assinatura) de cada linha enviável; meta descreve a origem.
+    `prof_cache` mantém a tabela de profissionais entre chamadas (modo serve).
+    """
+    _check_locks(cfg)
+    st = _settings(cfg)
+
+    df_aud, prof, cols = load_inputs(cfg, logger, st["skip_cc_codes"], prof_cache)
+
+    # ===== Planejamento (vetorizado): destinatários, CC, assunto e motivo de pulo =====
+    t_plan = time.perf_counter()
+    plan = plan_from_lookup(df_aud, prof, cols, st["subject_tpl"])
+    del df_aud
+
+    if st["grouping"] == GROUPING_ASSESSOR:
+        _assign_group_tokens(plan, st["body_template"], st["sla_days"], st["digest_subject_tpl"], st["month_ref"])
+    else:
+        _assign_row_tokens(plan, st["body_template"], st["sla_days"], st["month_ref"])
+
+    elapsed = time.perf_counter() - t_plan
+    metrics.observe("plan_build", elapsed)
+    logger.info(f"Plano montado em {elapsed:.2f}s | linhas válidas: {len(plan)}")
+    return plan, _meta(cfg, st, streaming=False)
+
+
+def prepare_plan_chunks(cfg, logger, chunk_rows: int | None = None):
+    """
+    Versão streaming do prepare_plan: a auditoria é lida em blocos (openpyxl read_only)
+    e cada bloco é planejado contra a tabela de profissionais assim que chega.
+
+    Retorna (iterador de blocos do plano, meta). A memória fica limitada pelo
+    tamanho do bloco (`ingest.chunk_rows`), não pelo tamanho da planilha.
+    """
+    _check_locks(cfg)
+    st = _settings(cfg)
+    if st["grouping"] == GROUPING_ASSESSOR:
+        raise ValueError("behavior.grouping=assessor precisa do plano inteiro; desative ingest.streaming.")
+
+    chunk_rows = int(chunk_rows or cfg.get("ingest.chunk_rows", 50_000))
+    cache_dir = _cache_dir(cfg)
+    cols, sh_aud, sh_prof = _resolve_headers(cfg, logger, cache_dir)
+
+    # a base de profissionais é pequena: lida inteira (e cacheada) uma vez
+    prof = _load_prof_lookup(cfg, logger, sh_prof, cols, cache_dir, st["skip_cc_codes"])
+
+    logger.info(f"Auditoria em modo streaming | aba: {sh_aud} | blocos de {chunk_rows} linhas")
+
+    def chunks():
+        n = 0
+        for block in iter_excel_chunks(cfg.get("paths.auditoria_xlsx"), sh_aud,
+                                       usecols=_used_columns(cols, "c_"), chunk_rows=chunk_rows):
+            with metrics.timer("plan_build"):
+                plan = plan_from_lookup(block, prof, cols, st["subject_tpl"])
+                del block
+                _assign_row_tokens(plan, st["body_template"], st["sla_days"], st["month_ref"])
+            n += len(plan)
+            yield plan
+        logger.info(f"Auditoria (streaming) concluída | linhas válidas: {n}")
+
+    return chunks(), _meta(cfg, st, streaming=True)
+
+
+def plan_chunks(cfg, logger):
+    """Plano como sequência de blocos: um só bloco no modo normal, vários no streaming."""
+    if cfg.get("ingest.streaming", False):
+        return prepare_plan_chunks(cfg, logger)
+    plan, meta = prepare_plan(cfg, logger)
+    return [plan], meta
+
+
+def _assign_group_tokens(plan: pd.DataFrame, body_template: str, sla_days, subject_tpl: str, month_ref: str):
+    # um token por (assessor, CC do líder, clientes do grupo); as linhas por cliente ficam
+    # ligadas a ele. Os clientes entram na chave para que outro disparo do mesmo mês
+    # (nova auditoria, só o restante do grupo) não reuse o token de um e-mail anterior.
+    tokens = [""] * len(plan)
+    hashes = [""] * len(plan)
+    subjects = plan["subject"].tolist()
+
+    sendable = plan[plan["skip_reason"] == ""]
+    for (cod_assessor, cc_email), grp in sendable.groupby(["cod_assessor", "cc_email"], sort=False):
+        rows = list(grp.itertuples(index=False))
+        clients = ",".join(sorted(str(r.cod_cliente) for r in rows))
+        token = make_token(month_ref, "digest", cod_assessor, cc_email, clients)
+        subject = digest_subject(subject_tpl, rows)
+        digest = body_sha256(render_digest_body(body_template, rows, sla_days, token))
+        # plan_from_lookup devolve RangeIndex: rótulo == posição
+        for i in grp.index:
+            tokens[i] = token
+            hashes[i] = digest
+            subjects[i] = subject
+
+    plan["token"] = tokens
+    plan["body_sha256"] = hashes
+    plan["subject"] = subjects
+
+
+class PlanCounter:
+    """Acumula as contagens do resumo bloco a bloco."""
+
+    def __init__(self):
+        self.total = 0
+        self.sendable = 0
+        self.skipped = {}
+        self.with_cc = 0
+        self._assessors = set()
+
+    def add(self, plan: pd.DataFrame):
+        ok = plan["skip_reason"] == ""
+        self.total += int(len(plan))
+        self.sendable += int(ok.sum())
+        for k, v in plan.loc[~ok, "skip_reason"].value_counts().items():
+            self.skipped[k] = self.skipped.get(k, 0) + int(v)
+        self.with_cc += int((plan.loc[ok, "cc_email"] != "").sum())
+        self._assessors.update(plan.loc[ok, "cod_assessor"].unique())
+
+    def as_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "sendable": self.sendable,
+            "skipped": dict(self.skipped),
+            "assessors": len(self._assessors),
+            "with_cc": self.with_cc,
+        }
+
+
+def _summary_path(plan_path: Path) -> Path:
+    return plan_path.with_name(plan_path.name + ".summary.json")
+
+
+def write_plan(plan, meta: dict, path: str) -> dict:
+    """
+    Grava o plano (Parquet se a extensão for .parquet, senão JSONL) e o resumo ao lado.
+
+    Aceita um DataFrame ou uma sequência de blocos (modo streaming).
+    """
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    chunks = [plan] if isinstance(plan, pd.DataFrame) else plan
+    counter = PlanCounter()
+
+    if p.suffix.lower() == ".parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(c, pa.string()) for c in PLAN_FILE_COLUMNS])
+        with pq.ParquetWriter(p, schema) as writer:
+            for chunk in chunks:
+                counter.add(chunk)
+                table = pa.Table.from_pandas(chunk[PLAN_FILE_COLUMNS].astype(str), schema=schema,
+                                             preserve_index=False)
+                writer.write_table(table)
+    else:
+        with open(p, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                counter.add(chunk)
+                if len(chunk):
+                    # to_json(lines=True) já termina com quebra de linha: os blocos se concatenam
+                    chunk[PLAN_FILE_COLUMNS].to_json(f, orient="records", lines=True, force_ascii=False)
+
+    summary = dict(meta)
+    summary["plan_file"] = str(p)
+    summary["counts"] = counter.as_dict()
+    _summary_path(p).write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    return summary
+
+
+def _normalize_plan(plan: pd.DataFrame, name: str) -> pd.DataFrame:
+    missing = [c for c in PLAN_FILE_COLUMNS if c not in plan.columns]
+    if missing:
+        raise RuntimeError(f"Plano inválido ({name}): colunas ausentes {missing}")
+    return plan[PLAN_FILE_COLUMNS].fillna("").astype(str)
+
+
+def _read_meta(p: Path) -> dict:
+    sp = _summary_path(p)
+    return json.loads(sp.read_text(encoding="utf-8")) if sp.exists() else {}
+
+
+def read_plan(path: str):
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"Plano não encontrado: {p.resolve()}")
+
+    if p.suffix.lower() == ".parquet":
+        plan = pd.read_parquet(p)
+    else:
+        plan = pd.read_json(p, orient="records", lines=True, dtype=False)
+
+    return _normalize_plan(plan, p.name), _read_meta(p)
+
+
+def iter_plan(path: str, chunk_rows: int = 50_000):
+    """Lê um plano gravado em blocos, sem carregá-lo inteiro."""
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"Plano não encontrado: {p.resolve()}")
+
+    def chunks():
+        if p.suffix.lower() == ".parquet":
+            import pyarrow.parquet as pq
+
+            for batch in pq.ParquetFile(p).iter_batches(batch_size=chunk_rows):
+                yield _normalize_plan(batch.to_pandas(), p.name)
+        else:
+            with pd.read_json(p, orient="records", lines=True, dtype=False, chunksize=chunk_rows) as reader:
+                for block in reader:
+                    yield _normalize_plan(block, p.name)
+
+    return chunks(), _read_meta(p)
@@ -0,0 +1,198 @@
+import hashlib
+import html
+import re
+
+import numpy as np
+import pandas as pd
+
+_EMAIL_RX = re.compile(r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$")
+_INVISIBLE_RX = "[ \u00a0\u200b\u200c\u200d\ufeff]"
+
+# acima de 2**53 o float lido do Excel já perdeu precisão: mantém o texto
+_INT_SAFE = 2 ** 53
+
+PLAN_COLUMNS = [
+    "cod_cliente",
+    "nome_cliente",
+    "cod_assessor",
+    "nome_assessor",
+    "to_email",
+    "cc_email",
+    "cod_lider",
+    "subject",
+    "skip_reason",
+]
+
+# colunas adicionadas pelo plan_io.prepare_plan (o que o dispatch precisa para enviar)
+PLAN_FILE_COLUMNS = PLAN_COLUMNS + ["token", "body_sha256"]
+
+GROUPING_NONE = "none"
+GROUPING_ASSESSOR = "assessor"
+
+SKIP_NO_PROF = "sem_assessor"
+SKIP_BAD_EMAIL = "email_invalido"
+
+
+def _as_text(s: pd.Series) -> pd.Series:
+    # NaN/None viram "", o resto vira str sem espaços nas pontas
+    return s.astype(object).where(s.notna(), "").astype(str).str.strip()
+
+
+def norm_cod_assessor(s: pd.Series) -> pd.Series:
+    """Versão vetorizada da normalização de código de assessor (ex.: 123.0 -> A123)."""
+    txt = _as_text(s)
+
+    # trata casos de número no Excel (ex: 123.0)
+    num = pd.to_numeric(txt.str.replace(",", ".", regex=False), errors="coerce").astype(float)
+    is_int = num.notna() & np.isfinite(num) & (num.abs() < _INT_SAFE) & (np.floor(num) == num)
+    if is_int.any():
+        txt = txt.mask(is_int, num[is_int].astype("int64").astype(str))
+
+    txt = txt.str.upper()
+    return txt.where((txt == "") | txt.str.startswith("A"), "A" + txt)
+
+
+def clean_email(s: pd.Series) -> pd.Series:
+    return _as_text(s).str.replace(_INVISIBLE_RX, "", regex=True)
+
+
+def email_ok(s: pd.Series) -> pd.Series:
+    return s.str.match(_EMAIL_RX.pattern).fillna(False).astype(bool)
+
+
+def prof_lookup(df_prof: pd.DataFrame, cols: dict, skip_cc_codes=()) -> pd.DataFrame:
+    """Tabela compacta de profissionais (uma linha por assessor) já com o CC do líder resolvido."""
+    p_cod, p_nome, p_email = cols["p_cod"], cols["p_nome"], cols["p_email"]
+    p_cod_lider, p_email_lider = cols.get("p_cod_lider"), cols.get("p_email_lider")
+
+    # só as colunas usadas: nada de copiar a base inteira
+    prof = pd.DataFrame({
+        "cod_assessor": norm_cod_assessor(df_prof[p_cod]),
+        "nome_assessor": _as_text(df_prof[p_nome]),
+        "to_email": clean_email(df_prof[p_email]),
+    })
+    prof["cod_lider"] = norm_cod_assessor(df_prof[p_cod_lider]) if p_cod_lider else ""
+    prof["_fallback"] = clean_email(df_prof[p_email_lider]) if p_email_lider else ""
+    prof = prof[prof["cod_assessor"] != ""]
+    prof = prof.drop_duplicates(subset="cod_assessor", keep="last")
+    prof["_email_ok"] = email_ok(prof["to_email"])
+
+    # ===== CC do líder: self-join da base de profissionais =====
+    leaders = prof[["cod_assessor", "to_email", "_email_ok"]].rename(columns={
+        "cod_assessor": "cod_lider",
+        "to_email": "_lider_email",
+        "_email_ok": "_lider_ok",
+    })
+    prof = prof.merge(leaders, on="cod_lider", how="left")
+
+    has_lider = (prof["cod_lider"] != "").to_numpy()
+    lider_found = prof["_lider_email"].notna().to_numpy()
+    skip_cc = has_lider & prof["cod_lider"].isin(set(skip_cc_codes or [])).to_numpy()
+
+    lider_ok = prof["_lider_ok"].fillna(False).astype(bool)
+    lider_cc = prof["_lider_email"].fillna("").where(lider_ok, "").to_numpy()
+    fallback_cc = prof["_fallback"].where(email_ok(prof["_fallback"]), "").to_numpy()
+
+    # mesma precedência do fluxo original: líder na lista de exceção > líder na base > e-mail do líder
+    prof["cc_email"] = np.select([skip_cc, has_lider & lider_found], ["", lider_cc], default=fallback_cc)
+    return prof[["cod_assessor", "nome_assessor", "to_email", "_email_ok", "cod_lider", "cc_email"]]
+
+
+def build_plan(df_aud: pd.DataFrame, df_prof: pd.DataFrame, cols: dict,
+               subject_tpl: str, skip_cc_codes=()) -> pd.DataFrame:
+    """
+    Monta o plano de envio inteiro com operações de DataFrame.
+
+    Retorna uma linha por cliente válido da auditoria (na ordem original) com
+    destinatário, CC, assunto e `skip_reason` ("" quando a linha é enviável).
+    """
+    return plan_from_lookup(df_aud, prof_lookup(df_prof, cols, skip_cc_codes), cols, subject_tpl)
+
+
+def plan_from_lookup(df_aud: pd.DataFrame, prof: pd.DataFrame, cols: dict, subject_tpl: str) -> pd.DataFrame:
+    """Planeja um bloco da auditoria contra a tabela de `prof_lookup` (usado também no modo streaming)."""
+    aud_cli = df_aud[cols["c_cod_cli"]]
+    aud = pd.DataFrame({
+        "cod_cliente": _as_text(aud_cli),
+        "nome_cliente": _as_text(df_aud[cols["c_nome_cli"]]),
+        "cod_assessor": norm_cod_assessor(df_aud[cols["c_cod_ass"]]),
+    })
+    aud = aud[aud_cli.notna().to_numpy()
+              & (aud["cod_assessor"] != "").to_numpy()
+              & (aud["cod_cliente"].str.lower() != "nan").to_numpy()]
+
+    plan = aud.merge(prof, on="cod_assessor", how="left", indicator=True, sort=False)
+
+    found = (plan.pop("_merge") == "both").to_numpy()
+    ok = plan.pop("_email_ok").fillna(False).astype(bool).to_numpy()
+    plan["skip_reason"] = np.select([~found, ~ok], [SKIP_NO_PROF, SKIP_BAD_EMAIL], default="")
+
+    for c in ["nome_assessor", "to_email", "cod_lider", "cc_email"]:
+        plan[c] = plan[c].fillna("")
+    plan.loc[plan["skip_reason"] != "", "cc_email"] = ""
+
+    plan["subject"] = [
+        subject_tpl.format(nome_cliente=n, cod_cliente=c)
+        for n, c in zip(plan["nome_cliente"], plan["cod_cliente"])
+    ]
+    return plan[PLAN_COLUMNS].reset_index(drop=True)
+
+
+def load_html(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+    except Exception:
+        return ""
+
+
+def render_body(body_template: str, row, sla_days, token: str) -> str:
+    # corpo com placeholders
+    body = body_template.format(
+        nome_assessor=row.nome_assessor,
+        nome_cliente=row.nome_cliente,
+        cod_cliente=row.cod_cliente,
+        sla_business_days=sla_days
+    )
+
+    # token no corpo (fundamental pro follow-up)
+    body += f"<br><br><p><small><b>Token:</b> {token}</small></p>"
+    return body
+
+
+def render_digest_body(body_template: str, rows, sla_days, token: str) -> str:
+    """Corpo do modo digest: um e-mail por assessor com a tabela dos clientes."""
+    rows = list(rows)
+    linhas = "\n".join(
+        f"<tr><td>{html.escape(str(r.cod_cliente))}</td><td>{html.escape(str(r.nome_cliente))}</td></tr>"
+        for r in rows
+    )
+    tabela = (
+        '<table border="1" cellpadding="4" cellspacing="0" style="border-collapse:collapse">'
+        "<tr><th>Código</th><th>Cliente</th></tr>\n"
+        f"{linhas}\n</table>"
+    )
+    body = body_template.format(
+        nome_assessor=rows[0].nome_assessor,
+        qtd_clientes=len(rows),
+        tabela_clientes=tabela,
+        sla_business_days=sla_days
+    )
+
+    # token no corpo (fundamental pro follow-up)
+    body += f"<br><br><p><small><b>Token:</b> {token}</small></p>"
+    return body
+
+
+def digest_subject(subject_tpl: str, rows) -> str:
+    rows = list(rows)
+    return subject_tpl.format(
+        nome_assessor=rows[0].nome_assessor,
+        cod_assessor=rows[0].cod_assessor,
+        qtd_clientes=len(rows),
+    )
+
+
+def body_sha256(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
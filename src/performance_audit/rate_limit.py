@@ -0,0 +1,74 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Limitador de envio em mensagens por minuto com rajada (token bucket).
+
+    É adaptativo: cada falha reduz a taxa pela metade (até `min_rate_per_min`)
+    e cada sucesso devolve um pouco da taxa configurada. Seguro entre threads.
+    """
+
+    def __init__(self, rate_per_min: float, burst: int = 1, min_rate_per_min: float | None = None,
+                 recover_step: float = 0.1, clock=time.monotonic, sleep=time.sleep):
+        if rate_per_min <= 0:
+            raise ValueError("rate_per_min deve ser > 0")
+        self.max_rate = float(rate_per_min)
+        self.rate = float(rate_per_min)
+        self.min_rate = float(min_rate_per_min) if min_rate_per_min else max(1.0, self.max_rate / 16)
+        self.burst = max(1, int(burst))
+        self.recover_step = float(recover_step)
+
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._last = clock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate / 60.0)
+        self._last = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) * 60.0 / self.rate
+            self._sleep(wait)
+
+    def penalize(self):
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = max(self.min_rate, self.rate / 2)
+            # sem rajada logo depois de uma falha
+            self._tokens = min(self._tokens, 0.0)
+
+    def reward(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill(self._clock())
+                self.rate = min(self.max_rate, self.rate + self.max_rate * self.recover_step)
+
+
+def backoff_delays(attempts: int, base_sec: float = 1.0, max_sec: float = 30.0, rng=random.random):
+    """Atrasos exponenciais com "full jitter": uniforme em [0, min(max, base * 2^n)]."""
+    for n in range(attempts):
+        yield rng() * min(max_sec, base_sec * (2 ** n))
+
+
+def limiter_from_config(cfg) -> TokenBucket:
+    rate = cfg.get("behavior.rate_per_minute", None)
+    if rate is None:
+        # compatível com configs antigas: um envio a cada delay_between_emails_sec
+        delay = float(cfg.get("behavior.delay_between_emails_sec", 2.5))
+        rate = 60.0 / delay if delay > 0 else 600.0
+        burst = 1
+    else:
+        burst = int(cfg.get("behavior.burst", 1))
+    return TokenBucket(float(rate), burst=burst, min_rate_per_min=cfg.get("behavior.min_rate_per_minute", None))
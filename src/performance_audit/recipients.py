@@ -0,0 +1,104 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+_SPLIT_RX = re.compile(r"[;,]")
+
+
+def split_addresses(value) -> list:
+    return [a.strip() for a in _SPLIT_RX.split(str(value or "")) if a.strip()]
+
+
+def row_addresses(row) -> list:
+    return split_addresses(row.to_email) + split_addresses(row.cc_email)
+
+
+def plan_addresses(plans) -> Counter:
+    """Endereço (minúsculo) -> quantidade de linhas enviáveis que o usam, somado sobre os blocos do plano."""
+    counts = Counter()
+    for plan in plans:
+        sendable = plan[plan["skip_reason"] == ""]
+        for to, cc in zip(sendable["to_email"], sendable["cc_email"]):
+            for addr in split_addresses(to) + split_addresses(cc):
+                counts[addr.lower()] += 1
+    return counts
+
+
+class RecipientCache:
+    """
+    Resultado da resolução de endereços no catálogo do Outlook, por execução.
+
+    Cada endereço é resolvido uma vez; com `path` os endereços resolvidos vão
+    para um JSON em disco e valem por `ttl_hours` (execuções do mesmo dia não
+    consultam o catálogo de novo). Falhas não são persistidas: um endereço
+    corrigido no catálogo volta a ser testado na execução seguinte.
+    """
+
+    def __init__(self, path: str | None = None, ttl_hours: float = 12.0):
+        self.path = Path(path) if path else None
+        self.ttl_sec = float(ttl_hours) * 3600
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.loaded = 0
+        if self.path is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for addr, entry in data.get("entries", {}).items():
+            if entry.get("ok") and now - float(entry.get("at", 0)) < self.ttl_sec:
+                self._entries[addr] = entry
+        self.loaded = len(self._entries)
+
+    def get(self, address: str) -> bool | None:
+        with self._lock:
+            entry = self._entries.get(address.lower())
+        return None if entry is None else bool(entry["ok"])
+
+    def put(self, address: str, ok: bool, name: str = ""):
+        with self._lock:
+            self._entries[address.lower()] = {"ok": bool(ok), "name": name, "at": time.time()}
+
+    def resolve_all(self, addresses, make_resolver) -> dict:
+        """
+        Resolve o que ainda não está no cache.
+
+        `make_resolver()` devolve a função `resolver(endereço) -> (ok, nome)` e só
+        é chamado se houver endereço novo: com tudo em cache o Outlook nem é aberto.
+        Retorna {"cached": n, "resolved": n, "failed": [endereços]}.
+        """
+        cached, resolved, failed = 0, 0, []
+        resolver = None
+        for addr in addresses:
+            known = self.get(addr)
+            if known is not None:
+                cached += 1
+                if not known:
+                    failed.append(addr)
+                continue
+            if resolver is None:
+                resolver = make_resolver()
+            ok, name = resolver(addr)
+            self.put(addr, ok, name)
+            resolved += 1
+            if not ok:
+                failed.append(addr)
+        return {"cached": cached, "resolved": resolved, "failed": failed}
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            entries = {a: e for a, e in self._entries.items() if e["ok"]}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"entries": entries}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
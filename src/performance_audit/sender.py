@@ -0,0 +1,304 @@
+import queue
+import threading
+import time
+
+from . import metrics
+from .rate_limit import backoff_delays
+
+_STOP = object()
+
+
+class SendJob:
+    __slots__ = ("row", "body", "rows")
+
+    def __init__(self, row, body: str, rows=None):
+        self.row = row
+        self.body = body
+        # modo digest: todas as linhas de cliente cobertas por este e-mail
+        self.rows = rows if rows is not None else [row]
+
+
+class SendResult:
+    __slots__ = ("job", "status", "ids", "error", "elapsed_ms", "retries", "refused")
+
+    def __init__(self, job, status: str, ids: dict | None = None, error: Exception | None = None,
+                 elapsed_ms: float = 0.0, retries: int = 0, refused: list | None = None):
+        self.job = job
+        self.status = status  # ENVIADO | PREPARADO | NAO_RESOLVIDO | FALHA | INTERROMPIDO
+        self.ids = ids or {}
+        self.error = error
+        self.elapsed_ms = elapsed_ms
+        self.retries = retries
+        # destinatários recusados num envio que saiu para os demais (SMTP)
+        self.refused = refused or []
+
+
+def _com_init():
+    # cada thread precisa do seu apartamento COM antes de criar o OutlookClient
+    try:
+        import pythoncom
+    except ImportError:
+        return None
+    pythoncom.CoInitialize()
+    return pythoncom
+
+
+def record_result(res: SendResult, t0: float) -> SendResult:
+    """Tempo total e contadores de um envio (comum a todos os transportes)."""
+    res.elapsed_ms = (time.perf_counter() - t0) * 1000
+    metrics.observe("send_total", res.elapsed_ms / 1000)
+    metrics.inc("emails", status=res.status)
+    if res.retries:
+        metrics.inc("send_retries", res.retries)
+    return res
+
+
+def send_one(oc, job: SendJob, sent_folder, limiter, send_mode: str, force_send: bool,
+             retry_send: int, backoff_base: float = 1.0, backoff_max: float = 30.0,
+             resolve: bool = True) -> SendResult:
+    t0 = time.perf_counter()
+    res = _send_one(oc, job, sent_folder, limiter, send_mode, force_send, retry_send, backoff_base, backoff_max,
+                    resolve)
+    return record_result(res, t0)
+
+
+def _send_one(oc, job: SendJob, sent_folder, limiter, send_mode: str, force_send: bool,
+              retry_send: int, backoff_base: float, backoff_max: float, resolve: bool) -> SendResult:
+    row = job.row
+
+    # ===== montar e-mail =====
+    with metrics.timer("compose"):
+        mail = oc.create_mail()
+        metrics.com_set(mail, "To", row.to_email, "MailItem.set")
+        if row.cc_email:
+            metrics.com_set(mail, "CC", row.cc_email, "MailItem.set")
+        metrics.com_set(mail, "Subject", row.subject, "MailItem.set")
+        metrics.com_set(mail, "HTMLBody", job.body, "MailItem.set")
+
+    # com a pré-resolução do dispatch os endereços já foram validados uma vez por execução
+    if resolve:
+        with metrics.timer("resolve"):
+            recipients = metrics.com_get(mail, "Recipients", "Recipients.ResolveAll")
+            resolved = metrics.com_call("Recipients.ResolveAll", recipients.ResolveAll)
+        if not resolved:
+            return SendResult(job, "NAO_RESOLVIDO")
+
+    with metrics.timer("rate_wait"):
+        limiter.acquire()
+
+    # ===== display / send =====
+    if send_mode == "display" or not force_send:
+        try:
+            metrics.com_call("MailItem.Save", mail.Save)
+        except Exception:
+            pass
+        metrics.com_call("MailItem.Display", mail.Display)
+        return SendResult(job, "PREPARADO", ids=oc.extract_ids(mail))
+
+    try:
+        metrics.com_call("MailItem.Save", mail.Save)
+    except Exception:
+        pass
+
+    last_ex = None
+    ok = False
+    retries = 0
+    delays = backoff_delays(max(0, retry_send - 1), backoff_base, backoff_max)
+    for attempt in range(retry_send):
+        try:
+            with metrics.timer("send"):
+                metrics.com_call("MailItem.Send", mail.Send)
+            ok = True
+            break
+        except Exception as ex:
+            last_ex = ex
+            limiter.penalize()
+            if attempt + 1 < retry_send:
+                retries += 1
+                time.sleep(next(delays))
+
+    if not ok:
+        return SendResult(job, "FALHA", error=last_ex, retries=retries)
+
+    limiter.reward()
+
+    # move para "Enviados" da store alvo (se configurado)
+    if sent_folder is not None:
+        try:
+            with metrics.timer("move"):
+                metrics.com_call("MailItem.Move", mail.Move, sent_folder)
+        except Exception:
+            pass
+
+    return SendResult(job, "ENVIADO", ids=oc.extract_ids(mail), retries=retries)
+
+
+class ComTransport:
+    """
+    Transporte pelo Outlook (COM): cada worker abre o seu OutlookClient.
+
+    Um transporte tem `open()` (sessão do worker, chamada na thread dele),
+    `send(sessão, job, limitador) -> SendResult` e `close(sessão)`.
+    """
+
+    name = "com"
+
+    def __init__(self, make_client, send_kwargs: dict, use_sent_folder: bool = True):
+        self.make_client = make_client
+        self.send_kwargs = send_kwargs
+        self.use_sent_folder = use_sent_folder
+
+    def open(self):
+        oc = self.make_client()
+        return oc, (oc.get_sent_folder() if self.use_sent_folder else None)
+
+    def send(self, session, job: SendJob, limiter) -> SendResult:
+        oc, sent_folder = session
+        return send_one(oc, job, sent_folder, limiter, **self.send_kwargs)
+
+    def close(self, session):
+        pass
+
+
+class SendPool:
+    """
+    N threads de envio, cada uma com a sua sessão do transporte, consumindo uma fila comum.
+
+    O limitador é compartilhado: a taxa total respeita o configurado, seja qual
+    for o número de workers. Os resultados voltam pela fila `results` para a
+    thread principal, que é a única a gravar histórico.
+
+    Com `inline=True` (um worker só) o envio roda na própria thread de quem
+    chama: é assim que o modo serve reaproveita a sessão do Outlook já aberta.
+
+    A primeira FALHA interrompe o pool na hora, sem esperar quem consome chegar
+    nesse resultado: os jobs seguintes não são enviados e voltam como
+    INTERROMPIDO, um resultado por job, para que cada um fique no log.
+    """
+
+    def __init__(self, transport, limiter, workers: int = 1, inline: bool = False):
+        self.transport = transport
+        self.limiter = limiter
+        self.workers = max(1, int(workers))
+        self.inline = inline and self.workers == 1
+
+        self.jobs = queue.Queue(maxsize=self.workers * 4)
+        self.results = queue.Queue()
+        self._stop = threading.Event()
+        self._halted = threading.Event()
+        self._threads = []
+
+    def _worker(self):
+        com = _com_init()
+        try:
+            session = self.transport.open()
+        except Exception as ex:
+            # sem sessão este worker não envia nada: devolve os jobs como falha
+            session, init_error = None, ex
+        else:
+            init_error = None
+
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is _STOP:
+                    break
+                if session is None:
+                    self._halted.set()
+                    self.results.put(SendResult(job, "FALHA", error=init_error))
+                    continue
+                if self._stop.is_set() or self._halted.is_set():
+                    self.results.put(self._interrupted(job))
+                    continue
+                self.results.put(self._send(session, job))
+        finally:
+            if session is not None:
+                self.transport.close(session)
+            if com is not None:
+                com.CoUninitialize()
+
+    def _send(self, session, job: SendJob) -> SendResult:
+        try:
+            res = self.transport.send(session, job, self.limiter)
+        except Exception as ex:
+            metrics.inc("emails", status="FALHA")
+            res = SendResult(job, "FALHA", error=ex)
+        if res.status == "FALHA":
+            # os outros workers param já, não quando o resultado for lido
+            self._halted.set()
+        return res
+
+    @staticmethod
+    def _interrupted(job: SendJob) -> SendResult:
+        metrics.inc("emails", status="INTERROMPIDO")
+        return SendResult(job, "INTERROMPIDO", error=RuntimeError("envio interrompido após falha anterior"))
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"send-worker-{i + 1}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        """Faz os workers descartarem o que ainda estiver na fila (quem consome não quer mais resultados)."""
+        self._stop.set()
+
+    def _run_inline(self, jobs):
+        session = self.transport.open()
+        try:
+            for job in jobs:
+                if self._stop.is_set():
+                    break
+                yield self._interrupted(job) if self._halted.is_set() else self._send(session, job)
+        finally:
+            self.transport.close(session)
+
+    def run(self, jobs):
+        """
+        Enfileira os jobs e devolve os resultados conforme ficam prontos.
+
+        Se quem consome parar no meio (exceção ou break), os workers descartam o
+        que falta na fila e terminam antes de run() sair: nada é enviado sem que
+        alguém receba o resultado para gravar no histórico. Depois de uma FALHA
+        o gerador continua sendo lido até o fim, e cada job restante volta como
+        INTERROMPIDO. Uma exceção do gerador de jobs é relançada aqui depois dos
+        jobs já enfileirados.
+        """
+        if self.inline:
+            yield from self._run_inline(jobs)
+            return
+        self.start()
+        feed_error = []
+
+        def feed():
+            try:
+                for job in jobs:
+                    if self._stop.is_set():
+                        break
+                    self.jobs.put(job)
+            except BaseException as ex:
+                feed_error.append(ex)
+            finally:
+                # sempre um _STOP por worker, senão os workers (e run) esperam para sempre
+                for _ in self._threads:
+                    self.jobs.put(_STOP)
+
+        feeder = threading.Thread(target=feed, name="send-feeder", daemon=True)
+        feeder.start()
+
+        try:
+            while feeder.is_alive() or any(t.is_alive() for t in self._threads) or not self.results.empty():
+                try:
+                    res = self.results.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                yield res
+        finally:
+            self.stop()
+            feeder.join()
+            for t in self._threads:
+                t.join()
+
+        if feed_error:
+            raise feed_error[0]
@@ -0,0 +1,229 @@
+import glob
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from . import metrics
+from .config import Config
+from .dispatch import dispatch
+from .excel_utils import excel_is_locked
+from .followup import followup
+from .plan_io import prepare_plan, write_plan
+
+
+def _stamp(path) -> list | None:
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _default_client(from_smtp: str, store_hint: str):
+    from .outlook_client import OutlookClient
+    return OutlookClient(from_smtp=from_smtp, store_hint=store_hint)
+
+
+class Server:
+    """
+    Modo serve: um processo que fica de pé entre execuções.
+
+    A cada ciclo (`tick`):
+    - relê a config só se o arquivo mudou;
+    - procura auditorias novas ou alteradas em `serve.watch_glob` e, para
+      cada uma, monta o plano e chama o dispatch (o histórico garante que só
+      as linhas ainda não enviadas saem);
+    - roda o follow-up a cada `serve.followup_interval_min`.
+
+    A sessão do Outlook e a tabela de profissionais ficam em memória entre os
+    ciclos; a sessão é descartada após erro e recriada no ciclo seguinte.
+    `make_client(from_smtp, store_hint)` e `clock` permitem rodar com o
+    Outlook falso e um relógio controlado.
+    """
+
+    def __init__(self, config_path: str, logger, make_client=None, clock=time.time, on_cycle=None):
+        self.config_path = Path(config_path)
+        self.logger = logger
+        self.make_client = make_client or _default_client
+        self.clock = clock
+        self.on_cycle = on_cycle
+        self.cfg = None
+        self.prof_cache = {}
+        self.state = {}
+        self.cycles = 0
+        self._cfg_stamp = None
+        self._client = None
+        self._client_key = None
+
+    # ===== config e estado =====
+    def reload_config(self) -> bool:
+        stamp = _stamp(self.config_path)
+        if self.cfg is not None and stamp == self._cfg_stamp:
+            return False
+        try:
+            cfg = Config.load(str(self.config_path))
+        except ValueError as ex:
+            if self.cfg is None:
+                raise
+            # JSON salvo pela metade ou com erro: segue com a config anterior
+            self.logger.error(f"Serve: config inválida, mantendo a anterior: {ex}")
+            self._cfg_stamp = stamp
+            return False
+        self.cfg = cfg
+        self._cfg_stamp = stamp
+        self.state = self._load_state()
+        self.logger.info(f"Serve: config carregada de {self.config_path}")
+        return True
+
+    def _state_path(self) -> Path:
+        return Path(self.cfg.get("paths.serve_state", "data/serve_state.json"))
+
+    def _load_state(self) -> dict:
+        try:
+            return json.loads(self._state_path().read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        path = self._state_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.state, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+
+    # ===== sessão do Outlook =====
+    def client(self):
+        key = (self.cfg.get("outlook.from_smtp"), self.cfg.get("outlook.store_hint", "riscos"))
+        if self._client is None or key != self._client_key:
+            self._client = self.make_client(*key)
+            self._client_key = key
+            self.logger.info(f"Serve: sessão do Outlook aberta ({key[0]})")
+        return self._client
+
+    def drop_client(self):
+        self._client = None
+        self._client_key = None
+
+    # ===== auditorias =====
+    def _watched(self) -> list:
+        cfg = self.cfg
+        pattern = cfg.get("serve.watch_glob") or cfg.get("paths.auditoria_xlsx")
+        exclude = {str(Path(p).resolve()) for p in (cfg.get("paths.profissionais_xlsx"), cfg.get("paths.history_xlsx"))
+                   if p}
+        files = []
+        for name in sorted(glob.glob(str(pattern))):
+            p = Path(name)
+            if p.name.startswith("~$") or not p.is_file() or str(p.resolve()) in exclude:
+                continue
+            files.append(p)
+        return files
+
+    def pending_files(self) -> list:
+        """Auditorias novas/alteradas, já estáveis em disco e fechadas no Excel."""
+        settle = float(self.cfg.get("serve.settle_sec", 10))
+        retry = float(self.cfg.get("serve.retry_after_min", 15)) * 60
+        prof = _stamp(self.cfg.get("paths.profissionais_xlsx"))
+        now = self.clock()
+        wall = time.time()  # mtime é hora real, independente do relógio injetado
+        files = self.state.setdefault("files", {})
+
+        pending = []
+        for p in self._watched():
+            stamp = _stamp(p)
+            if stamp is None or wall - stamp[1] / 1e9 < settle:
+                continue  # ainda sendo copiada/gravada
+            seen = files.get(str(p))
+            # base de profissionais mudou: reprocessa (linhas antes sem assessor podem ter ficado enviáveis)
+            if seen and seen["stamp"] == stamp and seen.get("prof") == prof:
+                if seen["status"] == "ok" or now - seen["at"] < retry:
+                    continue
+            if excel_is_locked(str(p)):
+                self.logger.info(f"Serve: {p.name} aberta no Excel; fica para o próximo ciclo.")
+                continue
+            pending.append((p, stamp, prof))
+        return pending
+
+    def process_file(self, path: Path) -> Path:
+        """Plano da auditoria em `serve.plan_dir` + dispatch com a sessão já aberta."""
+        plan_dir = Path(self.cfg.get("serve.plan_dir", "data/serve"))
+        cfg = self.cfg.with_values({
+            "paths.auditoria_xlsx": str(path),
+            "paths.dispatch_checkpoint": str(plan_dir / f"{path.stem}.checkpoint.json"),
+        })
+        plan, meta = prepare_plan(cfg, self.logger, prof_cache=self.prof_cache)
+        plan_path = plan_dir / f"{path.stem}.plan.jsonl"
+        write_plan(plan, meta, str(plan_path))
+        del plan
+        dispatch(cfg, self.logger, from_plan=str(plan_path), client=self.client())
+        return plan_path
+
+    def _followup_due(self) -> bool:
+        interval = float(self.cfg.get("serve.followup_interval_min", 60)) * 60
+        if interval <= 0:
+            return False
+        return self.clock() - float(self.state.get("last_followup", 0)) >= interval
+
+    # ===== ciclo =====
+    def tick(self) -> dict:
+        result = {"config_reloaded": False, "files": [], "errors": [], "followup": False}
+        # erro ao recarregar a config ou listar as auditorias não derruba o daemon: tenta de novo no próximo ciclo
+        try:
+            result["config_reloaded"] = self.reload_config()
+            pending = self.pending_files()
+        except Exception as ex:
+            pending = []
+            result["errors"].append(f"ciclo: {ex}")
+            self.logger.error(f"Serve: falha ao preparar o ciclo: {ex}")
+        with metrics.timer("serve_cycle"):
+            for path, stamp, prof in pending:
+                self.logger.info(f"Serve: processando {path.name}")
+                entry = {"stamp": stamp, "prof": prof, "at": self.clock()}
+                try:
+                    with metrics.timer("serve_file"):
+                        self.process_file(path)
+                    entry["status"] = "ok"
+                    result["files"].append(str(path))
+                except Exception as ex:
+                    entry["status"] = "erro"
+                    result["errors"].append(f"{path.name}: {ex}")
+                    self.logger.error(f"Serve: falha em {path.name}: {ex}", file=str(path))
+                    self.drop_client()
+                self.state["files"][str(path)] = entry
+                self._save_state()
+
+            if self._followup_due():
+                try:
+                    # backend de arquivos não usa o Outlook: não abre sessão só para isso
+                    files = str(self.cfg.get("followup.backend", "outlook")).lower() == "files"
+                    followup(self.cfg, self.logger, client=None if files else self.client())
+                    result["followup"] = True
+                except Exception as ex:
+                    result["errors"].append(f"followup: {ex}")
+                    self.logger.error(f"Serve: falha no follow-up: {ex}")
+                    self.drop_client()
+                # com ou sem erro, a próxima tentativa espera o intervalo
+                self.state["last_followup"] = self.clock()
+                self._save_state()
+
+        self.cycles += 1
+        metrics.inc("serve_cycles")
+        if self.on_cycle is not None:
+            self.on_cycle(result)
+        return result
+
+    def run(self, stop: threading.Event | None = None, max_cycles: int | None = None):
+        """Roda `tick` a cada `serve.poll_sec` até `stop` ser sinalizado (ou `max_cycles`)."""
+        stop = stop or threading.Event()
+        self.reload_config()
+        self.logger.info(f"Serve: observando {self.cfg.get('serve.watch_glob') or self.cfg.get('paths.auditoria_xlsx')}"
+                         f" a cada {self.cfg.get('serve.poll_sec', 60)}s")
+        while not stop.is_set():
+            self.tick()
+            if max_cycles is not None and self.cycles >= max_cycles:
+                break
+            stop.wait(float(self.cfg.get("serve.poll_sec", 60)))
+        self.logger.info(f"Serve: encerrado após {self.cycles} ciclo(s).")
@@ -0,0 +1,213 @@
+import os
+import smtplib
+import ssl
+import time
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+from . import metrics
+from .rate_limit import backoff_delays
+from .recipients import split_addresses
+from .sender import SendJob, SendResult, record_result
+
+# erros de envio que valem nova tentativa numa conexão nova, desde que antes do DATA
+_RETRYABLE = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPHeloError, OSError)
+
+
+class _DataPhase:
+    """Marca quando o DATA começou: a partir daí a mensagem pode ter sido aceita sem o 250 chegar."""
+
+    data_started = False
+
+    def data(self, msg):
+        self.data_started = True
+        return super().data(msg)
+
+
+class _SMTP(_DataPhase, smtplib.SMTP):
+    pass
+
+
+class _SMTP_SSL(_DataPhase, smtplib.SMTP_SSL):
+    pass
+
+
+def smtp_settings(cfg) -> dict:
+    from_addr = cfg.get("smtp.from_addr") or cfg.get("outlook.from_smtp")
+    password_env = cfg.get("smtp.password_env", "PERF_AUDIT_SMTP_PASSWORD")
+    return {
+        "host": cfg.get("smtp.host", "localhost"),
+        "port": int(cfg.get("smtp.port", 587)),
+        "ssl": bool(cfg.get("smtp.ssl", False)),
+        "starttls": bool(cfg.get("smtp.starttls", True)),
+        "username": cfg.get("smtp.username", None),
+        # a senha nunca fica na config: vem da variável de ambiente indicada
+        "password": os.environ.get(password_env, "") if password_env else "",
+        "timeout": float(cfg.get("smtp.timeout_sec", 30)),
+        "max_messages": int(cfg.get("smtp.max_messages_per_connection", 100)),
+        "from_addr": from_addr,
+    }
+
+
+def build_message(job: SendJob, from_addr: str) -> EmailMessage:
+    """MIME do e-mail com o mesmo assunto e corpo HTML (assinatura incluída) do envio pelo Outlook."""
+    row = job.row
+    msg = EmailMessage()
+    msg["From"] = from_addr
+    msg["To"] = ", ".join(split_addresses(row.to_email))
+    cc = split_addresses(row.cc_email)
+    if cc:
+        msg["Cc"] = ", ".join(cc)
+    msg["Subject"] = row.subject
+    msg["Date"] = formatdate(localtime=True)
+    # o Message-ID é nosso: vai para o histórico e o follow-up casa a resposta pelo In-Reply-To
+    msg["Message-ID"] = make_msgid(domain=from_addr.rpartition("@")[2] or None)
+    msg.set_content(job.body, subtype="html")
+    return msg
+
+
+class SmtpSession:
+    """
+    Conexão SMTP autenticada de um worker, reaproveitada entre mensagens.
+
+    Abre no primeiro envio, é reaberta depois de `max_messages` mensagens
+    (limite comum por conexão nos servidores) e descartada após erro.
+    """
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self.conn = None
+        self.sent_on_conn = 0
+        # o último envio chegou ao DATA (falha depois disso não pode ser repetida)
+        self.data_started = False
+
+    def _connect(self):
+        s = self.settings
+        with metrics.timer("smtp_connect"):
+            if s["ssl"]:
+                conn = _SMTP_SSL(s["host"], s["port"], timeout=s["timeout"],
+                                 context=ssl.create_default_context())
+            else:
+                conn = _SMTP(s["host"], s["port"], timeout=s["timeout"])
+            try:
+                conn.ehlo()
+                if s["starttls"] and not s["ssl"]:
+                    conn.starttls(context=ssl.create_default_context())
+                    conn.ehlo()
+                if s["username"]:
+                    conn.login(s["username"], s["password"])
+            except Exception:
+                conn.close()
+                raise
+        metrics.inc("smtp_connections")
+        self.conn = conn
+        self.sent_on_conn = 0
+
+    def send(self, msg: EmailMessage) -> dict:
+        self.data_started = False
+        if self.conn is not None and self.sent_on_conn >= self.settings["max_messages"]:
+            self.close()
+        if self.conn is None:
+            self._connect()
+        conn = self.conn
+        conn.data_started = False
+        try:
+            refused = conn.send_message(msg)
+        finally:
+            self.data_started = conn.data_started
+        self.sent_on_conn += 1
+        return refused
+
+    def close(self):
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return
+        try:
+            conn.quit()
+        except Exception:
+            conn.close()
+
+
+class SmtpTransport:
+    """
+    Transporte SMTP: cada worker do SendPool mantém uma conexão persistente.
+
+    O número de conexões simultâneas é o número de workers (`smtp.pool_size`);
+    o limitador de taxa é o mesmo do envio pelo Outlook. Não há rascunho nem
+    pasta de Enviados: o histórico recebe o Message-ID gerado aqui.
+    """
+
+    name = "smtp"
+
+    def __init__(self, settings: dict, retry_send: int = 2, backoff_base: float = 1.0, backoff_max: float = 30.0):
+        if not settings.get("from_addr"):
+            raise ValueError("smtp.from_addr (ou outlook.from_smtp) é obrigatório no transporte smtp.")
+        self.settings = settings
+        self.retry_send = max(1, int(retry_send))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def open(self) -> SmtpSession:
+        return SmtpSession(self.settings)
+
+    def close(self, session: SmtpSession):
+        session.close()
+
+    def send(self, session: SmtpSession, job: SendJob, limiter) -> SendResult:
+        t0 = time.perf_counter()
+        return record_result(self._send(session, job, limiter), t0)
+
+    def _send(self, session: SmtpSession, job: SendJob, limiter) -> SendResult:
+        with metrics.timer("compose"):
+            msg = build_message(job, self.settings["from_addr"])
+
+        with metrics.timer("rate_wait"):
+            limiter.acquire()
+
+        last_ex = None
+        retries = 0
+        delays = backoff_delays(self.retry_send - 1, self.backoff_base, self.backoff_max)
+        for attempt in range(self.retry_send):
+            try:
+                with metrics.timer("send"):
+                    refused = session.send(msg)
+            except smtplib.SMTPRecipientsRefused as ex:
+                # nenhum destinatário aceito: equivale ao ResolveAll falhar no Outlook
+                return SendResult(job, "NAO_RESOLVIDO", error=ex, retries=retries)
+            except smtplib.SMTPResponseException as ex:
+                last_ex = ex
+                limiter.penalize()
+                session.close()
+                if ex.smtp_code >= 500:
+                    break  # rejeição permanente: repetir não adianta
+            except _RETRYABLE as ex:
+                last_ex = ex
+                limiter.penalize()
+                session.close()
+                if session.data_started:
+                    # conexão caiu com a mensagem já transmitida: o servidor pode tê-la aceitado,
+                    # e repetir mandaria o e-mail em dobro
+                    metrics.inc("smtp_lost_after_data")
+                    break
+            else:
+                if refused:
+                    metrics.inc("smtp_refused", len(refused))
+                limiter.reward()
+                return SendResult(job, "ENVIADO", retries=retries, refused=sorted(refused),
+                                  ids={"entry_id": "", "conversation_id": "",
+                                       "internet_message_id": msg["Message-ID"]})
+            if attempt + 1 < self.retry_send:
+                retries += 1
+                metrics.inc("smtp_reconnects")
+                time.sleep(next(delays))
+
+        return SendResult(job, "FALHA", error=last_ex, retries=retries)
+
+
+def smtp_transport_from_config(cfg) -> SmtpTransport:
+    return SmtpTransport(
+        smtp_settings(cfg),
+        retry_send=int(cfg.get("behavior.retry_send", 2)),
+        backoff_base=float(cfg.get("behavior.backoff_base_sec", 1.0)),
+        backoff_max=float(cfg.get("behavior.backoff_max_sec", 30.0)),
+    )
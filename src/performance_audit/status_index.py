@@ -0,0 +1,94 @@
+import json
+import os
+from collections import Counter
+from pathlib import Path
+
+# índice lateral do histórico xlsx: contagem de linhas por mês -> status -> assessor.
+# Só stdlib aqui: o subcomando status lê este arquivo sem pandas nem openpyxl.
+
+
+def index_path(history_path) -> Path:
+    p = Path(history_path)
+    return p.with_name(p.name + ".status.json")
+
+
+def fingerprint(path) -> list | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def row_key(row: dict) -> tuple:
+    return (str(row.get("month_ref", "") or "").strip(),
+            str(row.get("status", "") or "").strip().upper(),
+            str(row.get("cod_assessor", "") or "").strip())
+
+
+def count_rows(rows) -> Counter:
+    return Counter(row_key(r) for r in rows)
+
+
+def _read(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def load_counts(history_path) -> dict | None:
+    """{mês: {status: {assessor: n}}} se o índice corresponde ao arquivo atual; senão None."""
+    data = _read(index_path(history_path))
+    if not data or data.get("fingerprint") != fingerprint(history_path):
+        return None
+    return data.get("counts", {})
+
+
+def save_counts(history_path, counts: Counter) -> dict:
+    nested = {}
+    for (month, status, assessor), n in counts.items():
+        if n > 0:
+            nested.setdefault(month, {}).setdefault(status, {})[assessor] = n
+    _write(index_path(history_path), {"fingerprint": fingerprint(history_path), "counts": nested})
+    return nested
+
+
+def _flatten(nested: dict) -> Counter:
+    return Counter({(m, s, a): n for m, by_status in nested.items()
+                    for s, by_assessor in by_status.items() for a, n in by_assessor.items()})
+
+
+def apply_deltas(history_path, deltas: Counter, before: list | None):
+    """
+    Soma `deltas` ao índice depois de um save do histórico.
+
+    `before` é o fingerprint do arquivo antes do save: se o índice não
+    correspondia a ele (arquivo mexido por fora, índice ausente), o índice é
+    descartado e será reconstruído na próxima consulta.
+    """
+    if before is None:
+        # histórico criado neste save: as contagens são os próprios deltas
+        save_counts(history_path, Counter(deltas))
+        return
+    data = _read(index_path(history_path))
+    if not data or data.get("fingerprint") != before:
+        invalidate(history_path)
+        return
+    counts = _flatten(data.get("counts", {}))
+    counts.update(deltas)
+    save_counts(history_path, counts)
+
+
+def invalidate(history_path):
+    try:
+        index_path(history_path).unlink()
+    except OSError:
+        pass
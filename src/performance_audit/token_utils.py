@@ -1 +1,57 @@
+import base64
+import hashlib
+import re
+import zlib
 
+# PERF-<aaaamm>-<chave>-<verificador>: mês legível, chave = base32 de um hash de 64 bits
+# de (mês, cliente, assessor) e 2 caracteres de CRC sobre o resto do token
+_B32 = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+KEY_LEN = 13
+CHECK_LEN = 2
+
+TOKEN_RX = re.compile(r"\b([A-Z]+)-(\d{6})-([A-Z2-7]{%d})-([A-Z2-7]{%d})\b" % (KEY_LEN, CHECK_LEN))
+
+
+def _month_digits(month_ref: str) -> str:
+    digits = re.sub(r"\D", "", str(month_ref or ""))
+    return (digits + "000000")[:6]
+
+
+def _checksum(body: str) -> str:
+    crc = zlib.crc32(body.encode("ascii"))
+    return "".join(_B32[(crc >> (5 * i)) & 31] for i in range(CHECK_LEN))
+
+
+def token_key(month_ref: str, *parts) -> str:
+    raw = "|".join([_month_digits(month_ref)] + [str(p or "").strip() for p in parts])
+    digest = hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest()
+    return base64.b32encode(digest).decode("ascii").rstrip("=")
+
+
+def make_token(month_ref: str, *parts, prefix: str = "PERF") -> str:
+    """
+    Token determinístico para (month_ref, *parts): o mesmo cliente/assessor no
+    mesmo mês sempre recebe o mesmo token, inclusive em reenvios do plano.
+    """
+    body = f"{prefix}-{_month_digits(month_ref)}-{token_key(month_ref, *parts)}"
+    return f"{body}-{_checksum(body)}"
+
+
+def parse_token(token: str) -> dict | None:
+    """{prefix, month_ref, key} se o token estiver no formato atual e o verificador bater; senão None."""
+    m = TOKEN_RX.fullmatch(str(token or "").strip())
+    if not m:
+        return None
+    prefix, month, key, check = m.groups()
+    if _checksum(f"{prefix}-{month}-{key}") != check:
+        return None
+    return {"prefix": prefix, "month_ref": f"{month[:4]}-{month[4:]}", "key": key}
+
+
+def is_valid_token(token: str) -> bool:
+    return parse_token(token) is not None
+
+
+def month_prefix(month_ref: str, prefix: str = "PERF") -> str:
+    """Prefixo comum a todos os tokens do mês (filtro do Restrict no follow-up)."""
+    return f"{prefix}-{_month_digits(month_ref)}-"
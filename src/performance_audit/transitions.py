@@ -0,0 +1,36 @@
+import json
+from datetime import datetime
+from pathlib import Path
+
+# log das mudanças de status feitas pelo follow-up, um JSONL por mês de referência.
+# O histórico guarda só o status atual e o last_update_at; daqui saem a data da
+# primeira cobrança, da resposta e quantas vezes o mesmo token foi cobrado.
+
+
+def transitions_dir(cfg) -> Path:
+    return Path(cfg.get("paths.status_transitions_dir", "data/transitions"))
+
+
+def month_path(directory, month_ref: str) -> Path:
+    return Path(directory) / f"{month_ref or 'sem_mes'}.jsonl"
+
+
+def append(directory, month_ref: str, statuses: dict, at: str | None = None, received: dict | None = None) -> int:
+    """
+    Registra {token: status} com o mesmo instante; retorna quantas linhas foram gravadas.
+
+    `received` ({token: "aaaa-mm-dd hh:mm:ss"}) guarda a hora de chegada da
+    resposta em `received_at`: `at` é só a hora em que o follow-up rodou.
+    """
+    if not statuses:
+        return 0
+    at = at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    p = month_path(directory, month_ref)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    with open(p, "a", encoding="utf-8") as f:
+        for token, status in statuses.items():
+            line = {"token": token, "status": status, "at": at}
+            if received and received.get(token):
+                line["received_at"] = received[token]
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    return len(statuses)
@@ -0,0 +1,38 @@
+"""
+Fixtures comuns: os testes rodam em Linux contra o Outlook falso de benchmarks/fake_outlook.py.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest -q
+"""
+
+import sys
+
+import pytest
+
+from benchmarks.fake_outlook import ComStats, FakeApplication, install
+from benchmarks.harness import NullLogger, make_config
+
+_COM_MODULES = ("win32com", "win32com.client", "pywintypes", "pythoncom")
+
+
+@pytest.fixture
+def app():
+    """Outlook falso registrado no lugar do win32com durante o teste."""
+    saved = {name: sys.modules.get(name) for name in _COM_MODULES}
+    yield install(FakeApplication(ComStats()))
+    for name, module in saved.items():
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+
+
+@pytest.fixture
+def make_cfg(tmp_path):
+    """Config com todos os caminhos de saída em tmp_path; chaves pontuadas sobrescrevem valores."""
+    return lambda **over: make_config(tmp_path, **over)
+
+
+@pytest.fixture
+def logger():
+    return NullLogger()
@@ -0,0 +1,145 @@
+from datetime import datetime
+
+import pytest
+
+from src.performance_audit.followup import ReplyIndex, Watermark, followup, scan_mailbox
+from src.performance_audit.history_sqlite import SqliteHistory
+from src.performance_audit.history_store import open_history
+from src.performance_audit.token_utils import make_token
+
+
+def _inbox(app):
+    return app.ns.store.folders[6]
+
+
+def _tokens(n: int) -> list:
+    return [make_token("2025-01", 100000 + i, "A1") for i in range(n)]
+
+
+def _reads(app, tokens, **kw) -> dict:
+    app.stats.reset()
+    scan_mailbox(_inbox(app).Items, tokens, scan_limit=100_000, **kw)
+    return {p: app.stats.calls[f"FakeMailItem.{p}"] for p in ("Subject", "Body")}
+
+
+# ===== varredura única (user-001) =====
+
+def test_property_reads_scale_with_mailbox_not_with_tokens(app):
+    app.fill_inbox(200)
+
+    few = _reads(app, _tokens(5))
+    many = _reads(app, _tokens(2000))
+    assert few == many == {"Subject": 200, "Body": 200}
+
+    app.fill_inbox(200)
+    assert _reads(app, _tokens(2000)) == {"Subject": 400, "Body": 400}
+
+
+def test_every_token_matched_in_one_pass_and_scan_stops_early(app):
+    tokens = _tokens(3)
+    app.add_inbox(f"RE: Auditoria {tokens[0]}", "ok")
+    app.add_inbox("RE: Auditoria", f"segue retorno {tokens[1]}")
+    app.add_inbox(f"{tokens[2]} ciente", "ok")
+    app.fill_inbox(100)
+
+    app.stats.reset()
+    matches = scan_mailbox(_inbox(app).Items, tokens)
+    assert {t: m["matched_by"] for t, m in matches.items()} == {
+        tokens[0]: "token_assunto",
+        tokens[1]: "token_corpo",
+        tokens[2]: "token_assunto",
+    }
+    # todos achados nos 3 primeiros itens: o resto da caixa não é lido
+    assert app.stats.calls["FakeMailItem.Subject"] == 3
+
+
+def test_auto_replies_do_not_close_tokens(app):
+    tokens = _tokens(2)
+    index = ReplyIndex()
+    index.add(tokens[0], conversation_id="CONV-A")
+    index.add(tokens[1], internet_message_id="<b@empresa>")
+    app.add_inbox("Resposta automática", f"Fora do escritório. {tokens[0]}", conversation_id="CONV-A",
+                  message_class="IPM.Note.Rules.OofTemplate.Microsoft")
+    app.add_inbox("Não entregue", tokens[1], in_reply_to="<b@empresa>", message_class="REPORT.IPM.Note.NDR")
+    app.add_inbox(f"Ausente {tokens[1]}", "ok", auto_submitted="auto-replied")
+
+    assert scan_mailbox(_inbox(app).Items, tokens, reply_index=index) == {}
+
+    app.add_inbox("RE: Auditoria", "De acordo.", conversation_id="CONV-A", auto_submitted="no")
+    assert set(scan_mailbox(_inbox(app).Items, tokens, reply_index=index)) == {tokens[0]}
+
+
+# ===== follow-up incremental (user-014) =====
+
+def test_second_scan_reads_only_new_items(app):
+    tokens = _tokens(10)
+    app.fill_inbox(300)
+    state = Watermark().to_dict()
+
+    wm = Watermark.from_dict(state)
+    scan_mailbox(_inbox(app).Items, tokens, watermark=wm)
+    state = wm.to_dict()
+
+    app.fill_inbox(7)
+    wm = Watermark.from_dict(state)
+    assert _reads(app, tokens, watermark=wm) == {"Subject": 7, "Body": 7}
+    assert wm.seen == 7
+
+
+def _seed_history(cfg, n: int) -> list:
+    from benchmarks.generators import history_rows
+
+    rows = list(history_rows(n, start=datetime(2025, 1, 2, 8, 0, 0)))
+    history = open_history(cfg)
+    with history.writer() as hw:
+        for row in rows:
+            hw.append(row)
+    history.close()
+    return rows
+
+
+def _statuses(cfg) -> dict:
+    history = open_history(cfg)
+    out = {r["token"]: r["status"] for r in history.iter_rows()}
+    history.close()
+    return out
+
+
+def test_state_is_saved_only_after_status_update(app, make_cfg, logger, monkeypatch, tmp_path):
+    cfg = make_cfg()
+    rows = _seed_history(cfg, 30)
+    for row in rows[::3]:
+        app.add_inbox(f"RE: {row['subject']}", "De acordo.", in_reply_to=row["internet_message_id"])
+    state_path = tmp_path / "followup_state.json"
+
+    def broken(self, updates, statuses=None):
+        raise RuntimeError("disco cheio")
+
+    with monkeypatch.context() as m:
+        m.setattr(SqliteHistory, "update_statuses", broken)
+        with pytest.raises(RuntimeError):
+            followup(cfg, logger)
+    # a marca d'água não avançou: a próxima execução acha as mesmas respostas
+    assert not state_path.exists()
+    assert set(_statuses(cfg).values()) == {"ENVIADO"}
+
+    followup(cfg, logger)
+    assert state_path.exists()
+    statuses = _statuses(cfg)
+    assert sum(1 for s in statuses.values() if s == "RESPONDIDO") == len(rows[::3])
+
+
+# ===== analytics (user-023) =====
+
+def test_reply_time_is_the_received_time_not_the_followup_run(app, make_cfg, logger):
+    from src.performance_audit.analytics import load_archive, update_archive
+
+    cfg = make_cfg()
+    rows = _seed_history(cfg, 5)
+    app.add_inbox(f"RE: {rows[0]['subject']}", "De acordo.", in_reply_to=rows[0]["internet_message_id"])
+    received = _inbox(app).Items.Item(1).peek("ReceivedTime")
+
+    followup(cfg, logger)
+    update_archive(cfg, logger)
+    df = load_archive(cfg).set_index("token")
+    assert df.loc[rows[0]["token"], "respondido_at"] == received.strftime("%Y-%m-%d %H:%M:%S")
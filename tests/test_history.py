@@ -0,0 +1,106 @@
+from datetime import datetime
+
+import pytest
+
+from benchmarks.generators import history_rows
+from src.performance_audit.history_store import (
+    FileLock,
+    history_lock,
+    journal_path,
+    open_history,
+    replay_journal,
+)
+
+
+def _xlsx(make_cfg):
+    cfg = make_cfg(**{"history.backend": "xlsx", "history.flush_every_rows": 1000})
+    return cfg, open_history(cfg)
+
+
+def _rows(n: int, offset: int = 0) -> list:
+    return list(history_rows(n, start=datetime(2025, 1, 2, 8, 0, 0)))[offset:]
+
+
+def _statuses(history) -> dict:
+    return {(r["token"], r["cod_cliente"]): r["status"] for r in history.iter_rows()}
+
+
+def test_status_update_during_writer_session_is_kept(make_cfg):
+    _, history = _xlsx(make_cfg)
+    rows = _rows(20)
+    with history.writer() as hw:
+        for row in rows[:10]:
+            hw.append(row)
+        hw.flush()
+        # follow-up em outro processo grava enquanto o dispatch segue com a sessão aberta
+        assert history.update_statuses({rows[0]["token"]: ("RESPONDIDO", "")}) == []
+        for row in rows[10:]:
+            hw.append(row)
+
+    statuses = _statuses(history)
+    assert len(statuses) == 20
+    assert statuses[(rows[0]["token"], rows[0]["cod_cliente"])] == "RESPONDIDO"
+
+
+def test_replay_leaves_a_live_session_journal_alone(make_cfg):
+    cfg, history = _xlsx(make_cfg)
+    rows = _rows(5)
+    with history.writer() as hw:
+        for row in rows:
+            hw.append(row)
+        assert replay_journal(cfg.get("paths.history_xlsx"), history.sheet_name) == 0
+        assert journal_path(cfg.get("paths.history_xlsx")).stat().st_size > 0
+
+    assert len(_statuses(history)) == 5
+    assert not journal_path(cfg.get("paths.history_xlsx")).exists()
+
+
+def test_history_lock_is_exclusive(tmp_path):
+    path = tmp_path / "history.xlsx"
+    with history_lock(str(path)):
+        with pytest.raises(RuntimeError):
+            FileLock(tmp_path / "history.xlsx.lock", timeout=0.2).acquire()
+        assert not FileLock(tmp_path / "history.xlsx.lock").acquire(blocking=False)
+    lock = FileLock(tmp_path / "history.xlsx.lock")
+    assert lock.acquire(blocking=False)
+    lock.release()
+
+
+# ===== backend sqlite (user-004) =====
+
+def _sqlite(make_cfg):
+    from src.performance_audit.history_sqlite import SqliteHistory
+
+    cfg = make_cfg()
+    return cfg, SqliteHistory(cfg.get("paths.history_sqlite"), import_xlsx=cfg.get("paths.history_xlsx"))
+
+
+def test_sqlite_status_queries_use_month_status_index(make_cfg):
+    _, history = _sqlite(make_cfg)
+    row = dict(_rows(1)[0], status="enviado ")
+    with history.writer() as hw:
+        hw.append(row)
+    assert [r["status"] for r in history.iter_rows()] == ["ENVIADO"]
+    assert history.update_statuses({row["token"]: ("respondido", "")}) == []
+    assert history.status_counts(row["month_ref"]) == {"RESPONDIDO": {row["cod_assessor"]: 1}}
+
+    plan = " ".join(r[-1] for r in history.con.execute(
+        "EXPLAIN QUERY PLAN SELECT cod_cliente FROM history WHERE month_ref = ? AND status IN (?, ?)",
+        ("2025-01", "ENVIADO", "COBRADO")))
+    assert "ix_history_month_status" in plan
+    history.close()
+
+
+def test_sqlite_import_is_settled_on_first_open(make_cfg):
+    _, history = _sqlite(make_cfg)
+    history.close()
+    # planilha que aparece depois (ex.: export-history em paths.history_xlsx) não é importada
+    _, xlsx = _xlsx(make_cfg)
+    with xlsx.writer() as hw:
+        for row in _rows(3):
+            hw.append(row)
+
+    _, history = _sqlite(make_cfg)
+    assert history.imported == 0
+    assert list(history.iter_rows()) == []
+    history.close()
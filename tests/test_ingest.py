@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from benchmarks.generators import write_frame, write_inputs
+from src.performance_audit.excel_utils import iter_excel_chunks
+from src.performance_audit.plan_io import plan_chunks, prepare_plan
+
+
+def test_excel_chunks_are_bounded_and_complete(tmp_path):
+    df = pd.DataFrame({"Cod Cliente": range(250), "Nome Cliente": [f"Cliente {i}" for i in range(250)]})
+    path = write_frame(df, tmp_path / "auditoria.xlsx")
+
+    chunks = list(iter_excel_chunks(str(path), chunk_rows=100))
+    assert [len(c) for c in chunks] == [100, 100, 50]
+    assert pd.concat(chunks, ignore_index=True)["Cod Cliente"].astype(int).tolist() == list(range(250))
+
+
+def test_excel_chunks_read_only_requested_columns(tmp_path):
+    df = pd.DataFrame({"Cod Cliente": [1, 2], "Nome Cliente": ["a", "b"], "Observacoes": ["x", "y"]})
+    path = write_frame(df, tmp_path / "auditoria.xlsx")
+
+    (chunk,) = iter_excel_chunks(str(path), usecols=["Cod Cliente", "Observacoes"], chunk_rows=10)
+    assert list(chunk.columns) == ["Cod Cliente", "Observacoes"]
+
+
+def _plan_cfg(make_cfg, tmp_path, **over):
+    inputs = write_inputs(tmp_path / "entrada", 300)
+    return make_cfg(**{"paths.auditoria_xlsx": str(inputs["auditoria"]),
+                       "paths.profissionais_xlsx": str(inputs["profissionais"]), **over})
+
+
+def _key(plan: pd.DataFrame) -> list:
+    cols = ["cod_cliente", "cod_assessor", "to_email", "cc_email", "token", "body_sha256", "skip_reason"]
+    return sorted(plan[cols].astype(str).itertuples(index=False, name=None))
+
+
+def test_streaming_plan_matches_eager_plan(make_cfg, tmp_path, logger):
+    eager, _ = prepare_plan(_plan_cfg(make_cfg, tmp_path), logger)
+
+    chunks, meta = plan_chunks(_plan_cfg(make_cfg, tmp_path, **{"ingest.streaming": True,
+                                                                  "ingest.chunk_rows": 64}), logger)
+    blocks = list(chunks)
+    assert len(blocks) > 1
+    assert all(len(b) <= 64 for b in blocks)
+    assert _key(pd.concat(blocks, ignore_index=True)) == _key(eager)
+
+
+def test_streaming_refuses_digest_mode(make_cfg, tmp_path, logger):
+    cfg = _plan_cfg(make_cfg, tmp_path, **{"ingest.streaming": True, "behavior.grouping": "assessor"})
+    with pytest.raises(ValueError, match="grouping=assessor"):
+        plan_chunks(cfg, logger)
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+from src.performance_audit.rate_limit import TokenBucket
+from src.performance_audit.sender import ComTransport, SendJob, SendPool
+
+
+class _Row:
+    def __init__(self, i):
+        self.to_email = f"assessor{i}@empresa.com.br"
+        self.cc_email = ""
+        self.subject = f"Auditoria {i}"
+
+
+def _jobs(n: int):
+    return (SendJob(_Row(i), "<p>corpo</p>") for i in range(n))
+
+
+def _pool(app, workers: int, rate_per_min: float = 1e9, burst: int = 100) -> SendPool:
+    from src.performance_audit.outlook_client import OutlookClient
+
+    transport = ComTransport(
+        lambda: OutlookClient(from_smtp=app.smtp, store_hint=app.store_name),
+        send_kwargs={"send_mode": "send", "force_send": True, "retry_send": 1},
+    )
+    return SendPool(transport, limiter=TokenBucket(rate_per_min, burst=burst), workers=workers)
+
+
+def _send_threads() -> list:
+    return [t for t in threading.enumerate() if t.name.startswith(("send-worker-", "send-feeder"))]
+
+
+def test_every_job_sent_once_across_workers(app):
+    statuses = [res.status for res in _pool(app, workers=4).run(_jobs(40))]
+    assert statuses == ["ENVIADO"] * 40
+    assert app.sent == 40
+    assert not _send_threads()
+
+
+def test_workers_run_sends_in_parallel(app):
+    app.send_latency = 0.05
+    t0 = time.perf_counter()
+    list(_pool(app, workers=4).run(_jobs(20)))
+    # 20 envios de 50 ms em sequência levariam 1 s
+    assert time.perf_counter() - t0 < 0.6
+
+
+def test_shared_limiter_caps_total_rate(app):
+    t0 = time.perf_counter()
+    list(_pool(app, workers=8, rate_per_min=600, burst=2).run(_jobs(12)))
+    # 10/s com rajada de 2: os 10 envios além da rajada esperam ~1 s, com 8 workers ou 1
+    assert time.perf_counter() - t0 >= 0.9
+
+
+def test_jobs_generator_error_is_reraised_after_queued_jobs(app):
+    def jobs():
+        yield from _jobs(5)
+        raise ValueError("planilha corrompida")
+
+    results = []
+    with pytest.raises(ValueError, match="planilha corrompida"):
+        for res in _pool(app, workers=3).run(jobs()):
+            results.append(res.status)
+    assert results == ["ENVIADO"] * 5
+    assert not _send_threads()
+
+
+def test_consumer_abort_stops_workers(app):
+    app.send_latency = 0.01
+    pool = _pool(app, workers=4)
+    seen = 0
+    for _ in pool.run(_jobs(1000)):
+        seen += 1
+        if seen == 3:
+            break
+    # run() só sai depois de parar os workers: nada mais é enviado sem resultado
+    assert not _send_threads()
+    sent = app.sent
+    time.sleep(0.05)
+    assert app.sent == sent < 1000
+
+
+@pytest.mark.parametrize("inline", [False, True])
+def test_nothing_sent_after_a_failed_job(app, inline):
+    app.fail_every = 5
+    pool = _pool(app, workers=1)
+    pool.inline = inline
+    statuses = [res.status for res in pool.run(_jobs(30))]
+    # o 5º envio falha: o pool para na hora e cada job restante volta como INTERROMPIDO
+    assert app.sent == 4
+    assert statuses == ["ENVIADO"] * 4 + ["FALHA"] + ["INTERROMPIDO"] * 25
+    assert not _send_threads()
+
+
+# ===== contagem de chamadas COM (user-017) =====
+
+@pytest.mark.parametrize("cc", ["", "lider@empresa.com.br"])
+def test_com_calls_metric_matches_calls_made(app, cc):
+    from src.performance_audit import metrics
+    from src.performance_audit.outlook_client import OutlookClient
+    from src.performance_audit.sender import send_one
+
+    oc = OutlookClient(from_smtp=app.smtp, store_hint=app.store_name)
+    sent_folder = oc.get_sent_folder()
+    row = _Row(1)
+    row.cc_email = cc
+
+    metrics.METRICS.reset()
+    app.stats.reset()
+    res = send_one(oc, SendJob(row, "<p>corpo</p>"), sent_folder, TokenBucket(1e9, burst=10),
+                   send_mode="send", force_send=True, retry_send=1)
+    assert res.status == "ENVIADO"
+    counted = sum(n for key, n in metrics.METRICS.summary()["counters"].items() if key.startswith("com_calls"))
+    assert counted == app.stats.total()
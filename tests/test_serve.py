@@ -0,0 +1,77 @@
+import atexit
+import json
+import threading
+import time
+
+from src.performance_audit.logging_utils import Logger
+from src.performance_audit.serve import Server
+
+
+def _server(tmp_path, make_cfg, logger, **over):
+    path = tmp_path / "config.json"
+    cfg = make_cfg(**{"serve.watch_glob": str(tmp_path / "auditorias" / "*.xlsx"),
+                      "serve.followup_interval_min": 0, **over})
+    path.write_text(json.dumps(cfg.data), encoding="utf-8")
+    return Server(str(path), logger), path
+
+
+def test_tick_survives_failing_pending_files(tmp_path, make_cfg, logger, monkeypatch):
+    server, _ = _server(tmp_path, make_cfg, logger)
+    server.reload_config()
+
+    def boom():
+        raise OSError("compartilhamento fora do ar")
+
+    monkeypatch.setattr(server, "pending_files", boom)
+    result = server.tick()
+    assert result["errors"] == ["ciclo: compartilhamento fora do ar"]
+    assert server.cycles == 1
+
+    monkeypatch.undo()
+    assert server.tick()["errors"] == []
+
+
+def test_bad_config_edit_keeps_previous_config(tmp_path, make_cfg, logger):
+    server, path = _server(tmp_path, make_cfg, logger)
+    stop = threading.Event()
+    server.run(stop=stop, max_cycles=1)
+    before = server.cfg
+
+    path.write_text("{ salvo pela metade", encoding="utf-8")
+    result = server.tick()
+    assert result["config_reloaded"] is False
+    assert server.cfg is before
+
+
+def test_flush_writes_queued_lines(tmp_path):
+    log = Logger(str(tmp_path / "serve.txt"), background=True)
+    try:
+        for i in range(50):
+            log.info(f"ciclo {i}")
+        log.flush()
+        assert (tmp_path / "serve.txt").read_text(encoding="utf-8").count("ciclo") == 50
+    finally:
+        log.close()
+
+
+def test_background_writer_flushes_without_close(tmp_path):
+    path = tmp_path / "dispatch.txt"
+    log = Logger(str(path), background=True, flush_interval=0.05)
+    try:
+        log.info("enviado 1")
+        deadline = time.monotonic() + 2
+        while "enviado 1" not in path.read_text(encoding="utf-8") and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "enviado 1" in path.read_text(encoding="utf-8")
+    finally:
+        log.close()
+
+
+def test_close_unregisters_atexit(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, "register", registered.append)
+    monkeypatch.setattr(atexit, "unregister", registered.remove)
+    log = Logger(str(tmp_path / "serve.txt"), background=True)
+    assert registered == [log.close]
+    log.close()
+    assert registered == []
@@ -0,0 +1,39 @@
+from benchmarks.fake_smtp import FakeSmtpServer
+from src.performance_audit.rate_limit import TokenBucket
+from src.performance_audit.sender import SendJob
+from src.performance_audit.smtp_transport import SmtpTransport
+
+
+class _Row:
+    def __init__(self, cc_email: str = ""):
+        self.to_email = "assessor@empresa.com.br"
+        self.cc_email = cc_email
+        self.subject = "Auditoria"
+
+
+def _send(srv, row, retry_send: int = 3):
+    transport = SmtpTransport({"host": srv.host, "port": srv.port, "ssl": False, "starttls": False,
+                               "username": None, "password": "", "timeout": 5, "max_messages": 100,
+                               "from_addr": "riscos@empresa.com.br"},
+                              retry_send=retry_send, backoff_base=0.01, backoff_max=0.01)
+    session = transport.open()
+    try:
+        return transport.send(session, SendJob(row, "<p>corpo</p>"), TokenBucket(1e9, burst=10))
+    finally:
+        transport.close(session)
+
+
+def test_connection_lost_after_data_is_not_resent():
+    with FakeSmtpServer(drop_after_data=1) as srv:
+        res = _send(srv, _Row())
+    # o servidor ficou com a mensagem: repetir mandaria o e-mail em dobro
+    assert res.status == "FALHA"
+    assert len(srv.messages) == 1
+
+
+def test_refused_cc_is_reported():
+    with FakeSmtpServer(reject=["lider@empresa.com.br"]) as srv:
+        res = _send(srv, _Row(cc_email="lider@empresa.com.br"))
+    assert res.status == "ENVIADO"
+    assert res.refused == ["lider@empresa.com.br"]
+    assert srv.messages[0][1] == ["assessor@empresa.com.br"]